@@ -53,12 +53,13 @@ def create_ami(args):
         installation scripts: %s
         user data: %s""", args.name, args.base_ami_id, args.instance_type, args.key_name,
         args.security_group_name, args.volume_size, args.installation_scripts, args.user_data)
-    instance, image = utils.create_image(args.name, args.base_ami_id,
-                                         args.instance_type, args.key_name,
-                                         args.security_group_name,
-                                         args.volume_size,
-                                         args.installation_scripts,
-                                         args.user_data)
+    instance, image, _ = utils.create_image(args.name, args.base_ami_id,
+                                            args.instance_type, args.key_name,
+                                            args.security_group_name,
+                                            args.volume_size,
+                                            args.installation_scripts,
+                                            args.user_data,
+                                            args.max_workers)
 
     print("\n")
     utils.print_image_info(image)
@@ -85,12 +86,15 @@ def start(instance, args):
 
 
 def get(instance, args):
+    # With several instances, the files of each one of them are stored in their own folder
+    target = os.path.join(args.target, instance.id) if args.fleet else args.target
     logging.info(
         """Getting files from EC2 instance...
         instance id: %s
         source: %s
-        target: %s""", args.instance_id, args.source, args.target)
-    utils.get(instance, args.source, args.target)
+        target: %s""", instance.id, args.source, target)
+    os.makedirs(target, exist_ok=True)
+    utils.get(instance, args.source, target)
 
 
 def put(instance, args):
@@ -99,8 +103,15 @@ def put(instance, args):
         instance id: %s
         source: %s
         target: %s
-        exclude: %s""", args.instance_id, args.source, args.target, args.exclude)
-    utils.put(instance, args.source, args.target, exclude=tuple(args.exclude))
+        exclude: %s""", instance.id, args.source, args.target, args.exclude)
+    # With several instances, the output of each one of them is prefixed by its name
+    prefix = utils.get_instance_name(instance) if args.fleet else None
+    summary = utils.put(instance, args.source, args.target, exclude=tuple(args.exclude), compress=args.compress,
+                        delete=args.delete, dry_run=args.dry_run, prefix=prefix, progress=not args.fleet)
+    if args.dry_run:
+        utils.print_line("{} files to upload ({} bytes, {} bytes saved), {} files to delete".format(
+            len(summary["uploaded"]), summary["bytes_uploaded"], summary["bytes_saved"], len(summary["deleted"])),
+            prefix)
 
 
 def execute(instance, args):
@@ -108,8 +119,9 @@ def execute(instance, args):
         """Executing script on EC2 instance...
         instance id: %s
         script: %s
-        script arguments: %s""", args.instance_id, args.script, args.script_args)
-    utils.exec_script(instance, args.script, args.script_args)
+        script arguments: %s""", instance.id, args.script, args.script_args)
+    prefix = utils.get_instance_name(instance) if args.fleet else None
+    return utils.exec_script(instance, args.script, args.script_args, prefix=prefix)
 
 
 def stop(instance, args):
@@ -120,6 +132,16 @@ def info(instance, args):
     return utils.get_info(instance, args.field)
 
 
+FLEET_ACTIONS = {
+    "start": start,
+    "info": info,
+    "get": get,
+    "put": put,
+    "exec": execute,
+    "stop": stop,
+}
+
+
 if __name__ == "__main__":
     argparser = argparse.ArgumentParser(description=__doc__)
     argparser.add_argument(
@@ -128,7 +150,12 @@ if __name__ == "__main__":
         choices=["create-image", "start", "launch", "info", "get", "put", "exec", "stop"],
         help="",
     )
-    argparser.add_argument("--instance-id", type=str, help="", default="")
+    argparser.add_argument("--instance-id", "--instance-ids", dest="instance_ids", nargs="+", type=str, default=[],
+                           help="Instances to act on")
+    argparser.add_argument("--tag", dest="tags", nargs="+", type=str, default=[],
+                           help="Acts on all the instances with these tags, given as Key=Value")
+    argparser.add_argument("--max-workers", type=int, default=8,
+                           help="Maximum number of instances (or installation scripts) handled at the same time")
     # create image arguments
     argparser.add_argument("--name", type=str, default="CARLA_RLLIB")
     #argparser.add_argument("--base-ami-id", type=str, help="", default="ami-0dd9f0e7df0f0a138")
@@ -146,7 +173,10 @@ if __name__ == "__main__":
     # put&get arguments
     argparser.add_argument("--source", type=str, default=".")
     argparser.add_argument("--target", type=str, default=".")
-    argparser.add_argument("--exclude", nargs='+', type=str, default=[])
+    argparser.add_argument("--exclude", nargs='+', type=str, default=list(utils.PUT_EXCLUDE))
+    argparser.add_argument("--compress", action="store_true", help="upload the changed files as one tar stream")
+    argparser.add_argument("--delete", action="store_true", help="remove the remote files that do not exist locally")
+    argparser.add_argument("--dry-run", action="store_true", help="only report the files that would be transferred")
     # exec arguments
     argparser.add_argument("--script", type=str, default=None)
     argparser.add_argument("--script-args", type=str, default="")
@@ -176,24 +206,23 @@ if __name__ == "__main__":
         else:  # arguments.action == "launch"
             launch(arguments)
     else:
-        if arguments.instance_id is None:
-            raise RuntimeError("mandatory instance_id attribute missing")
-
-        instance = utils.get_instance(arguments.instance_id)
-        assert instance is not None
-
-        if arguments.action == "start":
-            result = start(instance, arguments)
-        elif arguments.action == "info":
-            result = info(instance, arguments)
-        elif arguments.action == "get":
-            result = get(instance, arguments)
-        elif arguments.action == "put":
-            result = put(instance, arguments)
-        elif arguments.action == "exec":
-            result = execute(instance, arguments)
-        else:  # arguments.action == "stop":
-            result = stop(instance, arguments)
+        if not arguments.instance_ids and not arguments.tags:
+            raise RuntimeError("mandatory instance_id or tag attribute missing")
+
+        instances = utils.get_instances(arguments.instance_ids, arguments.tags)
+        assert instances, "No instance found"
+        arguments.fleet = len(instances) > 1
+        action = FLEET_ACTIONS[arguments.action]
+
+        if not arguments.fleet:
+            result = action(instances[0], arguments)
+        else:
+            results = utils.run_parallel(lambda instance: action(instance, arguments), instances,
+                                         arguments.max_workers)
+            if arguments.action == "info":
+                for instance in instances:
+                    print("{}: {}".format(utils.get_instance_name(instance), results[instance.id]))
+            result = utils.get_exit_status(results)
 
     # result="hello"
     sys.exit(result)
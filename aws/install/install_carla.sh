@@ -0,0 +1,24 @@
+#!/bin/bash
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+# depends-on:
+
+# ==================================================================================================
+# -- Install CARLA ---------------------------------------------------------------------------------
+# ==================================================================================================
+CARLA_VERSION=0.9.11
+
+echo "Installing CARLA. This may take a while..."
+curl -o ${HOME}/CARLA_${CARLA_VERSION}.tar.gz https://carla-releases.s3.eu-west-3.amazonaws.com/Linux/CARLA_${CARLA_VERSION}.tar.gz
+mkdir -p ${HOME}/CARLA_${CARLA_VERSION}
+tar -xzf ${HOME}/CARLA_${CARLA_VERSION}.tar.gz -C ${HOME}/CARLA_${CARLA_VERSION}
+
+echo "Installing CARLA additional maps. This may take a while..."
+curl -o ${HOME}/AdditionalMaps_${CARLA_VERSION}.tar.gz https://carla-releases.s3.eu-west-3.amazonaws.com/Linux/AdditionalMaps_${CARLA_VERSION}.tar.gz
+mv ${HOME}/AdditionalMaps_${CARLA_VERSION}.tar.gz ${HOME}/CARLA_${CARLA_VERSION}/Import
+cd ${HOME}/CARLA_${CARLA_VERSION} && bash ImportAssets.sh && cd ${HOME}
@@ -0,0 +1,16 @@
+#!/bin/bash
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+# depends-on:
+
+# ==================================================================================================
+# -- Install dependencies --------------------------------------------------------------------------
+# ==================================================================================================
+echo "Installing dependencies..."
+sudo apt-get update
+sudo apt-get install -y pulseaudio
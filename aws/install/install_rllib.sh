@@ -0,0 +1,17 @@
+#!/bin/bash
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+# depends-on:
+
+# ==================================================================================================
+# -- Install RLlib ---------------------------------------------------------------------------------
+# ==================================================================================================
+echo "Preparing virtual environment..."
+source activate pytorch_latest_p37
+pip3 install pygame==2.0.1 paramiko==2.7.2 scp==0.13.3 ray[rllib]==1.1.0 tensorboard==2.4.1
+pip3 uninstall pygame paramiko scp ray[rllib] tensorboard
@@ -0,0 +1,23 @@
+#!/bin/bash
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+# depends-on: install_carla.sh install_rllib.sh
+
+# ==================================================================================================
+# -- Env variables ---------------------------------------------------------------------------------
+# ==================================================================================================
+echo "Setting up env variables..."
+echo "export CARLA_ROOT=~/CARLA_0.9.11" >> ~/custom_env.sh
+echo "source activate pytorch_latest_p37" >> ~/custom_env.sh
+echo 'export PYTHONPATH=""' >> ~/custom_env.sh
+echo 'export PYTHONPATH=$PYTHONPATH:"${CARLA_ROOT}/PythonAPI/carla/dist/$(ls ${CARLA_ROOT}/PythonAPI/carla/dist | grep py3.)"' >> ~/custom_env.sh
+echo 'export PYTHONPATH=$PYTHONPATH:"${CARLA_ROOT}/PythonAPI/carla"' >> ~/custom_env.sh
+echo 'alias python3=~/anaconda3/envs/pytorch_latest_p37/bin/python3.7' >> ~/custom_env.sh
+echo 'alias python=~/anaconda3/envs/pytorch_latest_p37/bin/python3.7' >> ~/custom_env.sh
+
+echo "source ~/custom_env.sh" >> ~/.bashrc
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+Installation plan of an AMI: a DAG of installation scripts, run layer by layer on the instance with the
+independent scripts of each layer running at the same time.
+
+The dependencies of a script are declared in its header, as a comment with the names of other scripts of the
+plan (an empty list means that it has no dependencies):
+
+    # depends-on: install_dependencies.sh
+
+Scripts without this header depend on the previous script, which keeps the sequential order of the plans
+that do not declare any dependency.
+
+Each step is identified by the hash of its script, arguments and dependencies. Successful steps leave a
+marker with that hash on the instance, and are skipped while the marker exists. The markers only exist when
+the base AMI is itself an image built by an earlier plan: a fresh base AMI never skips any step.
+
+The plan only talks to the instance through a runner, so that it can be run against a stub:
+    runner.exec_script(script, args, prefix) -> exit status
+    runner.run_command(command) -> (exit status, output)
+"""
+
+import hashlib
+import logging
+import os
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEPENDS_ON_HEADER = "# depends-on:"
+
+# Folder of the instance with the markers of the completed steps
+MARKER_FOLDER = "~/.install_plan"
+
+
+def parse_dependencies(script):
+    """Returns the dependencies declared in the header of the script, or None if it does not declare any"""
+    with open(script) as f:
+        for line in f:
+            if line.startswith(DEPENDS_ON_HEADER):
+                return line[len(DEPENDS_ON_HEADER):].split()
+    return None
+
+
+class InstallStep(object):
+    """An installation script of the plan, together with its arguments and the names of its dependencies"""
+
+    def __init__(self, script, depends_on=(), args=""):
+        self.script = script
+        self.name = os.path.basename(script)
+        self.depends_on = list(depends_on)
+        self.args = args
+
+    def get_hash(self, dependency_hashes):
+        sha256 = hashlib.sha256()
+        with open(self.script, "rb") as f:
+            sha256.update(f.read())
+        sha256.update(self.args.encode())
+        for dependency_hash in sorted(dependency_hashes):
+            sha256.update(dependency_hash.encode())
+        return sha256.hexdigest()[:16]
+
+
+class InstallPlan(object):
+
+    def __init__(self, steps):
+        self.steps = {step.name: step for step in steps}
+        if len(self.steps) != len(steps):
+            raise ValueError("The names of the installation scripts must be unique")
+        for step in steps:
+            for dependency in step.depends_on:
+                if dependency not in self.steps:
+                    raise ValueError("Unknown dependency '{}' of '{}'".format(dependency, step.name))
+
+        self.layers = self._get_layers()
+        self.hashes = {}
+        for layer in self.layers:
+            for name in layer:
+                step = self.steps[name]
+                self.hashes[name] = step.get_hash([self.hashes[d] for d in step.depends_on])
+
+    @classmethod
+    def from_scripts(cls, scripts):
+        """Builds the plan of a list of scripts, reading the dependencies from their headers"""
+        steps = []
+        for i, script in enumerate(scripts):
+            depends_on = parse_dependencies(script)
+            if depends_on is None:
+                depends_on = [os.path.basename(scripts[i - 1])] if i > 0 else []
+            steps.append(InstallStep(script, depends_on))
+        return cls(steps)
+
+    def _get_layers(self):
+        """Groups the steps in layers, each one depending only on the previous ones (Kahn's algorithm)"""
+        layers, done = [], set()
+        pending = list(self.steps)
+        while pending:
+            layer = [name for name in pending if all(d in done for d in self.steps[name].depends_on)]
+            if not layer:
+                raise ValueError("Circular dependencies between the installation scripts: {}".format(pending))
+            layers.append(layer)
+            done.update(layer)
+            pending = [name for name in pending if name not in done]
+        return layers
+
+    def get_marker(self, name):
+        return "{}/{}".format(MARKER_FOLDER, shlex.quote("{}.{}".format(name, self.hashes[name])))
+
+    def get_completed(self, runner):
+        """Names of the steps whose marker already exists on the instance"""
+        status, output = runner.run_command("ls -1 {} 2>/dev/null".format(MARKER_FOLDER))
+        markers = set(output.split()) if status == 0 else set()
+        return {name for name in self.steps if "{}.{}".format(name, self.hashes[name]) in markers}
+
+    def run(self, runner, max_workers=8, use_cache=True):
+        """
+        Runs the plan, stopping after the first layer with a failed step. Returns the result of each step
+        ("cached", "ok" or "failed"), and the time it took, in seconds.
+        """
+        completed = self.get_completed(runner) if use_cache else set()
+
+        def run_step(name, prefix):
+            step = self.steps[name]
+            logging.info("Executing installation script %s", name)
+            start = time.time()
+            status = runner.exec_script(step.script, step.args, prefix)
+            if status == 0:
+                runner.run_command("mkdir -p {} && touch {}".format(MARKER_FOLDER, self.get_marker(name)))
+            return ("ok" if status == 0 else "failed"), time.time() - start
+
+        timings = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for layer in self.layers:
+                for name in layer:
+                    if name in completed:
+                        logging.info("Skipping installation script %s, already installed", name)
+                        timings[name] = ("cached", 0.0)
+                to_run = [name for name in layer if name not in completed]
+                # Prefix the outputs of the steps that run at the same time
+                prefixes = to_run if len(to_run) > 1 else [None] * len(to_run)
+                timings.update(zip(to_run, executor.map(run_step, to_run, prefixes)))
+
+                failed = [name for name in layer if timings[name][0] == "failed"]
+                if failed:
+                    log_timings(timings)
+                    raise RuntimeError("Installation scripts failed: {}".format(", ".join(failed)))
+
+        log_timings(timings)
+        return timings
+
+
+def log_timings(timings):
+    for name, (result, seconds) in timings.items():
+        logging.info("  %-40s %-6s %8.1f s", name, result, seconds)
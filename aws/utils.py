@@ -11,12 +11,18 @@ boto3 ec2 wrappers.
 
 import datetime
 import functools
+import hashlib
 import logging
 import os
+import select
+import shlex
 import shutil
 import stat
 import sys
+import tarfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import boto3
 from botocore.exceptions import ClientError
@@ -24,8 +30,33 @@ from botocore.exceptions import ClientError
 import paramiko
 import scp
 
+from install_plan import InstallPlan
+
 MAX_TRIES = 5
 
+# Default paths that are never synchronized
+PUT_EXCLUDE = (".git", "keys", "__pycache__", "map_cache")
+
+# Maximum number of paths per remote command
+MAX_PATHS_PER_COMMAND = 500
+
+# Seconds between the keepalive packets of the ssh connections, and first / maximum delay between reconnections
+SSH_KEEPALIVE_INTERVAL = 30
+SSH_BACKOFF_BASE = 1
+SSH_BACKOFF_MAX = 16
+
+# Maximum seconds for a new (or started) instance to accept ssh connections
+SSH_READY_TIMEOUT = 600
+
+# Size of the reads of the command outputs and downloads
+READ_SIZE = 32768
+
+# Instance states that can be operated on
+ACTIVE_STATES = ["pending", "running", "stopping", "stopped"]
+
+# Serializes the output of the commands run in parallel
+_print_lock = threading.Lock()
+
 def create_key_pair(key_name, private_key_file_name=None):
     """
     Creates a key pair that can be used to securely connect to an Amazon EC2 instance.
@@ -143,6 +174,70 @@ def get_instance(instance_id):
     return instances[0]
 
 
+def get_instances(instance_ids=(), tags=()):
+    """
+    Returns the (non terminated) instances with the given ids and tags.
+
+    :param instance_ids: The instance ids.
+    :type instance_ids: list
+    :param tags: The tags that the instances must have, as 'Key=Value' strings.
+    :type tags: list
+    :rtype: list of ec2.Instance
+    """
+    if not instance_ids and not tags:
+        return []
+
+    ec2 = _get_resource("ec2")
+    filters = [{"Name": "instance-state-name", "Values": ACTIVE_STATES}]
+    for tag in tags:
+        key, value = tag.split("=", 1)
+        filters.append({"Name": "tag:{}".format(key), "Values": [value]})
+
+    kwargs = {"Filters": filters}
+    if instance_ids:
+        kwargs["InstanceIds"] = list(instance_ids)
+    return list(ec2.instances.filter(**kwargs))
+
+
+def get_instance_name(instance):
+    for tag in instance.tags or []:
+        if tag["Key"] == "Name":
+            return "{} ({})".format(tag["Value"], instance.id)
+    return instance.id
+
+
+def run_parallel(function, instances, max_workers=8):
+    """
+    Runs function(instance) for all the instances, with at most max_workers of them at the same time.
+
+    :return: The result of each instance, or the exception it raised, by instance id.
+    :rtype: dict
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(function, instance): instance for instance in instances}
+        for future in as_completed(futures):
+            instance = futures[future]
+            try:
+                results[instance.id] = future.result()
+            except Exception as e:
+                logging.error("[%s] %s", get_instance_name(instance), e)
+                results[instance.id] = e
+    return results
+
+
+def get_exit_status(results):
+    """Aggregated exit status of the results returned by run_parallel. Non integer results count as success,
+    except for the exceptions"""
+    status = 0
+    for result in results.values():
+        if isinstance(result, Exception):
+            status = max(status, 1)
+        elif isinstance(result, int) and not isinstance(result, bool):
+            status = max(status, result)
+    return status
+
+
 def print_image_info(image):
     print("\033[1mImage id:\033[0m {}".format(image.id))
 
@@ -164,7 +259,8 @@ def get_info(instance, field):
     else:
         return None
 
-def run_instance(name, image_id, instance_type, key_name, security_group_name, volume_size=10, user_data=""):
+def run_instance(name, image_id, instance_type, key_name, security_group_name, volume_size=10, user_data="",
+                 ec2=None):
     """
     Creates a new Amazon EC2 instance. The instance automatically starts immediately after it is
     created. The instance is created in the default VPC of the current account.
@@ -183,10 +279,11 @@ def run_instance(name, image_id, instance_type, key_name, security_group_name, v
     :type volume_size: int
     :param user_data: The user data to make available to the instance.
     :type user_data: string
+    :param ec2: The ec2 resource to use (by default, the one of the current session).
     :return: The newly created instance.
     :rtype: ec2.Instance
     """
-    ec2 = _get_resource("ec2")
+    ec2 = ec2 or _get_resource("ec2")
     try:
         create_key_pair(key_name)
         create_security_group(security_group_name)
@@ -215,12 +312,13 @@ def run_instance(name, image_id, instance_type, key_name, security_group_name, v
         ec2.create_tags(Resources=[instance.id], Tags=[{"Key": "Name", "Value": name}])
 
         instance.wait_until_running()
-        # ensure we can connect via ssh
-        time.sleep(30)
 
         instance = list(ec2.instances.filter(InstanceIds=[instance.id]))[0]
         logging.info("Created instance %s. Public IPv4 address: %s", instance.id,
                      instance.public_ip_address)
+
+        # sshd usually starts well after the instance is running
+        wait_until_reachable(instance)
     except ClientError:
         logging.exception("Couldn't create instance with image %s, instance type %s, and key %s.",
                           image_id, instance_type, key_name)
@@ -235,6 +333,7 @@ def start_instance(instance):
     instance.wait_until_running()
     # cleaning cache because the public ip address of the instance has been modified.
     _clear_cache()
+    wait_until_reachable(instance)
 
 
 def stop_instance(instance):
@@ -259,75 +358,348 @@ def create_image(name,
                  security_group_name,
                  volume_size=10,
                  installation_scripts=(),
-                 user_data=""):
-    ec2 = _get_resource("ec2")
-    instance = run_instance(name, base_image_id, instance_type, key_name, security_group_name, volume_size, user_data)
+                 user_data="",
+                 max_workers=8,
+                 ec2=None,
+                 runner_factory=None):
+    """
+    Creates an image from a new instance, once the installation plan of the scripts has been run on it (see
+    install_plan.py). The ec2 resource and the runner of the plan can be replaced, e.g. by stubs.
+
+    :param max_workers: Maximum number of installation scripts running at the same time.
+    :type max_workers: int
+    :param runner_factory: Returns the runner of the plan for the instance (by default, an InstanceRunner).
+    :return: The instance, the image and the result and duration of each installation script.
+    :rtype: tuple
+    """
+    ec2 = ec2 or _get_resource("ec2")
+    runner_factory = runner_factory or InstanceRunner
+    plan = InstallPlan.from_scripts(installation_scripts)
+    logging.info("Installation plan: %s", " -> ".join(
+        "[{}]".format(", ".join(layer)) for layer in plan.layers))
 
-    for script in installation_scripts:
-        logging.info("Executing installation script %s", os.path.basename(script))
-        exec_script(instance, script)
+    instance = run_instance(name, base_image_id, instance_type, key_name, security_group_name, volume_size,
+                            user_data, ec2=ec2)
+    timings = plan.run(runner_factory(instance), max_workers)
 
     logging.info("Creating image from EC2 instance %s. This may take a while...", instance.id)
+    start = time.time()
     image = instance.create_image(Name=name)
-    while image.state == "pending":
-       time.sleep(5)
-       image = list(ec2.images.filter(ImageIds=[image.id]))[0]
+
+    def is_created():
+        image.reload()
+        return image.state != "pending"
+
+    wait_until(is_created, "image {}".format(image.id))
+    timings["create-image"] = (image.state, time.time() - start)
     if image.state == "available":
-       logging.info("Image created with id %s", image.id)
+       logging.info("Image created with id %s in %.1f s", image.id, timings["create-image"][1])
     else:
        logging.error("Couldn't create image from EC2 instance %s", instance.id)
 
     stop_instance(instance)
 
-    return instance, image
+    return instance, image, timings
+
+
+def wait_until(condition, description="condition", timeout=3600, base_delay=1, max_delay=30):
+    """
+    Polls the condition with exponential backoff until it is true.
+
+    :param timeout: Maximum time to wait, in seconds.
+    :type timeout: float
+    :rtype: bool
+    """
+    deadline = time.time() + timeout
+    delay = base_delay
+    while not condition():
+        if time.time() + delay > deadline:
+            raise TimeoutError("Timed out waiting for {}".format(description))
+        logging.debug("Waiting for %s. Checking again in %.0f s", description, delay)
+        time.sleep(delay)
+        delay = min(2 * delay, max_delay)
+    return True
+
+
+def wait_until_reachable(instance, timeout=SSH_READY_TIMEOUT):
+    """
+    Waits until the instance accepts ssh connections. The connection is kept in the pool.
+
+    :param timeout: Maximum time to wait, in seconds.
+    :type timeout: float
+    """
+    def accepts_ssh():
+        try:
+            _get_ssh_client(instance)
+        except (paramiko.SSHException, OSError) as e:
+            logging.info("Instance %s doesn't accept ssh connections yet (%s)", instance.id, e)
+            return False
+        return True
+
+    return wait_until(accepts_ssh, "ssh on instance {}".format(instance.id), timeout)
+
+
+class InstanceRunner(object):
+    """Runner of the installation plans on an EC2 instance"""
+
+    def __init__(self, instance):
+        self.instance = instance
+
+    def exec_script(self, script, args="", prefix=None):
+        return exec_script(self.instance, script, args, prefix=prefix)
 
+    def run_command(self, command):
+        return _run_command(self.instance, command)
 
-def exec_script(instance, script, args="", rsync_folder=False):
+
+def exec_script(instance, script, args="", rsync_folder=False, prefix=None):
     logging.info("Executing script %s in EC2 instance %s", os.path.basename(script), instance.id)
     command = ""
     if not os.path.isfile(script):
         logging.error("The provided script '%s' is not a file.", script)
-        return
+        return 1
     if rsync_folder:
-        put(instance, os.path.dirname(script))
+        put(instance, os.path.dirname(script), prefix=prefix, progress=prefix is None)
         folder = os.path.basename(os.path.dirname(script))
         command += " cd {} && ".format(folder)
     else:
-        put(instance, script)
+        put(instance, script, prefix=prefix, progress=prefix is None)
     command += "./{} {}".format(os.path.basename(script), args)
     logging.info("Running: {}".format(command))
-    exec_command(instance, command)
+    return exec_command(instance, command, prefix)
 
 
-def exec_command(instance, command):
-    ssh_client = _get_ssh_client(instance)
-    _, stdout, stderr = ssh_client.exec_command(command)
-    for line in iter(stdout.readline, ""):
-        print(line, end="")
+def print_line(line, prefix=None, stream=None):
+    """Prints the line (prefixed by 'prefix', if any) without interleaving it with the ones of other threads"""
+    with _print_lock:
+        if prefix:
+            print("[{}] {}".format(prefix, line), file=stream or sys.stdout)
+        else:
+            print(line, file=stream or sys.stdout)
+
+
+def exec_command(instance, command, prefix=None):
+    """Runs the command, printing its output (prefixed by 'prefix', if any). Returns its exit status"""
+    def printer(stream):
+        return functools.partial(print_line, prefix=prefix, stream=stream)
 
-def put(instance, source, target=".", exclude=(".git", "keys", "__pycache__", "map_cache")):
+    return _stream_command(instance, command, printer(sys.stdout), printer(sys.stderr))
+
+
+def _stream_command(instance, command, on_stdout, on_stderr):
+    """
+    Runs the command on its own channel of the pooled connection, so that several commands can run at the same
+    time. Both outputs are read as soon as they are available, and passed line by line to the callbacks.
+
+    :return: The exit status of the command.
+    :rtype: int
+    """
+    channel = _get_ssh_client(instance).get_transport().open_session()
+    channel.exec_command(command)
+
+    buffers = {on_stdout: "", on_stderr: ""}
+
+    def consume(callback, data, final=False):
+        lines = (buffers[callback] + data.decode(errors="replace")).split("\n")
+        buffers[callback] = "" if final else lines.pop()
+        for line in lines:
+            if line or not final:
+                callback(line)
+
+    while True:
+        select.select([channel], [], [], 1.0)
+        received = False
+        if channel.recv_ready():
+            consume(on_stdout, channel.recv(READ_SIZE))
+            received = True
+        if channel.recv_stderr_ready():
+            consume(on_stderr, channel.recv_stderr(READ_SIZE))
+            received = True
+        if not received and channel.exit_status_ready() and not channel.recv_ready() \
+                and not channel.recv_stderr_ready():
+            break
+
+    consume(on_stdout, b"", final=True)
+    consume(on_stderr, b"", final=True)
+    status = channel.recv_exit_status()
+    channel.close()
+    return status
+
+def put(instance, source, target=".", exclude=PUT_EXCLUDE, compress=False, delete=False, dry_run=False,
+        prefix=None, progress=True):
+    """
+    Synchronizes a local file or folder into the instance. Only the files whose content hash differs from the
+    remote one are uploaded. Folders are copied into 'target/<folder name>'.
+
+    :param exclude: Names of the files and folders that are skipped, at any depth.
+    :type exclude: tuple
+    :param compress: Sends all the changed files as a single compressed tar stream instead of one scp per file.
+    :type compress: bool
+    :param delete: Removes the remote files that do not exist locally.
+    :type delete: bool
+    :param dry_run: Only reports what would be transferred.
+    :type dry_run: bool
+    :param prefix: Prefix of the printed lines (e.g. the instance name, when running on several instances).
+    :type prefix: string
+    :param progress: Shows the progress of each file uploaded with scp.
+    :type progress: bool
+    :return: The uploaded and deleted files, the uploaded bytes and the bytes saved by the synchronization.
+    :rtype: dict
+    """
     logging.info("Copying %s into EC2 instance %s", source, instance.id)
-    scp_client = _get_scp_client(instance)
+    source = os.path.normpath(source)
     if os.path.isdir(source):
-        folder = os.path.basename(source)
-        target = os.path.join(target, folder)
-        exec_command(instance, "mkdir -p {}".format(target))
-
-        base, dirs, files = next(os.walk(source))
-        dirs = [os.path.join(base, dir_) for dir_ in dirs if dir_ not in exclude]
-        files = [os.path.join(base, file) for file in files]
-        for dir_ in dirs:
-            remote_path = os.path.join(target, os.path.basename(dir_))
-            scp_client.put(dir_, remote_path=remote_path, recursive=True)
-        scp_client.put(files, remote_path=target)
+        local_root = source
+        remote_root = os.path.join(target, os.path.basename(os.path.abspath(source)))
+        local_manifest = _get_local_manifest(source, exclude)
+        remote_manifest = _get_remote_manifest(instance, remote_root, exclude)
+    else:
+        local_root, remote_root = os.path.dirname(source), target
+        local_manifest = {os.path.basename(source): _get_file_hash(source)}
+        remote_manifest = _get_remote_manifest(instance, remote_root, exclude, paths=list(local_manifest))
+
+    changed = sorted(path for path, entry in local_manifest.items() if remote_manifest.get(path) != entry[0])
+    deleted = sorted(path for path in remote_manifest if path not in local_manifest) if delete else []
+
+    total_bytes = sum(size for _, size in local_manifest.values())
+    upload_bytes = sum(local_manifest[path][1] for path in changed)
+    summary = {
+        "uploaded": changed,
+        "deleted": deleted,
+        "bytes_uploaded": upload_bytes,
+        "bytes_saved": total_bytes - upload_bytes,
+    }
+    logging.info("%d of %d files changed (%d of %d bytes, %d bytes saved). %d remote files to delete",
+                 len(changed), len(local_manifest), upload_bytes, total_bytes, total_bytes - upload_bytes,
+                 len(deleted))
+
+    if dry_run:
+        for path in changed:
+            print_line("upload: {}".format(os.path.join(remote_root, path)), prefix)
+        for path in deleted:
+            print_line("delete: {}".format(os.path.join(remote_root, path)), prefix)
+        return summary
+
+    if changed:
+        if compress:
+            _put_tar_stream(instance, local_root, remote_root, changed)
+        else:
+            _put_files(instance, local_root, remote_root, changed, progress)
+    if deleted:
+        for i in range(0, len(deleted), MAX_PATHS_PER_COMMAND):
+            paths = " ".join(shlex.quote(path) for path in deleted[i:i + MAX_PATHS_PER_COMMAND])
+            _run_command(instance, "cd {} && rm -f -- {}".format(shlex.quote(remote_root), paths))
+
+    return summary
+
+
+def _get_file_hash(path, chunk_size=1 << 20):
+    """Returns the sha256 and size of a file"""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest(), os.path.getsize(path)
+
+
+def _get_local_manifest(source, exclude):
+    """Returns the sha256 and size of all the files in the folder, by path relative to it"""
+    manifest = {}
+    for base, dirs, files in os.walk(source):
+        dirs[:] = [dir_ for dir_ in dirs if dir_ not in exclude]
+        for file in files:
+            if file in exclude:
+                continue
+            path = os.path.join(base, file)
+            manifest[os.path.relpath(path, source).replace(os.sep, "/")] = _get_file_hash(path)
+    return manifest
+
+
+def _get_remote_manifest(instance, root, exclude, paths=None):
+    """Returns the sha256 of the files in the remote folder (or only of 'paths', if given), by path relative
+    to it. Folders that do not exist have no files"""
+    if paths is not None:
+        command = "sha256sum -- {} 2>/dev/null".format(" ".join(shlex.quote(path) for path in paths))
     else:
-        scp_client.put(files=source, remote_path=target)
+        pruned = " -o ".join("-name {}".format(shlex.quote(name)) for name in exclude)
+        prune = "\\( {} \\) -prune -o ".format(pruned) if exclude else ""
+        command = "find . {}-type f -print0 | xargs -0 -r sha256sum".format(prune)
+
+    _, output = _run_command(instance, "cd {} 2>/dev/null && {}".format(shlex.quote(root), command))
+
+    manifest = {}
+    for line in output.splitlines():
+        sha256, _, path = line.partition("  ")
+        if path:
+            manifest[path[2:] if path.startswith("./") else path] = sha256
+    return manifest
+
+
+def _put_files(instance, local_root, remote_root, paths, progress=True):
+    """Uploads the files one by one, creating their remote folders first"""
+    folders = sorted({os.path.dirname(os.path.join(remote_root, path)) for path in paths})
+    for i in range(0, len(folders), MAX_PATHS_PER_COMMAND):
+        _run_command(instance, "mkdir -p -- {}".format(
+            " ".join(shlex.quote(folder) for folder in folders[i:i + MAX_PATHS_PER_COMMAND])))
+
+    scp_client = _get_scp_client(instance, progress)
+    for path in paths:
+        scp_client.put(os.path.join(local_root, path), remote_path=os.path.join(remote_root, path))
+
+
+def _put_tar_stream(instance, local_root, remote_root, paths):
+    """Uploads the files as a single gzipped tar stream, extracted on the fly by the instance"""
+    channel = _get_ssh_client(instance).get_transport().open_session()
+    channel.exec_command("mkdir -p {0} && tar -xzf - -C {0}".format(shlex.quote(remote_root)))
+    with channel.makefile("wb") as stream:
+        with tarfile.open(fileobj=stream, mode="w|gz") as tar:
+            for path in paths:
+                tar.add(os.path.join(local_root, path), arcname=path)
+    channel.shutdown_write()
+
+    status = channel.recv_exit_status()
+    if status != 0:
+        raise RuntimeError("Unable to extract the files at {} (exit status {}): {}".format(
+            remote_root, status, channel.makefile_stderr("rb").read().decode()))
+
+
+def _run_command(instance, command):
+    """Runs the command without printing its output. Returns its exit status and output"""
+    output = []
+    status = _stream_command(instance, command, output.append, lambda line: logging.debug("%s", line))
+    return status, "\n".join(output)
 
 
 def get(instance, remote_path, local_path=".", recursive=True):
+    """
+    Downloads a remote file or (if recursive) folder. As with scp, the path is copied inside 'local_path' if it is
+    an existing folder. Files are read with sftp prefetching, which pipelines the read requests instead of
+    waiting for each one of them.
+    """
     logging.info("Getting %s from EC2 instance %s", remote_path, instance.id)
-    scp_client = _get_scp_client(instance)
-    scp_client.get(remote_path=remote_path, local_path=local_path, recursive=recursive)
+    sftp_client = _get_ssh_client(instance).open_sftp()
+    try:
+        if os.path.isdir(local_path):
+            local_path = os.path.join(local_path, os.path.basename(remote_path.rstrip("/")))
+        _get_path(sftp_client, remote_path, local_path, recursive)
+    finally:
+        sftp_client.close()
+
+
+def _get_path(sftp_client, remote_path, local_path, recursive):
+    if stat.S_ISDIR(sftp_client.stat(remote_path).st_mode):
+        if not recursive:
+            raise IsADirectoryError("{} is a folder, and recursive is not set".format(remote_path))
+        os.makedirs(local_path, exist_ok=True)
+        for attributes in sftp_client.listdir_attr(remote_path):
+            _get_path(sftp_client, remote_path.rstrip("/") + "/" + attributes.filename,
+                      os.path.join(local_path, attributes.filename), recursive)
+        return
+
+    with sftp_client.open(remote_path, "rb") as remote_file:
+        remote_file.prefetch()
+        with open(local_path, "wb") as local_file:
+            shutil.copyfileobj(remote_file, local_file, READ_SIZE)
 
 
 def _get_username(instance):
@@ -350,42 +722,84 @@ def _get_key_filename(instance):
     return pem_file
 
 
-def _clear_cache():
-    _get_ssh_client.cache_clear()
-    _get_scp_client.cache_clear()
+class SSHConnectionPool(object):
+    """
+    Thread safe pool of ssh connections, one per instance and public ip address. Connections are validated before
+    being handed out, and transparently reopened (with exponential backoff) if their transport is no longer active.
+    All the users of a connection share its transport, each one with its own channels.
+    """
 
+    def __init__(self, keepalive_interval=SSH_KEEPALIVE_INTERVAL, max_tries=MAX_TRIES):
+        self.keepalive_interval = keepalive_interval
+        self.max_tries = max_tries
+        self._clients = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, instance):
+        key = (instance.id, instance.public_ip_address)
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+
+        with lock:
+            ssh_client = self._clients.get(key)
+            transport = ssh_client.get_transport() if ssh_client is not None else None
+            if transport is None or not transport.is_active():
+                if ssh_client is not None:
+                    logging.warning("Connection to instance %s lost. Reconnecting...", instance.id)
+                    ssh_client.close()
+                ssh_client = self._connect(instance)
+                self._clients[key] = ssh_client
+            return ssh_client
+
+    def clear(self):
+        with self._lock:
+            for ssh_client in self._clients.values():
+                ssh_client.close()
+            self._clients.clear()
+            self._locks.clear()
+
+    def _connect(self, instance):
+        logging.info("Connecting to instance %s. Public IPv4 address: %s", instance.id,
+                     instance.public_ip_address)
+        ssh_client = paramiko.SSHClient()
+        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
-@functools.lru_cache()
-def _get_ssh_client(instance):
-    hostname = instance.public_ip_address
-    username = _get_username(instance)
-    key_filename = _get_key_filename(instance)
-    logging.info("Connecting to instance %s. Public IPv4 address: %s", instance.id,
-                 instance.public_ip_address)
+        delay = SSH_BACKOFF_BASE
+        for i in range(self.max_tries + 1):
+            try:
+                ssh_client.connect(hostname=instance.public_ip_address,
+                                   username=_get_username(instance),
+                                   key_filename=_get_key_filename(instance))
+                ssh_client.get_transport().set_keepalive(self.keepalive_interval)
+                return ssh_client
+            except (paramiko.SSHException, OSError) as e:
+                if i == self.max_tries:
+                    raise
+                logging.warning("Unable to connect to the instance (%s). Trying again in %d s...", e, delay)
+                time.sleep(delay)
+                delay = min(2 * delay, SSH_BACKOFF_MAX)
 
-    ssh_client = paramiko.SSHClient()
-    ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
-    i, is_connected = 0, False
-    while not is_connected and i <= MAX_TRIES:
-        try:
-            ssh_client.connect(hostname=hostname, username=username, key_filename=key_filename)
-            is_connected = True
-        except:
-            logging.warning("Unable to connect to the instance. Trying again...")
-            time.sleep(5)
-            i+= 1
+_ssh_pool = SSHConnectionPool()
+
 
-    return ssh_client
+def _clear_cache():
+    _ssh_pool.clear()
 
 
-@functools.lru_cache()
-def _get_scp_client(instance):
-    def progress(filename, size, sent):
-        sys.stdout.write("%s's progress: %.2f%%   \r" % (filename, float(sent) / float(size) * 100))
+def _get_ssh_client(instance):
+    return _ssh_pool.get(instance)
+
+
+def _get_scp_client(instance, progress=True):
+    """Each scp client opens its own channel, so they are not shared between threads"""
+    def print_progress(filename, size, sent):
+        with _print_lock:
+            sys.stdout.write("%s's progress: %.2f%%   \r" % (filename, float(sent) / float(size) * 100))
 
     ssh_client = _get_ssh_client(instance)
-    return scp.SCPClient(ssh_client.get_transport(), progress=progress)
+    return scp.SCPClient(ssh_client.get_transport(), progress=print_progress if progress else None)
 
 
 @functools.lru_cache()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Compares the bytes moved per training iteration when the sample batches carry the full observations
+against the shared memory transport, where they only carry references, as well as the memory needed to store
+the frame stacked observations with and without de-duplication. Also measures the time needed to resolve
+the references back into observations.
+"""
+from __future__ import print_function
+
+import argparse
+import pickle
+import time
+
+import numpy as np
+
+from rllib_integration.frame_ring import ObservationResolver, SharedMemoryTransport
+
+
+def get_batch_bytes(obs):
+    """Pickled size of a batch with the 'obs' and 'new_obs' columns, as in RLlib's sample batches"""
+    batch = {"obs": obs, "new_obs": obs}
+    return len(pickle.dumps(batch, protocol=4))
+
+
+def stack_episode(frames, frame_stack):
+    """Frame stacked observations of an episode, oldest frame first, as done by PPOExperiment"""
+    observations = []
+    for t in range(len(frames)):
+        stack = [frames[max(t - k, 0)] for k in range(frame_stack - 1, -1, -1)]
+        observations.append(np.concatenate(stack, axis=2))
+    return np.stack(observations)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument("--shape",
+                           nargs=3,
+                           type=int,
+                           default=[300, 300, 9],
+                           help="Shape of each frame (default: 300 300 9)")
+    argparser.add_argument("--frame-stack",
+                           type=int,
+                           default=4,
+                           help="Number of stacked frames per observation (default: 4)")
+    argparser.add_argument("--batch-size",
+                           type=int,
+                           default=64,
+                           help="Steps per training iteration, i.e 'train_batch_size' (default: 64)")
+    argparser.add_argument("--episode-length",
+                           type=int,
+                           default=20,
+                           help="Steps per episode (default: 20)")
+    args = argparser.parse_args()
+
+    frame_shape = tuple(args.shape)
+    obs_shape = frame_shape[:2] + (frame_shape[2] * args.frame_stack,)
+    frames = np.random.randint(0, 256, size=(args.batch_size,) + frame_shape, dtype=np.uint8)
+
+    transport = SharedMemoryTransport(obs_shape, frame_stack=args.frame_stack, capacity=args.batch_size)
+    resolver = ObservationResolver(obs_shape, frame_stack=args.frame_stack)
+    try:
+        observations, references = [], []
+        for start in range(0, args.batch_size, args.episode_length):
+            episode = stack_episode(frames[start:start + args.episode_length], args.frame_stack)
+            for t, obs in enumerate(episode):
+                references.append(transport.encode(obs, new_episode=t == 0))
+            observations.append(episode)
+        observations = np.concatenate(observations)
+        references = np.stack(references)
+
+        start = time.perf_counter()
+        resolved = resolver.resolve(references)
+        resolve_time = time.perf_counter() - start
+        assert np.array_equal(resolved, observations)
+
+        # RLlib builds the policy from zero filled batches, whose references have to resolve to zeros
+        zero_references = np.zeros_like(references[:2], dtype=np.float32)
+        assert not resolver.resolve(zero_references).any()
+
+        full_bytes = get_batch_bytes(observations)
+        reference_bytes = get_batch_bytes(references)
+        stored_bytes = transport.ring.capacity * frames[0].nbytes
+    finally:
+        transport.close()
+
+    print("Observation shape: {} | steps per iteration: {}".format(obs_shape, args.batch_size))
+    print("Full observations: {:10.2f} MB per iteration".format(full_bytes / 1e6))
+    print("References:        {:10.4f} MB per iteration ({:.0f}x less)".format(
+        reference_bytes / 1e6, full_bytes / reference_bytes))
+    print("Stored observations: {:8.2f} MB stacked | {:8.2f} MB de-duplicated".format(
+        observations.nbytes / 1e6, stored_bytes / 1e6))
+    print("Resolving the references took {:.2f} ms".format(resolve_time * 1000))
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Measures the SensorFactory: the cost of dispatching each sensor type through the registry, compared to the
+if/elif chain over the type strings it replaced, and the import footprint of the factory, before and after
+resolving the types used by the training.
+"""
+from __future__ import print_function
+
+import argparse
+import sys
+import timeit
+
+from benchmarks.startup import measure_import
+from rllib_integration.sensors.factory import BUILTIN_SENSORS, SensorFactory
+
+# Types in the order of the former if/elif chain
+CHAIN_TYPES = list(BUILTIN_SENSORS) + ["sensor.birdview"]
+
+TRAINING_TYPES = ["sensor.camera.semantic_segmentation", "sensor.other.collision"]
+
+# Last built-in sensor of the chain, its worst case
+WORST_TYPE = "sensor.other.obstacle"
+
+
+def dispatch_chain(type_):
+    """String comparisons done by the former factory before reaching the sensor class"""
+    for candidate in CHAIN_TYPES:
+        if type_ == candidate:
+            return candidate
+    raise RuntimeError("Sensor of type {} not supported".format(type_))
+
+
+def get_imported(code):
+    """Heavy modules imported after running the code in a fresh interpreter"""
+    module = "rllib_integration.sensors.factory"
+    _, imports = measure_import("{}; {}".format(module, code) if code else module)
+    return sorted(name for name in imports if name.split(".")[0] in ("carla", "pygame", "numpy")
+                  and "." not in name)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument("-n", "--number",
+                           type=int,
+                           default=100000,
+                           help="Dispatches measured per type (default: 100000)")
+    args = argparser.parse_args()
+
+    # Resolve the classes once, as the first dispatch of each type imports its module
+    types = TRAINING_TYPES + [WORST_TYPE]
+    for type_ in types:
+        SensorFactory.get_class(type_)
+
+    print("{:<40} | {:>14} | {:>14}".format("type", "chain (ns)", "registry (ns)"))
+    for type_ in types:
+        chain = timeit.timeit(lambda: dispatch_chain(type_), number=args.number) / args.number
+        registry = timeit.timeit(lambda: SensorFactory.get_class(type_), number=args.number) / args.number
+        print("{:<40} | {:>14.1f} | {:>14.1f}".format(type_, 1e9 * chain, 1e9 * registry))
+
+    print("\nModules imported by the factory")
+    print("  on import:             {}".format(", ".join(get_imported("")) or "none"))
+    resolve = "; ".join("SensorFactory.get_class('{}')".format(type_) for type_ in TRAINING_TYPES)
+    print("  after training types:  {}".format(", ".join(
+        get_imported("from rllib_integration.sensors.factory import SensorFactory; " + resolve)) or "none"))
+    print("  pygame loaded here:    {}".format("pygame" in sys.modules))
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Measures the import time of the entry points, each one in a fresh interpreter with `python -X importtime`,
+listing the slowest imports and which of the heavy dependencies got imported. With --config, it also measures
+the time-to-first-step of a rollout worker, i.e. the time since the start of its process until the env is
+created and until its first step ends (needs CARLA).
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import subprocess
+import sys
+
+DEFAULT_MODULES = [
+    "ppo_train",
+    "rllib_integration.supervised_env",
+    "rllib_integration.sensors.factory",
+    "ppo_implementation.ppo_experiment",
+]
+
+HEAVY_MODULES = ["ray", "torch", "carla", "cv2", "pygame", "tensorboard"]
+
+
+def parse_importtime(stderr):
+    """Parses the output of -X importtime into {module: (self, cumulative)}, in seconds"""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        imports[module.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    return imports
+
+
+def measure_import(module):
+    code = "import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)".format(module)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        raise RuntimeError("Unable to import {}:\n{}".format(module, result.stderr.splitlines()[-1]))
+    return float(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)
+
+
+def measure_first_step(configuration_file):
+    """Creates the env of the training in a new process, returning its startup timings"""
+    result = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--worker", configuration_file],
+                            stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_worker(configuration_file):
+    """Creates the env as a rollout worker would, and takes a single step with a random action"""
+    import yaml
+
+    from ppo_train import EXPERIMENT_CLASS
+    from rllib_integration.supervised_env import SupervisedCarlaEnv
+
+    with open(configuration_file) as f:
+        env_config = yaml.load(f, Loader=yaml.FullLoader)["env_config"]
+    env_config["experiment"]["type"] = EXPERIMENT_CLASS
+
+    env = SupervisedCarlaEnv(env_config)
+    try:
+        env.step(env.action_space.sample())
+        print(json.dumps(env.startup_timings))
+    finally:
+        env.close()
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument("--modules",
+                           nargs="+",
+                           default=DEFAULT_MODULES,
+                           help="Modules to import (default: the training entry points)")
+    argparser.add_argument("--top",
+                           type=int,
+                           default=10,
+                           help="Number of slowest imports listed per module (default: 10)")
+    argparser.add_argument("--config",
+                           default=None,
+                           help="Configuration file (*.yaml) used to measure the time-to-first-step")
+    argparser.add_argument("--worker",
+                           default=None,
+                           help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+
+    if args.worker is not None:
+        run_worker(args.worker)
+        return
+
+    for module in args.modules:
+        try:
+            elapsed, imports = measure_import(module)
+        except RuntimeError as e:
+            print("\n{}".format(e))
+            continue
+        heavy = [name for name in HEAVY_MODULES if name in imports]
+        print("\n{}: {:.3f} s (heavy imports: {})".format(module, elapsed, ", ".join(heavy) or "none"))
+        print("  {:<50} | {:>10} | {:>10}".format("module", "self (s)", "cumul. (s)"))
+        slowest = sorted(imports.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+        for name, (self_time, cumulative) in slowest:
+            print("  {:<50} | {:>10.3f} | {:>10.3f}".format(name[-50:], self_time, cumulative))
+
+    if args.config is not None:
+        timings = measure_first_step(args.config)
+        print("\nTime-to-first-step")
+        for key, value in timings.items():
+            print("  {:<20} {:>8.2f} s".format(key, value))
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Evaluates one or more checkpoints, running their episodes in parallel across Ray workers.
+Each episode has a fixed seed, town and weather, so that different checkpoints are evaluated
+on the same scenarios. The results are summarized in a table (and optionally saved as a csv file).
+"""
+from __future__ import print_function
+
+import argparse
+import copy
+import csv
+import itertools
+import random
+
+import numpy as np
+import yaml
+
+import ray
+from ray.rllib.agents.ppo import PPOTrainer
+
+from rllib_integration.carla_env import CarlaEnv
+from rllib_integration.shared_memory_model import configure_observation_transport
+
+from ppo_implementation.ppo_experiment import PPOExperiment
+
+# Set the experiment to EXPERIMENT_CLASS so that it is passed to the configuration
+EXPERIMENT_CLASS = PPOExperiment
+
+EPISODE_FIELDS = ["checkpoint", "town", "weather", "seed", "return", "length", "distance",
+                  "collision", "idle", "falling", "max_time", "truncated"]
+
+
+def parse_config(args):
+    """
+    Parses the .yaml configuration file into a readable dictionary
+    """
+    with open(args.configuration_file) as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+        config["env"] = CarlaEnv
+        config["env_config"]["experiment"]["type"] = EXPERIMENT_CLASS
+        config["num_workers"] = 0
+        config["explore"] = False
+        config["num_gpus"] = args.gpus_per_worker
+        del config["num_cpus_per_worker"]
+        del config["num_gpus_per_worker"]
+
+    return configure_observation_transport(config, EXPERIMENT_CLASS)
+
+
+def get_scenarios(num_episodes, towns, weathers, seed):
+    """Returns the (town, weather, seeds) of each group of episodes, spreading them evenly across
+    all the town and weather combinations"""
+    combinations = list(itertools.product(towns, weathers))
+    scenarios = {}
+    for i in range(num_episodes):
+        scenarios.setdefault(combinations[i % len(combinations)], []).append(seed + i)
+    return [(town, weather, seeds) for (town, weather), seeds in scenarios.items()]
+
+
+@ray.remote
+def evaluate(config, checkpoint, town, weather, seeds, max_steps):
+    """Runs one episode per seed, all of them at the same town and weather"""
+    config = copy.deepcopy(config)
+    experiment_config = config["env_config"]["experiment"]
+    experiment_config["town"] = [town]
+    experiment_config["weather"] = weather
+    experiment_config.setdefault("background_activity", {})["seed"] = seeds[0]
+
+    # The background activity is spawned when creating the environment
+    random.seed(seeds[0])
+    np.random.seed(seeds[0])
+
+    agent = PPOTrainer(env=CarlaEnv, config=config)
+    agent.restore(checkpoint)
+    env = agent.workers.local_worker().env
+
+    results = []
+    try:
+        for seed in seeds:
+            random.seed(seed)
+            np.random.seed(seed)
+
+            obs = env.reset()
+            episode_return, length, done = 0.0, 0, False
+            while not done and length < max_steps:
+                action = agent.compute_action(obs)
+                obs, reward, done, _ = env.step(action)
+                episode_return += reward
+                length += 1
+
+            experiment = env.experiment
+            results.append({
+                "checkpoint": checkpoint,
+                "town": town,
+                "weather": weather,
+                "seed": seed,
+                "return": episode_return,
+                "length": length,
+                "distance": experiment.distance_traveled,
+                "collision": experiment.collision,
+                "idle": experiment.done_time_idle,
+                "falling": experiment.done_falling,
+                "max_time": experiment.done_time_episode,
+                "truncated": not done,
+            })
+    finally:
+        env.close()
+        agent.stop()
+
+    return results
+
+
+def print_summary(checkpoints, results):
+    print("\n{:<50} | {:>8} | {:>16} | {:>12} | {:>9} | {:>9} | {:>9}".format(
+        "checkpoint", "episodes", "return", "distance (m)", "collision", "idle", "truncated"))
+    for checkpoint in checkpoints:
+        episodes = [r for r in results if r["checkpoint"] == checkpoint]
+        returns = np.array([r["return"] for r in episodes])
+        print("{:<50} | {:>8} | {:>8.1f} ± {:>5.1f} | {:>12.1f} | {:>8.0f}% | {:>8.0f}% | {:>8.0f}%".format(
+            checkpoint[-50:],
+            len(episodes),
+            np.mean(returns),
+            np.std(returns),
+            np.mean([r["distance"] for r in episodes]),
+            100 * np.mean([r["collision"] for r in episodes]),
+            100 * np.mean([r["idle"] for r in episodes]),
+            100 * np.mean([r["truncated"] for r in episodes])))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument("configuration_file",
+                           help="Configuration file (*.yaml)")
+    argparser.add_argument("checkpoints",
+                           nargs="+",
+                           help="Checkpoints to evaluate")
+    argparser.add_argument("-e", "--episodes",
+                           type=int,
+                           default=10,
+                           help="Number of episodes per checkpoint (default: 10)")
+    argparser.add_argument("--towns",
+                           nargs="+",
+                           default=None,
+                           help="Towns of the episodes (default: the ones of the configuration file)")
+    argparser.add_argument("--weathers",
+                           nargs="+",
+                           default=["ClearNoon"],
+                           help="Weather presets of the episodes (default: ClearNoon)")
+    argparser.add_argument("--seed",
+                           type=int,
+                           default=0,
+                           help="Seed of the first episode. The rest use consecutive seeds (default: 0)")
+    argparser.add_argument("--max-steps",
+                           type=int,
+                           default=2000,
+                           help="Maximum number of steps per episode (default: 2000)")
+    argparser.add_argument("--cpus-per-worker",
+                           type=float,
+                           default=3,
+                           help="CPUs reserved by each evaluation worker (default: 3)")
+    argparser.add_argument("--gpus-per-worker",
+                           type=float,
+                           default=0.8,
+                           help="GPUs reserved by each evaluation worker (default: 0.8)")
+    argparser.add_argument("-o", "--output",
+                           default=None,
+                           help="CSV file where the results of each episode are saved")
+    argparser.add_argument("--auto",
+                           action="store_true",
+                           default=False,
+                           help="Flag to use auto address")
+
+    args = argparser.parse_args()
+    args.config = parse_config(args)
+    towns = args.towns or args.config["env_config"]["experiment"]["town"]
+    if isinstance(towns, str):
+        towns = [towns]
+
+    try:
+        ray.init(address="auto" if args.auto else None)
+
+        tasks = []
+        for checkpoint in args.checkpoints:
+            for town, weather, seeds in get_scenarios(args.episodes, towns, args.weathers, args.seed):
+                tasks.append(evaluate.options(num_cpus=args.cpus_per_worker, num_gpus=args.gpus_per_worker)
+                             .remote(args.config, checkpoint, town, weather, seeds, args.max_steps))
+
+        results = list(itertools.chain.from_iterable(ray.get(tasks)))
+
+    finally:
+        ray.shutdown()
+
+    print_summary(args.checkpoints, results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            writer = csv.DictWriter(f, fieldnames=EPISODE_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Exports a 'checkpoint_state_dict.pth' into a TorchScript (*.ts) or ONNX (*.onnx) model,
+checking the numerical parity and the latency of the exported model against the eager one.
+With '--calibration', the model is int8 quantized (TorchScript only) using the given recorded observations.
+"""
+from __future__ import print_function
+
+import argparse
+import yaml
+
+import numpy as np
+import torch
+
+from ppo_implementation.ppo_experiment import PPOExperiment
+
+from ppo_implementation.ppo_export import ExportedPPOModel, check_parity, export_model, load_eager_model, \
+    measure_latency
+from ppo_implementation.ppo_quantization import DEFAULT_TOLERANCE, load_observations, quantize_static
+
+# Set the experiment to EXPERIMENT_CLASS so that it is passed to the configuration
+EXPERIMENT_CLASS = PPOExperiment
+
+
+def parse_config(args):
+    """
+    Parses the .yaml configuration file into a readable dictionary
+    """
+    with open(args.configuration_file) as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+        config["env_config"]["experiment"]["type"] = EXPERIMENT_CLASS
+
+    return config
+
+
+def print_latency(name, latency):
+    print("{:<10} mean: {:8.2f} ms | p50: {:8.2f} ms | p90: {:8.2f} ms | p99: {:8.2f} ms".format(
+        name, latency["mean"], latency["p50"], latency["p90"], latency["p99"]))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument("configuration_file",
+                           help="Configuration file of the run (*.yaml)")
+    argparser.add_argument("checkpoint",
+                           help="Checkpoint file with the model information (*.pth)")
+    argparser.add_argument("output",
+                           help="Exported model file (*.ts or *.onnx)")
+    argparser.add_argument("--format",
+                           choices=["torchscript", "onnx"],
+                           default=None,
+                           help="Format of the exported model. Defaults to the one given by the output extension")
+    argparser.add_argument("--samples",
+                           type=int,
+                           default=16,
+                           help="Number of observations used for the parity check (default: 16)")
+    argparser.add_argument("--tolerance",
+                           type=float,
+                           default=None,
+                           help="Maximum absolute difference allowed between both models (default: 1e-3, 0.1 if quantized)")
+    argparser.add_argument("--channels-last",
+                           action="store_true",
+                           default=False,
+                           help="Flag to store the convolution weights as channels last")
+    argparser.add_argument("--calibration",
+                           nargs="+",
+                           default=None,
+                           help="Recorded episodes (folders of the recorder) or *.npy files of observations used to quantize the model")
+    argparser.add_argument("--calibration-samples",
+                           type=int,
+                           default=256,
+                           help="Number of observations used to calibrate the quantized model (default: 256)")
+    argparser.add_argument("--backend",
+                           choices=["fbgemm", "qnnpack"],
+                           default="fbgemm",
+                           help="Quantization backend, fbgemm for x86 and qnnpack for ARM (default: fbgemm)")
+    argparser.add_argument("--iterations",
+                           type=int,
+                           default=100,
+                           help="Number of forward passes used to measure the latency (default: 100)")
+    argparser.add_argument("--threads",
+                           type=int,
+                           default=None,
+                           help="Number of CPU threads used by torch and onnxruntime")
+
+    args = argparser.parse_args()
+    args.config = parse_config(args)
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    model = load_eager_model(args.config, args.checkpoint)
+    if args.channels_last:
+        model.to_channels_last()
+
+    if args.calibration:
+        # The parity check uses recorded observations, not part of the calibration set
+        data = load_observations(args.calibration, args.samples + args.calibration_samples)
+        obs, calibration_data = data[:args.samples], data[args.samples:]
+        exported_model = quantize_static(model, calibration_data, args.backend)
+        tolerance = DEFAULT_TOLERANCE if args.tolerance is None else args.tolerance
+    else:
+        obs = np.random.randint(0, 256, size=(args.samples,) + tuple(model.obs_shape), dtype=np.uint8)
+        exported_model = model
+        tolerance = 1e-3 if args.tolerance is None else args.tolerance
+
+    export_model(exported_model, args.output, args.format)
+    print("Model exported to '{}'".format(args.output))
+
+    exported = ExportedPPOModel(args.output, num_threads=args.threads)
+
+    # Parity check of the actions
+    max_error = check_parity(model, exported, obs)
+    print("Maximum absolute difference with the eager model: {:.3e}".format(max_error))
+    if max_error > tolerance:
+        raise RuntimeError("The exported model differs from the eager one by more than {}".format(tolerance))
+
+    # Per frame latency, at batch size 1
+    single_obs = obs[:1]
+    with torch.no_grad():
+        eager_latency = measure_latency(lambda x: model.forward_batch(torch.from_numpy(x)), single_obs, args.iterations)
+    exported_latency = measure_latency(exported.run, single_obs, args.iterations)
+
+    print_latency("eager", eager_latency)
+    print_latency(exported.format, exported_latency)
+    print("Speedup: {:.2f}x".format(eager_latency["mean"] / exported_latency["mean"]))
+
+
+if __name__ == '__main__':
+
+    main()
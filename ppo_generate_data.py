@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Generates expert driving data by putting the hero on the Traffic Manager's autopilot and recording its
+episodes (semantic cameras, applied controls and telemetry, see rllib_integration/recorder.py). The episodes
+are sharded by town and weather across Ray workers, each one of them with its own CARLA server.
+"""
+from __future__ import print_function
+
+import argparse
+import copy
+import itertools
+import os
+import random
+import time
+
+import numpy as np
+import yaml
+
+import ray
+
+from rllib_integration.carla_env import CarlaEnv
+
+from ppo_implementation.ppo_experiment import PPOExperiment
+
+# Set the experiment to EXPERIMENT_CLASS so that it is passed to the configuration
+EXPERIMENT_CLASS = PPOExperiment
+
+
+def parse_config(args):
+    """
+    Parses the .yaml configuration file into the configuration of the CarlaEnv
+    """
+    with open(args.configuration_file) as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+        env_config = config["env_config"]
+        env_config["experiment"]["type"] = EXPERIMENT_CLASS
+        env_config["experiment"]["hero"]["autopilot"] = True
+        env_config.pop("observation_transport", None)
+
+        # Only the hero sensors have to be rendered
+        env_config["carla"]["show_display"] = False
+        env_config["carla"]["move_spectator"] = False
+
+    return env_config
+
+
+def get_shards(num_episodes, towns, weathers, episodes_per_worker, seed):
+    """Returns the (town, weather, seeds) of each worker, spreading the episodes evenly across
+    all the town and weather combinations"""
+    combinations = list(itertools.product(towns, weathers))
+    episodes = {}
+    for i in range(num_episodes):
+        episodes.setdefault(combinations[i % len(combinations)], []).append(seed + i)
+
+    shards = []
+    for (town, weather), seeds in episodes.items():
+        for i in range(0, len(seeds), episodes_per_worker):
+            shards.append((town, weather, seeds[i:i + episodes_per_worker]))
+    return shards
+
+
+@ray.remote
+def generate(env_config, directory, town, weather, seeds, max_steps):
+    """Records one autopilot episode per seed, all of them at the same town and weather"""
+    env_config = copy.deepcopy(env_config)
+    env_config["experiment"]["town"] = [town]
+    env_config["experiment"]["weather"] = weather
+    env_config["experiment"].setdefault("background_activity", {})["seed"] = seeds[0]
+    env_config["recorder"] = dict(env_config.get("recorder") or {},
+                                  directory=os.path.join(directory, "{}_{}".format(town, weather)))
+
+    random.seed(seeds[0])
+    np.random.seed(seeds[0])
+    env = CarlaEnv(env_config)
+
+    steps = 0
+    try:
+        for seed in seeds:
+            random.seed(seed)
+            np.random.seed(seed)
+
+            env.reset()
+            length, done = 0, False
+            while not done and length < max_steps:
+                _, _, done, _ = env.step(None)
+                length += 1
+            steps += length
+    finally:
+        env.close()
+
+    return steps
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument("configuration_file",
+                           help="Configuration file (*.yaml)")
+    argparser.add_argument("directory",
+                           help="Directory where the episodes are recorded")
+    argparser.add_argument("-e", "--episodes",
+                           type=int,
+                           default=100,
+                           help="Number of episodes (default: 100)")
+    argparser.add_argument("--episodes-per-worker",
+                           type=int,
+                           default=5,
+                           help="Maximum number of episodes recorded by each worker (default: 5)")
+    argparser.add_argument("--towns",
+                           nargs="+",
+                           default=None,
+                           help="Towns of the episodes (default: the ones of the configuration file)")
+    argparser.add_argument("--weathers",
+                           nargs="+",
+                           default=["ClearNoon", "WetNoon", "CloudySunset"],
+                           help="Weather presets of the episodes (default: ClearNoon WetNoon CloudySunset)")
+    argparser.add_argument("--seed",
+                           type=int,
+                           default=0,
+                           help="Seed of the first episode. The rest use consecutive seeds (default: 0)")
+    argparser.add_argument("--max-steps",
+                           type=int,
+                           default=2000,
+                           help="Maximum number of steps per episode (default: 2000)")
+    argparser.add_argument("--cpus-per-worker",
+                           type=float,
+                           default=3,
+                           help="CPUs reserved by each worker (default: 3)")
+    argparser.add_argument("--gpus-per-worker",
+                           type=float,
+                           default=0.8,
+                           help="GPUs reserved by each worker (default: 0.8)")
+    argparser.add_argument("--auto",
+                           action="store_true",
+                           default=False,
+                           help="Flag to use auto address")
+
+    args = argparser.parse_args()
+    env_config = parse_config(args)
+    towns = args.towns or env_config["experiment"]["town"]
+    if isinstance(towns, str):
+        towns = [towns]
+
+    shards = get_shards(args.episodes, towns, args.weathers, args.episodes_per_worker, args.seed)
+
+    try:
+        ray.init(address="auto" if args.auto else None)
+
+        start = time.time()
+        tasks = [generate.options(num_cpus=args.cpus_per_worker, num_gpus=args.gpus_per_worker)
+                 .remote(env_config, args.directory, town, weather, seeds, args.max_steps)
+                 for town, weather, seeds in shards]
+        steps = sum(ray.get(tasks))
+        elapsed = time.time() - start
+
+    finally:
+        ray.shutdown()
+
+    print("Recorded {} episodes ({} steps) with {} workers in {:.0f} s ({:.1f} steps/s)".format(
+        args.episodes, steps, len(shards), elapsed, steps / elapsed))
+
+
+if __name__ == "__main__":
+
+    main()
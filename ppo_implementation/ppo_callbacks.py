@@ -20,6 +20,9 @@ class PPOCallbacks(DefaultCallbacks):
     def on_episode_start(self, worker, base_env, policies, episode, **kwargs):
         episode.user_data["heading_deviation"] = []
 
+        # Time spent resetting the hero and its sensors for this episode
+        episode.user_data["reset_timings"] = dict(worker.env.core.reset_timings)
+
     def on_episode_step(self, worker, base_env, episode, **kwargs):
         heading_deviation = worker.env.experiment.last_heading_deviation
         if heading_deviation > 0:
@@ -32,3 +35,38 @@ class PPOCallbacks(DefaultCallbacks):
         else:
             heading_deviation = 0
         episode.custom_metrics["heading_deviation"] = heading_deviation
+
+        for key, value in episode.user_data["reset_timings"].items():
+            episode.custom_metrics["reset_{}_ms".format(key)] = 1000 * value
+
+        # Startup time of the worker, reported only by its first episode
+        startup_timings = getattr(worker.env, "startup_timings", None)
+        if startup_timings and "first_step" in startup_timings and not getattr(self, "startup_reported", False):
+            for key, value in startup_timings.items():
+                episode.custom_metrics["startup_{}_s".format(key)] = value
+            self.startup_reported = True
+
+        # Server restarts of the environment (see rllib_integration/supervised_env.py)
+        if hasattr(worker.env, "restarts"):
+            episode.custom_metrics["server_restarts"] = worker.env.restarts
+            episode.custom_metrics["truncated_episodes"] = float(worker.env.truncated)
+
+        # Resource usage of the server since the last episode, as time series
+        watchdog = getattr(worker.env, "watchdog", None)
+        if watchdog is not None:
+            samples = watchdog.pop_samples()
+            for key in ("rss_mb", "cpu_percent", "gpu_memory_mb"):
+                values = [sample[key] for sample in samples if not np.isnan(sample[key])]
+                if values:
+                    episode.hist_data["server_{}".format(key)] = values
+                    episode.custom_metrics["server_{}".format(key)] = values[-1]
+            episode.custom_metrics["server_recycles"] = worker.env.recycles
+
+        # Move the spawn curriculum according to the result of the episode
+        core = worker.env.core
+        if core.spawn_sampler is not None:
+            experiment = worker.env.experiment
+            success = not (experiment.collision or experiment.done_falling or experiment.done_time_idle)
+            core.spawn_sampler.update(success)
+            episode.custom_metrics["spawn_difficulty"] = core.spawn_difficulty
+            episode.custom_metrics["curriculum_level"] = core.spawn_sampler.level
@@ -19,6 +19,10 @@ import carla
 
 from rllib_integration.base_experiment import BaseExperiment
 from rllib_integration.helper import post_process_image
+from rllib_integration.recorder import get_telemetry
+from rllib_integration.sensors.camera_plan import get_camera_shape
+
+from ppo_implementation.ppo_reward import compute_rewards, stack_telemetry
 
 
 class PPOExperiment(BaseExperiment):
@@ -46,6 +50,7 @@ class PPOExperiment(BaseExperiment):
         # hero variables
         self.last_location = None
         self.last_velocity = 0
+        self.distance_traveled = 0
 
         # Sensor stack
         self.prev_image_0 = None
@@ -65,16 +70,18 @@ class PPOExperiment(BaseExperiment):
     def get_observation_space(self):
         num_of_channels = 3
         count_of_cameras = 3
+        # Size of the parsed images, taking into account the optional crop and output size of the cameras
+        height, width, _ = get_camera_shape(self.config["hero"]["sensors"]["cam_sem_seg_front"])
         image_space = Box(
             low=0.0,
             high=255.0,
             shape=(
-                self.config["hero"]["sensors"]["cam_sem_seg_front"]["image_size_x"],
-                self.config["hero"]["sensors"]["cam_sem_seg_front"]["image_size_y"],
+                height,
+                width,
                 num_of_channels * count_of_cameras * self.frame_stack,
             ),
             dtype=np.uint8,
-        ) #observations of shape [image_size_x, image_size_y, num_of_channels * count_of_cameras * frame_stack]
+        ) #observations of shape [height, width, num_of_channels * count_of_cameras * frame_stack]
         return image_space
 
     def get_actions(self):
@@ -138,6 +145,11 @@ class PPOExperiment(BaseExperiment):
 
         return images, {}
 
+    def get_replay_observation(self, observation, telemetry):
+        """Recorded observations are already stacked, only the collision has to be updated"""
+        self.collision = bool(telemetry["collision"])
+        return observation, {}
+
     def get_speed(self, hero):
         """Computes the speed of the hero vehicle in Km/h"""
         vel = hero.get_velocity()
@@ -159,153 +171,37 @@ class PPOExperiment(BaseExperiment):
         return self.done_time_idle or self.done_falling or self.done_time_episode or self.collision
 
     def compute_reward(self, observation, core):
-        """Computes the reward"""
-
-        max_speed = 20
-        max_reactive_distance = 6
-        alpha = max_speed/(max_reactive_distance-1)
-        beta = -alpha
-
-        def unit_vector(vector):
-            return vector / np.linalg.norm(vector)
-        
-        def compute_angle(u, v):
-            return -math.atan2(u[0]*v[1] - u[1]*v[0], u[0]*v[0] + u[1]*v[1])
-        
-        def find_current_waypoint(map_, hero):
-            return map_.get_waypoint(hero.get_location(), project_to_road=False, lane_type=carla.LaneType.Any)
-        
-        def inside_lane(waypoint, allowed_types):
-            if waypoint is not None:
-                return waypoint.lane_type in allowed_types
-            return False
-        
-        def compute_distance(v,u):
-            return float(np.sqrt(np.square(v.x - u.x) + np.square(v.y - u.y)))
-        
-
-        def compute_optimal_speed(distance):
-            if (distance>max_reactive_distance):
-                return max_speed
-            elif (distance<1):
-                return 0
-            else:
-                return alpha*distance+beta
-            
-        def get_target_distance():
-            return carla.Location(
-                    x=hero_location.x+hero_heading[0]*max_reactive_distance,
-                    y=hero_location.y+hero_heading[1]*max_reactive_distance,
-                    z=hero_location.z
-                )
-                    
-        world = core.world
-        hero = core.hero
-        map_ = core.map
-
-        # Hero-related variables
-        hero_location = hero.get_location()
-        hero_velocity = self.get_speed(hero)
-        hero_heading = hero.get_transform().get_forward_vector()
-        hero_heading = [hero_heading.x, hero_heading.y]
+        """Computes the reward, as a batch of one transition (see ppo_reward.py)"""
+        telemetry = stack_telemetry([get_telemetry(core, {})])
+        hero_location = telemetry["hero_location"]
 
         # Initialize last location
-        if self.last_location == None:
+        if self.last_location is None:
             self.last_location = hero_location
-
-        # Compute deltas
-        delta_distance = compute_distance(hero_location, self.last_location)
-        delta_velocity = hero_velocity - self.last_velocity
+        last_steer = self.last_action.steer if self.last_action is not None else 0.0
+
+        rewards, terms = compute_rewards(
+            telemetry,
+            last_location=self.last_location,
+            last_speed=np.array([self.last_velocity]),
+            last_steer=np.array([last_steer]),
+            allowed_lane_types=[int(lane_type) for lane_type in self.allowed_types],
+            done_falling=np.array([self.done_falling]),
+            done_idle=np.array([self.done_time_idle]),
+            done_max_time=np.array([self.done_time_episode]),
+            collision=np.array([self.collision]))
 
         # Update variables
         self.last_location = hero_location
-        self.last_velocity = hero_velocity
-
-        # Reward if going forward
-        reward = delta_distance
-
-        # Reward if going faster than last step
-        if hero_velocity < max_speed:
-            reward += 0.05 * delta_velocity
-
-        # Penalize if not inside the lane
-        closest_waypoint = map_.get_waypoint(
-            hero_location,
-            project_to_road=False,
-            lane_type=carla.LaneType.Any
-        )
-
-        if closest_waypoint is None or closest_waypoint.lane_type not in self.allowed_types:
-            reward += -0.5
-            self.last_heading_deviation = math.pi
-            
-        else:
-            if not closest_waypoint.is_junction:
-                wp_heading = closest_waypoint.transform.get_forward_vector()
-                wp_heading = [wp_heading.x, wp_heading.y]
-                angle = compute_angle(hero_heading, wp_heading)
-                self.last_heading_deviation = abs(angle)
-
-
-                #Penalize deviating lane heading [0,1]
-                reward += -self.last_heading_deviation/math.pi
-
-
-                #Penalize distance from center of the lane
-                closest_waypoint_in_lane = map_.get_waypoint(hero_location, lane_type=carla.LaneType.Driving | carla.LaneType.Parking)
-                lane_center_deviation = compute_distance(
-                        closest_waypoint.transform.location,
-                        closest_waypoint_in_lane.transform.location,
-                    )
-                
-                reward += -lane_center_deviation/closest_waypoint_in_lane.lane_width
-
-
-                if np.dot(hero_heading, wp_heading) < 0:
-                    # Car is in the wrong direction
-                    reward += -0.5
-
-                else:
-                    if abs(math.sin(angle)) > 0.4:
-                        if self.last_action == None:
-                            self.last_action = carla.VehicleControl()
-
-                        if self.last_action.steer * math.sin(angle) >= 0:
-                            reward -= 0.05
-            else:
-                self.last_heading_deviation = 0
-
-
-            reaction_distance = np.Infinity
-
-            #Nearest traffic Light Distance
-            front_traffic_lights = hero.get_traffic_light()
-            if front_traffic_lights!=None:
-                reaction_distance = compute_distance(front_traffic_lights.get_location(), hero_location)
-
-            #Nearest vehicle in fov
-            for veh in world.get_actors().filter("vehicle.*"):
-                distance_a = compute_distance(veh.get_location(),hero_location)
-                distance_b = compute_distance(veh.get_location(),get_target_distance())
-                if distance_a<max_reactive_distance and distance_b<max_reactive_distance:
-                    reaction_distance = min((reaction_distance,distance_a))
-            
-            optimal_speed = compute_optimal_speed(reaction_distance)
-
-            #Penalize optimal velocity deviation 
-            reward += -abs(hero_velocity-optimal_speed)/max_speed+1
-
+        self.last_velocity = float(terms["speed"][0])
+        self.distance_traveled += float(terms["delta_distance"][0])
+        self.last_heading_deviation = float(terms["heading_deviation"][0])
 
-        if self.done_falling:
-            reward += -40
         if self.done_time_idle:
             print("Done idle")
-            reward += -100
         if self.done_time_episode:
             print("Done max time")
-            reward += 100
         if self.collision:
             print("Collision")
-            reward += -100
 
-        return reward
+        return float(rewards[0])
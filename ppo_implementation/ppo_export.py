@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Export of the CustomPPOModel into TorchScript / ONNX artifacts, and the runtime used to run them
+"""
+
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from ppo_implementation.ppo_inference_model import CustomPPOModel
+from ppo_implementation.ppo_quantization import QuantizedPPOModel
+
+# Extensions used to identify each one of the exported formats
+EXPORT_EXTENSIONS = {
+    ".ts": "torchscript",
+    ".onnx": "onnx",
+}
+
+
+def get_export_format(path):
+    """Returns the format of an exported model based on its extension, or None if the file is
+    not an exported model (i.e, a state dictionary)"""
+    return EXPORT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), None)
+
+
+def load_eager_model(config, checkpoint):
+    """Loads a 'checkpoint_state_dict.pth' into a CPU based CustomPPOModel"""
+    model = CustomPPOModel.from_config(config, gpu_n=-1)
+    model.load_state_dict(torch.load(checkpoint, map_location="cpu"))
+    model.eval()
+    return model
+
+
+def load_inference_model(config, checkpoint, gpu_n=-1, channels_last=False):
+    """Loads either an exported model, which is run on the CPU, or a state dictionary into a CustomPPOModel"""
+    if get_export_format(checkpoint) is not None:
+        return ExportedPPOModel(checkpoint)
+
+    model = CustomPPOModel.from_config(config, gpu_n=gpu_n)
+    model.load_state_dict(torch.load(checkpoint, map_location=model.device))
+    model.eval()
+    model.to(model.device)
+    if channels_last:
+        model.to_channels_last()
+    return model
+
+
+class ExportWrapper(nn.Module):
+    """Exposes CustomPPOModel.forward_batch as the forward of the module, so that the preprocessing
+    of the observations is traced together with the network"""
+
+    def __init__(self, model):
+        super(ExportWrapper, self).__init__()
+        self.model = model
+
+    def forward(self, obs):
+        return self.model.forward_batch(obs)
+
+
+def export_model(model, output, export_format=None):
+    """Exports the model into 'output'. The exported graph takes a batch of uint8 observations
+    [B, H, W, C] and returns the deterministic actions, same as CustomPPOModel.forward_batch"""
+
+    export_format = export_format or get_export_format(output)
+    if export_format not in EXPORT_EXTENSIONS.values():
+        raise ValueError("Unknown export format ({})!".format(export_format))
+    if export_format == "onnx" and isinstance(model, QuantizedPPOModel):
+        raise ValueError("Quantized models can only be exported to TorchScript")
+
+    wrapper = ExportWrapper(model).eval()
+    example = torch.zeros((1,) + tuple(model.obs_shape), dtype=torch.uint8)
+
+    with torch.no_grad():
+        if export_format == "torchscript":
+            traced = torch.jit.trace(wrapper, example)
+            if hasattr(torch.jit, "freeze"):
+                traced = torch.jit.freeze(traced)
+            traced.save(output)
+        else:
+            torch.onnx.export(
+                wrapper,
+                example,
+                output,
+                input_names=["obs"],
+                output_names=["output"],
+                dynamic_axes={"obs": {0: "batch"}, "output": {0: "batch"}},
+                opset_version=11
+            )
+
+    return output
+
+
+class ExportedPPOModel(object):
+    """
+    CPU runtime of an exported CustomPPOModel. Both formats share the same interface as the eager model:
+    'run' works with batches of observations and calling the instance with one observation returns the action
+    """
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.format = get_export_format(path)
+
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+
+        if self.format == "torchscript":
+            self._module = torch.jit.load(path, map_location="cpu")
+            self._module.eval()
+        elif self.format == "onnx":
+            try:
+                import onnxruntime
+            except ImportError:
+                raise ImportError("onnxruntime is needed to run ONNX models. Install it with 'pip install onnxruntime'")
+
+            options = onnxruntime.SessionOptions()
+            if num_threads is not None:
+                options.intra_op_num_threads = num_threads
+            self._session = onnxruntime.InferenceSession(path, options)
+            self._input_name = self._session.get_inputs()[0].name
+        else:
+            raise ValueError("'{}' is not an exported model".format(path))
+
+    def run(self, obs):
+        """Runs the model over a batch of observations [B, H, W, C]. Returns a numpy array"""
+        obs = np.ascontiguousarray(obs, dtype=np.uint8)
+        if self.format == "torchscript":
+            with torch.no_grad():
+                return self._module(torch.from_numpy(obs)).numpy()
+        return self._session.run(None, {self._input_name: obs})[0]
+
+    def __call__(self, inputs):
+        return self.run(inputs[np.newaxis])[0]
+
+
+def check_parity(eager_model, exported_model, obs):
+    """Returns the maximum absolute difference between the eager and the exported models' outputs"""
+    with torch.no_grad():
+        expected = eager_model.forward_batch(torch.from_numpy(obs)).numpy()
+    actual = exported_model.run(obs)
+    return float(np.max(np.abs(expected - actual)))
+
+
+def measure_latency(function, obs, iterations=100, warmup=10):
+    """Calls 'function(obs)' several times, returning the latency statistics in milliseconds"""
+    for _ in range(warmup):
+        function(obs)
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function(obs)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies = np.array(latencies)
+    return {
+        "mean": float(np.mean(latencies)),
+        "p50": float(np.percentile(latencies, 50)),
+        "p90": float(np.percentile(latencies, 90)),
+        "p99": float(np.percentile(latencies, 99)),
+    }
@@ -7,9 +7,46 @@
 # For a copy, see <https://opensource.org/licenses/MIT>.
 
 
+import numpy as np
 import torch
 import torch.nn as nn
 
+# Same as the 'conv_filters' of ppo_config.yaml
+DEFAULT_CONV_FILTERS = [
+    [16, [5, 5], 4],
+    [32, [5, 5], 2],
+    [32, [5, 5], 2],
+    [64, [5, 5], 1],
+    [64, [5, 5], 2],
+    [128, [5, 5], 2],
+    [512, [5, 5], 1],
+]
+
+# torch.inference_mode is only available from torch 1.9 onwards
+inference_mode = getattr(torch, "inference_mode", torch.no_grad)
+
+
+def same_padding(in_size, filter_size, stride_size):
+    """Computes the padding needed to keep the output size equal to ceil(in_size / stride), as done by RLlib"""
+    in_height, in_width = in_size
+    if isinstance(filter_size, int):
+        filter_height, filter_width = filter_size, filter_size
+    else:
+        filter_height, filter_width = filter_size
+    stride_height, stride_width = stride_size
+
+    out_height = int(np.ceil(float(in_height) / float(stride_height)))
+    out_width = int(np.ceil(float(in_width) / float(stride_width)))
+
+    pad_along_height = int(((out_height - 1) * stride_height + filter_height - in_height))
+    pad_along_width = int(((out_width - 1) * stride_width + filter_width - in_width))
+    pad_top = pad_along_height // 2
+    pad_bottom = pad_along_height - pad_top
+    pad_left = pad_along_width // 2
+    pad_right = pad_along_width - pad_left
+
+    return (pad_left, pad_right, pad_top, pad_bottom), (out_height, out_width)
+
 def get_activation_fn(name=None):
     if name in ["linear", None]:
         return None
@@ -82,62 +119,112 @@ class SlimFC(nn.Module):
 
 
 class CustomPPOModel(nn.Module):
+    """
+    Torch version of the PPO model created by RLlib (VisionNetwork followed by a diagonal gaussian action
+    distribution), used to run the policy outside of Ray. The layers (and their names) match the ones created
+    by RLlib, so that the state dictionary saved by CustomPPOTrainer can be directly loaded.
+    """
 
-    def __init__(self, gpu_n=0):
+    def __init__(self, obs_shape, action_space, conv_filters=None, gpu_n=0):
 
         nn.Module.__init__(self)
 
         self._gpu_n = gpu_n
+        self.device = torch.device("cuda:{}".format(gpu_n) if gpu_n >= 0 else "cpu")
+
+        # Shape of a single observation (height, width, channels), as outputted by the environment
+        self.obs_shape = tuple(obs_shape)
+        self.num_actions = action_space.shape[0]
+        filters = conv_filters or DEFAULT_CONV_FILTERS
 
-        # Convolutional layer
+        # Convolutional layers, 'same' padded except for the last one
         convs = nn.Sequential()
-        convs.add_module("{}".format(0), SlimConv2d(12, 16, kernel=[5, 5], stride=4, padding=(0, 1, 0, 1), activation_fn="relu"))
-        convs.add_module("{}".format(1), SlimConv2d(16, 32, kernel=[5, 5], stride=2, padding=(2, 2, 2, 2), activation_fn="relu"))
-        convs.add_module("{}".format(2), SlimConv2d(32, 32, kernel=[5, 5], stride=2, padding=(1, 2, 1, 2), activation_fn="relu"))
-        convs.add_module("{}".format(3), SlimConv2d(32, 64, kernel=[5, 5], stride=1, padding=(2, 2, 2, 2), activation_fn="relu"))
-        convs.add_module("{}".format(4), SlimConv2d(64, 64, kernel=[5, 5], stride=2, padding=(2, 2, 2, 2), activation_fn="relu"))
-        convs.add_module("{}".format(5), SlimConv2d(64, 128, kernel=[5, 5], stride=2, padding=(1, 2, 1, 2), activation_fn="relu"))
-        convs.add_module("{}".format(6), SlimConv2d(128, 256, kernel=[5, 5], stride=1, padding=0, activation_fn="relu"))
+        (h, w, in_channels) = self.obs_shape
+        in_size = [h, w]
+        for i, (out_channels, kernel, stride) in enumerate(filters[:-1]):
+            padding, out_size = same_padding(in_size, kernel, [stride, stride])
+            convs.add_module("{}".format(i), SlimConv2d(in_channels, out_channels, kernel, stride, padding, activation_fn="relu"))
+            in_channels = out_channels
+            in_size = out_size
+
+        # The last convolution isn't padded, and it has to reduce the image to 1x1 (as RLlib squeezes it)
+        out_channels, kernel, stride = filters[-1]
+        kernel_h, kernel_w = (kernel, kernel) if isinstance(kernel, int) else kernel
+        out_size = [(in_size[0] - kernel_h) // stride + 1, (in_size[1] - kernel_w) // stride + 1]
+        if out_size != [1, 1]:
+            raise ValueError(
+                "The 'conv_filters' reduce the observations of {}x{} (height x width) to {}x{} instead of 1x1. "
+                "Change them to match the output size of the cameras".format(h, w, *out_size))
+        convs.add_module("{}".format(len(filters) - 1), SlimConv2d(in_channels, out_channels, kernel, stride, None, activation_fn="relu"))
         self._convs = convs
 
+        # Means and log stds of the action distribution
+        padding, _ = same_padding([1, 1], [1, 1], [1, 1])
+        self._logits = SlimConv2d(out_channels, 2 * self.num_actions, [1, 1], 1, padding, activation_fn=None)
+
         # Ray creates this layer but it is never used. Needed to avoid failures when loading the state dictionary
-        value_branch = SlimFC(256, 1, activation_fn=None)
+        value_branch = SlimFC(out_channels, 1, activation_fn=None)
         self._value_branch = value_branch
 
-        advantage_module = nn.Sequential()
-        advantage_module.add_module("dueling_A_{}".format(0), SlimFC(256, 256, activation_fn='relu'))
-        advantage_module.add_module("dueling_A_{}".format(1), SlimFC(256, 512, activation_fn='relu'))
-        advantage_module.add_module("A", SlimFC(512, 29, activation_fn=None))
-        self.advantage_module = advantage_module
-
-        value_module = nn.Sequential()
-        value_module.add_module("dueling_V_{}".format(0), SlimFC(256, 256, activation_fn='relu'))
-        value_module.add_module("dueling_V_{}".format(1), SlimFC(256, 512, activation_fn='relu'))
-        value_module.add_module("V", SlimFC(512, 1, activation_fn=None))
-        self.value_module = value_module
-
-    def forward(self, inputs):
+        # Bounds used to clip the actions, as done by RLlib with 'clip_actions'
+        self.register_buffer("_action_low", torch.tensor(action_space.low, dtype=torch.float32), persistent=False)
+        self.register_buffer("_action_high", torch.tensor(action_space.high, dtype=torch.float32), persistent=False)
+
+        # Input buffer, reused across calls
+        self._input_buffer = None
+
+    @classmethod
+    def from_config(cls, config, gpu_n=0):
+        """Creates the model from the configuration of the run, once parsed by the inference scripts"""
+        experiment_config = config["env_config"]["experiment"]
+        experiment = experiment_config["type"](experiment_config)
+        return cls(experiment.get_observation_space().shape,
+                   experiment.get_action_space(),
+                   config.get("model", {}).get("conv_filters"),
+                   gpu_n)
+
+    def to_channels_last(self):
+        """Stores the weights of the convolutions as channels last, the same memory layout of the observations"""
+        return self.to(memory_format=torch.channels_last)
+
+    def get_logits(self, obs):
+        """Returns the inputs of the action distribution (means followed by log stds) of a batch of uint8
+        observations of shape [B, H, W, C]"""
+
+        # Permuting before casting keeps the channels last memory layout, so the cast is done in a single pass
+        features = obs.permute(0, 3, 1, 2).float()
+        conv_out = self._convs(features)
+        conv_out = self._logits(conv_out)
+        logits = conv_out.squeeze(3)
+        return logits.squeeze(2)
 
-        # Preprocess the input
-        torch_input_cpu = torch.from_numpy(inputs)
-        if self._gpu_n >= 0:
-            torch_input = torch_input_cpu.cuda(self._gpu_n)
-        torch_input = torch_input.unsqueeze(0)
+    def forward_batch(self, obs):
+        """Runs the network over a batch of uint8 observations of shape [B, H, W, C], returning the deterministic
+        actions. The preprocessing is part of this method so that it is also included when exporting the model"""
 
-        self._features = torch_input.float().permute(0, 3, 1, 2)
-        conv_out = self._convs(self._features)
-        logits = conv_out.squeeze(3)
-        model_out = logits.squeeze(2)
+        # The deterministic action is the mean of the distribution
+        mean = self.get_logits(obs)[:, :self.num_actions]
+        return torch.max(torch.min(mean, self._action_high), self._action_low)
 
-        action_scores = self.advantage_module(model_out)
-        state_score = self.value_module(model_out)
+    def _get_input(self, inputs):
+        """Moves a single observation into the model's device, as a batch of one"""
+        if self.device.type == "cpu":
+            return torch.from_numpy(np.ascontiguousarray(inputs)).unsqueeze(0)
 
-        # Get the values
-        mask = torch.ne(action_scores, float("-inf"))
-        x_zeroed = torch.where(mask, action_scores, torch.zeros_like(action_scores))
-        advantages_mean = torch.sum(x_zeroed, 1) / torch.sum(mask.float(), 1)
-        advantages_centered = action_scores - torch.unsqueeze(advantages_mean, 1)
-        values = state_score + advantages_centered
+        # Copy into a pinned buffer so that the transfer to the GPU is asynchronous
+        if self._input_buffer is None:
+            self._input_buffer = torch.empty((1,) + self.obs_shape, dtype=torch.uint8).pin_memory()
+        self._input_buffer[0].numpy()[...] = inputs
+        return self._input_buffer.to(self.device, non_blocking=True)
 
-        return int(torch.argmax(values))
+    def run(self, obs):
+        """Returns the actions of a batch of uint8 observations [B, H, W, C], as a numpy array"""
+        with inference_mode():
+            obs = torch.from_numpy(np.ascontiguousarray(obs)).to(self.device, non_blocking=True)
+            return self.forward_batch(obs).cpu().numpy()
 
+    def forward(self, inputs):
+        """Returns the action of a single uint8 observation [H, W, C], as a numpy array"""
+        with inference_mode():
+            action = self.forward_batch(self._get_input(inputs))
+        return action[0].cpu().numpy()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Inference server that batches the observations sent by several environments into a single model forward
+"""
+
+import logging
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+AUTHKEY = b"carla-rllib"
+
+
+def parse_address(address):
+    """Returns the address used by multiprocessing.connection. 'host:port' addresses use a TCP socket,
+    while the rest are considered to be the path of a Unix socket"""
+    if isinstance(address, tuple):
+        return address
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+class _Request(object):
+    """Observation waiting to be batched, together with the action computed for it"""
+
+    def __init__(self, obs):
+        self.obs = obs
+        self.action = None
+        self.received = time.perf_counter()
+        self.done = threading.Event()
+
+
+class InferenceServer(object):
+    """
+    Serves the actions of a model to several clients. The requests are grouped into batches of up to
+    'max_batch_size' observations, waiting at most 'max_wait_ms' for the batch to be filled.
+    The model has to implement 'run', which computes the actions of a batch of observations
+    """
+
+    def __init__(self, model, address, max_batch_size=8, max_wait_ms=5.0, authkey=AUTHKEY):
+        self.model = model
+        self.address = parse_address(address)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.authkey = authkey
+
+        self._listener = Listener(self.address, authkey=authkey)
+        self._requests = queue.Queue()
+        self._running = False
+
+        # Statistics
+        self.latencies = []
+        self.batch_sizes = []
+
+    def serve_forever(self):
+        """Accepts the clients in a background thread and batches their requests in the calling one"""
+        self._running = True
+        accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        accept_thread.start()
+
+        try:
+            while self._running:
+                batch = self._get_batch()
+                if batch:
+                    self._run_batch(batch)
+        finally:
+            self._running = False
+            self._stop_accepting(accept_thread)
+
+    def shutdown(self):
+        """Stops serve_forever, which frees the address once it returns"""
+        self._running = False
+
+    def _stop_accepting(self, accept_thread):
+        """Closing the listener doesn't interrupt a blocked accept(), which would keep the socket listening.
+        The accept thread is woken up with a connection of its own before closing it"""
+        try:
+            Client(self._listener.address, authkey=self.authkey).close()
+        except (OSError, EOFError):
+            pass
+        accept_thread.join()
+        self._listener.close()
+
+    def reset_stats(self):
+        self.latencies = []
+        self.batch_sizes = []
+
+    def get_stats(self):
+        """Returns the latency percentiles (in ms) and mean batch size since the last reset"""
+        if not self.latencies:
+            return {}
+        latencies = np.array(self.latencies) * 1000
+        return {
+            "requests": len(self.latencies),
+            "mean_batch_size": float(np.mean(self.batch_sizes)),
+            "p50": float(np.percentile(latencies, 50)),
+            "p90": float(np.percentile(latencies, 90)),
+            "p99": float(np.percentile(latencies, 99)),
+        }
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                connection = self._listener.accept()
+            except (OSError, EOFError):
+                break
+            if not self._running:
+                connection.close()
+                break
+            threading.Thread(target=self._client_loop, args=(connection,), daemon=True).start()
+
+    def _client_loop(self, connection):
+        """Forwards the observations of a client to the batching loop, sending back their actions"""
+        try:
+            while self._running:
+                request = _Request(connection.recv())
+                self._requests.put(request)
+                request.done.wait()
+                connection.send(request.action)
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def _get_batch(self):
+        try:
+            batch = [self._requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run_batch(self, batch):
+        try:
+            actions = self.model.run(np.stack([request.obs for request in batch]))
+        except Exception:
+            logging.exception("Failed to compute a batch of %d actions", len(batch))
+            actions = [None] * len(batch)
+
+        now = time.perf_counter()
+        self.batch_sizes.append(len(batch))
+        for request, action in zip(batch, actions):
+            self.latencies.append(now - request.received)
+            request.action = action
+            request.done.set()
+
+
+class InferenceClient(object):
+    """Client of the InferenceServer. Calling the instance with one observation returns its action"""
+
+    def __init__(self, address, authkey=AUTHKEY):
+        self._connection = Client(parse_address(address), authkey=authkey)
+
+    def __call__(self, inputs):
+        self._connection.send(inputs)
+        action = self._connection.recv()
+        if action is None:
+            raise RuntimeError("The inference server failed to compute the action")
+        return action
+
+    def close(self):
+        self._connection.close()
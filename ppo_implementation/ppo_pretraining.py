@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Behavior cloning of recorded driving (see rllib_integration/recorder.py) into the PPO model, used to warm-start
+the PPO training. The convolutions and the action distribution are trained by maximizing the likelihood of the
+recorded actions, while the value function is left untouched.
+"""
+
+import copy
+import json
+import os
+import time
+
+import gym
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+from rllib_integration.frame_ring import get_reference_space
+from rllib_integration.recorder import RecordedEpisode, list_episodes
+
+from ppo_implementation.ppo_trainer import CustomPPOTrainer
+
+# Weights of the value function, which isn't pretrained (both the shared and the separate value branches)
+VALUE_PREFIXES = ("_value_branch",)
+
+
+class RecordedStepsDataset(Dataset):
+    """(observation, action) pairs of all the steps of the recorded episodes. The episodes are memory mapped
+    by each DataLoader worker the first time they are accessed"""
+
+    def __init__(self, directory):
+        self.paths = list_episodes(directory)
+        if not self.paths:
+            raise FileNotFoundError("Could not find any recorded episode at {}".format(directory))
+
+        self.steps = []
+        for i, path in enumerate(self.paths):
+            with open(os.path.join(path, "meta.json")) as f:
+                length = json.load(f)["length"]
+            self.steps.extend((i, t) for t in range(length))
+
+        self._episodes = {}
+
+    def _get_episode(self, index):
+        if index not in self._episodes:
+            self._episodes[index] = RecordedEpisode(self.paths[index])
+        return self._episodes[index]
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __getitem__(self, index):
+        episode_index, t = self.steps[index]
+        episode = self._get_episode(episode_index)
+
+        observation = episode.get_observation(t)
+        action = np.array(episode["actions"][t], dtype=np.float32)
+        return torch.from_numpy(observation), torch.from_numpy(action)
+
+
+def behavior_cloning(model, loader, epochs=1, lr=1e-4, log_every=100):
+    """Trains the model (a CustomPPOModel) with the negative log likelihood of the recorded actions under
+    its diagonal gaussian action distribution. Returns the mean loss of each epoch"""
+    model.train()
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+
+    epoch_losses = []
+    for epoch in range(epochs):
+        total_loss, start = 0.0, time.time()
+        for i, (obs, actions) in enumerate(loader):
+            obs = obs.to(model.device, non_blocking=True)
+            actions = actions.to(model.device, non_blocking=True)
+
+            logits = model.get_logits(obs)
+            mean, log_std = torch.chunk(logits, 2, dim=1)
+            distribution = torch.distributions.Normal(mean, torch.exp(log_std))
+            loss = -distribution.log_prob(actions).sum(dim=1).mean()
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+            total_loss += loss.item()
+            if log_every and (i + 1) % log_every == 0:
+                print("Epoch {} | batch {}/{} | loss {:.4f}".format(epoch, i + 1, len(loader), loss.item()))
+
+        epoch_losses.append(total_loss / len(loader))
+        print("Epoch {} done in {:.1f} s | mean loss {:.4f}".format(epoch, time.time() - start, epoch_losses[-1]))
+
+    model.eval()
+    return epoch_losses
+
+
+class SpacesEnv(gym.Env):
+    """Environment with the spaces of the CarlaEnv, without starting any CARLA server. Used to create trainers
+    that aren't sampled, such as the one saving the pretrained weights"""
+
+    def __init__(self, config):
+        experiment = config["experiment"]["type"](config["experiment"])
+        self.action_space = experiment.get_action_space()
+        self.observation_space = experiment.get_observation_space()
+        if config.get("observation_transport") is not None:
+            self.observation_space = get_reference_space()
+
+    def reset(self):
+        raise NotImplementedError("The SpacesEnv can't be sampled")
+
+    def step(self, action):
+        raise NotImplementedError("The SpacesEnv can't be sampled")
+
+
+def save_rllib_checkpoint(config, state_dict, directory):
+    """Loads the state dictionary of a CustomPPOModel into the policy of a CustomPPOTrainer, saving it as
+    a checkpoint that can be restored by tune.run. Returns the path of the checkpoint"""
+    config = copy.deepcopy(config)
+    config["env"] = SpacesEnv
+    config["num_workers"] = 0
+    config["num_gpus"] = 0
+
+    trainer = CustomPPOTrainer(config=config)
+    try:
+        load_pretrained_weights(trainer.get_policy().model, state_dict)
+        return trainer.save(directory)
+    finally:
+        trainer.stop()
+
+
+def load_pretrained_weights(model, state_dict, untrained_prefixes=VALUE_PREFIXES):
+    """Loads the state dictionary into the model, raising if any of its weights isn't used or any weight of
+    the model isn't given, e.g. because of a mismatch of the key prefixes. Only the weights starting with
+    'untrained_prefixes' (the value function) are allowed to keep their initial values"""
+    missing_keys, unexpected_keys = model.load_state_dict(state_dict, strict=False)
+    missing_keys = [key for key in missing_keys if not key.startswith(tuple(untrained_prefixes))]
+    if missing_keys or unexpected_keys:
+        raise RuntimeError(
+            "The pretrained weights don't match the policy model. Missing weights: {}. Unused pretrained "
+            "weights: {}".format(missing_keys or "none", list(unexpected_keys) or "none"))
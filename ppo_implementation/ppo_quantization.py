@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Post training int8 quantization of the CustomPPOModel, for CPU based inference.
+
+Only static quantization is implemented. Dynamic quantization is limited to nn.Linear and recurrent layers,
+which are not part of the path that computes the actions, where the convolutions take almost all the time.
+"""
+
+import copy
+import itertools
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from rllib_integration.recorder import RecordedEpisode, list_episodes
+
+from ppo_implementation.ppo_inference_model import inference_mode
+
+# Maximum absolute difference of the actions with the float model. The int8 error is proportional to the range
+# of the action means, so it only holds for policies whose means are around the action bounds (as trained ones).
+# Untrained models, whose means can be tens of times larger, easily exceed it
+DEFAULT_TOLERANCE = 0.1
+
+
+def _iter_observations(path):
+    """Observations of a path: the frame stacked ones of the episodes recorded at a folder (see
+    rllib_integration/recorder.py), or the ones stored at a *.npy file of shape [N, H, W, C] (or [H, W, C])"""
+    if os.path.isdir(path):
+        for episode_path in list_episodes(path):
+            episode = RecordedEpisode(episode_path)
+            for index in range(episode.num_frames):
+                yield episode.get_observation(index)
+        return
+
+    data = np.load(path, mmap_mode="r")
+    for observation in (data[np.newaxis] if data.ndim == 3 else data):
+        yield observation
+
+
+def load_observations(paths, limit=None):
+    """Loads the observations of recorded episodes (folders) or *.npy files. Returns a uint8 array with at
+    most 'limit' observations"""
+    observations = itertools.chain.from_iterable(_iter_observations(path) for path in paths)
+    observations = [np.asarray(obs, dtype=np.uint8) for obs in itertools.islice(observations, limit)]
+    if not observations:
+        raise FileNotFoundError("Could not find any observation at {}".format(paths))
+
+    return np.stack(observations)
+
+
+def _fuse_conv_relu(slim_conv):
+    """Fuses the Conv2d and ReLU layers of a SlimConv2d, skipping its padding (if any)"""
+    layers = list(slim_conv._model.named_children())
+    for i, (name, layer) in enumerate(layers[:-1]):
+        if isinstance(layer, nn.Conv2d) and isinstance(layers[i + 1][1], nn.ReLU):
+            torch.quantization.fuse_modules(slim_conv._model, [[name, layers[i + 1][0]]], inplace=True)
+
+
+class QuantizedPPOModel(nn.Module):
+    """
+    Quantizable copy of the action path of a CustomPPOModel. The observations are cast to float and permuted
+    as in the original model, and quantized right before the convolutions. The action distribution inputs are
+    dequantized before computing the clipped mean
+    """
+
+    def __init__(self, model):
+        super(QuantizedPPOModel, self).__init__()
+
+        self.obs_shape = model.obs_shape
+        self.num_actions = model.num_actions
+
+        self.quant = torch.quantization.QuantStub()
+        self._convs = copy.deepcopy(model._convs)
+        self._logits = copy.deepcopy(model._logits)
+        self.dequant = torch.quantization.DeQuantStub()
+
+        self.register_buffer("_action_low", model._action_low.clone(), persistent=False)
+        self.register_buffer("_action_high", model._action_high.clone(), persistent=False)
+
+        for conv in self._convs:
+            _fuse_conv_relu(conv)
+
+    def forward_batch(self, obs):
+        features = obs.permute(0, 3, 1, 2).float()
+        conv_out = self.quant(features)
+        conv_out = self._convs(conv_out)
+        conv_out = self._logits(conv_out)
+        conv_out = self.dequant(conv_out)
+        logits = conv_out.squeeze(3)
+        logits = logits.squeeze(2)
+
+        mean = logits[:, :self.num_actions]
+        return torch.max(torch.min(mean, self._action_high), self._action_low)
+
+    def forward(self, obs):
+        return self.forward_batch(obs)
+
+    def run(self, obs):
+        """Returns the actions of a batch of uint8 observations [B, H, W, C], as a numpy array"""
+        with inference_mode():
+            return self.forward_batch(torch.from_numpy(np.ascontiguousarray(obs))).numpy()
+
+
+def quantize_static(model, calibration_data, backend="fbgemm", batch_size=8):
+    """Returns an int8 version of the (CPU based) model, calibrated with the given observations.
+    Use 'fbgemm' for x86 CPUs and 'qnnpack' for ARM ones"""
+    torch.backends.quantized.engine = backend
+
+    quantized = QuantizedPPOModel(model).eval()
+    quantized.qconfig = torch.quantization.get_default_qconfig(backend)
+    torch.quantization.prepare(quantized, inplace=True)
+
+    with torch.no_grad():
+        for i in range(0, len(calibration_data), batch_size):
+            quantized.forward_batch(torch.from_numpy(calibration_data[i:i + batch_size]))
+
+    torch.quantization.convert(quantized, inplace=True)
+    return quantized
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Reward of the PPOExperiment as a pure NumPy function over batches of transitions. The state of the hero and its
+surroundings is given with the same layout as the telemetry of the recorder (see rllib_integration/recorder.py),
+with a leading batch dimension. The live environment uses batches of one, while the recorded episodes are
+scored as a whole (see score_episode).
+"""
+
+import numpy as np
+
+MAX_SPEED = 20
+MAX_REACTIVE_DISTANCE = 6
+
+# Indices of the waypoint telemetry
+WP_VALID, WP_LANE_TYPE, WP_JUNCTION, WP_LANE_WIDTH, WP_LOCATION, WP_ROTATION = 0, 1, 2, 3, 4, 7
+
+
+def get_speed(velocity):
+    """Speed in Km/h of a batch of velocities [B, 3]"""
+    return 3.6 * np.linalg.norm(velocity, axis=-1)
+
+
+def get_forward_vector(rotation):
+    """XY components of the forward vector of a batch of rotations [B, (pitch, yaw, roll)], in degrees"""
+    pitch = np.radians(rotation[:, 0])
+    yaw = np.radians(rotation[:, 1])
+    return np.stack([np.cos(pitch) * np.cos(yaw), np.cos(pitch) * np.sin(yaw)], axis=1)
+
+
+def get_distance(u, v):
+    """XY distance between batches of locations, broadcasting along all but the last axis"""
+    return np.sqrt(np.square(u[..., 0] - v[..., 0]) + np.square(u[..., 1] - v[..., 1]))
+
+
+def get_optimal_speed(distance):
+    alpha = MAX_SPEED / (MAX_REACTIVE_DISTANCE - 1)
+    beta = -alpha
+    speed = np.where(distance > MAX_REACTIVE_DISTANCE, MAX_SPEED, alpha * distance + beta)
+    return np.where(distance < 1, 0, speed)
+
+
+def stack_telemetry(telemetries):
+    """Stacks a list of telemetry dictionaries into a batch. The vehicle locations are padded with NaNs"""
+    batch = {}
+    for key in ("hero_location", "hero_rotation", "hero_velocity", "waypoint", "lane_waypoint",
+                "traffic_light_location"):
+        batch[key] = np.stack([np.asarray(t[key], dtype=np.float64) for t in telemetries])
+
+    num_vehicles = max(len(t["vehicle_locations"]) for t in telemetries)
+    vehicles = np.full((len(telemetries), num_vehicles, 3), np.nan)
+    for i, t in enumerate(telemetries):
+        vehicles[i, :len(t["vehicle_locations"])] = t["vehicle_locations"]
+    batch["vehicle_locations"] = vehicles
+    return batch
+
+
+def compute_rewards(telemetry, last_location, last_speed, last_steer, allowed_lane_types,
+                    done_falling, done_idle, done_max_time, collision):
+    """
+    Computes the rewards of a batch of B transitions.
+
+    :param telemetry: dictionary of batched telemetry, as returned by stack_telemetry
+    :param last_location: [B, 3] hero location at the previous step
+    :param last_speed: [B] hero speed (Km/h) at the previous step
+    :param last_steer: [B] steer of the last applied control
+    :param allowed_lane_types: integer values of the carla.LaneType considered to be inside the lane
+    :param done_falling, done_idle, done_max_time, collision: [B] termination flags
+
+    Returns the rewards and a dictionary with the intermediate terms ('delta_distance', 'speed' and
+    'heading_deviation'), all of them of shape [B]
+    """
+    hero_location = telemetry["hero_location"]
+    hero_speed = get_speed(telemetry["hero_velocity"])
+    hero_heading = get_forward_vector(telemetry["hero_rotation"])
+
+    delta_distance = get_distance(hero_location, last_location)
+    delta_speed = hero_speed - last_speed
+
+    # Reward if going forward, and going faster than the last step
+    rewards = delta_distance + np.where(hero_speed < MAX_SPEED, 0.05 * delta_speed, 0)
+
+    # Penalize if not inside the lane
+    waypoint = telemetry["waypoint"]
+    inside_lane = (waypoint[:, WP_VALID] > 0) & np.isin(waypoint[:, WP_LANE_TYPE].astype(np.int64),
+                                                        allowed_lane_types)
+    in_junction = waypoint[:, WP_JUNCTION] > 0
+    rewards = rewards + np.where(inside_lane, 0, -0.5)
+
+    # Penalize deviating from the lane heading [0, 1], and the distance to the center of the lane
+    wp_heading = get_forward_vector(waypoint[:, WP_ROTATION:WP_ROTATION + 3])
+    cross = hero_heading[:, 0] * wp_heading[:, 1] - hero_heading[:, 1] * wp_heading[:, 0]
+    dot = np.sum(hero_heading * wp_heading, axis=1)
+    angle = -np.arctan2(cross, dot)
+
+    lane_waypoint = telemetry["lane_waypoint"]
+    lane_center_deviation = get_distance(waypoint[:, WP_LOCATION:WP_LOCATION + 3],
+                                         lane_waypoint[:, WP_LOCATION:WP_LOCATION + 3])
+    lane_width = np.where(lane_waypoint[:, WP_VALID] > 0, lane_waypoint[:, WP_LANE_WIDTH], np.inf)
+
+    # Penalize the wrong direction, or steering towards the wrong side when the heading deviation is large
+    wrong_direction = dot < 0
+    wrong_steer = (np.abs(np.sin(angle)) > 0.4) & (last_steer * np.sin(angle) >= 0)
+    lane_terms = -np.abs(angle) / np.pi - lane_center_deviation / lane_width \
+        + np.where(wrong_direction, -0.5, np.where(wrong_steer, -0.05, 0))
+
+    in_lane_road = inside_lane & ~in_junction
+    rewards = rewards + np.where(in_lane_road, lane_terms, 0)
+    heading_deviation = np.where(inside_lane, np.where(in_junction, 0, np.abs(angle)), np.pi)
+
+    # Penalize deviating from the optimal speed, given by the nearest traffic light or vehicle in front
+    reaction_distance = get_distance(telemetry["traffic_light_location"], hero_location)
+    reaction_distance = np.where(np.isnan(reaction_distance), np.inf, reaction_distance)
+
+    target = hero_location[:, :2] + hero_heading * MAX_REACTIVE_DISTANCE
+    vehicles = telemetry["vehicle_locations"]
+    distance_a = get_distance(vehicles, hero_location[:, np.newaxis])
+    distance_b = get_distance(vehicles, target[:, np.newaxis])
+    in_front = (distance_a < MAX_REACTIVE_DISTANCE) & (distance_b < MAX_REACTIVE_DISTANCE)
+    if vehicles.shape[1] > 0:
+        reaction_distance = np.minimum(reaction_distance, np.min(np.where(in_front, distance_a, np.inf), axis=1))
+
+    optimal_speed = get_optimal_speed(reaction_distance)
+    rewards = rewards + np.where(inside_lane, -np.abs(hero_speed - optimal_speed) / MAX_SPEED + 1, 0)
+
+    # Terminal rewards
+    rewards = rewards + np.where(done_falling, -40, 0) + np.where(done_idle, -100, 0) \
+        + np.where(done_max_time, 100, 0) + np.where(collision, -100, 0)
+
+    terms = {
+        "delta_distance": delta_distance,
+        "speed": hero_speed,
+        "heading_deviation": heading_deviation,
+    }
+    return rewards, terms
+
+
+def get_idle_steps(speed):
+    """Number of consecutive steps with a speed lower or equal than 1 Km/h ending at each step"""
+    steps = np.arange(len(speed))
+    last_moving = np.maximum.accumulate(np.where(speed > 1.0, steps, -1))
+    return steps - last_moving
+
+
+def score_episode(episode, allowed_lane_types, max_time_idle, max_time_episode):
+    """Recomputes the rewards and done flags of all the steps of a RecordedEpisode at once"""
+    length = episode.length
+    telemetry = stack_telemetry([{
+        key: episode.get_ragged(key, t) if key == "vehicle_locations" else episode[key][t]
+        for key in ("hero_location", "hero_rotation", "hero_velocity", "waypoint", "lane_waypoint",
+                    "traffic_light_location", "vehicle_locations")
+    } for t in range(1, length + 1)])
+
+    locations = np.asarray(episode["hero_location"], dtype=np.float64)
+    speeds = get_speed(np.asarray(episode["hero_velocity"], dtype=np.float64))
+
+    # The first step has no last location, and the last speed starts at 0
+    last_location = locations[:length].copy()
+    last_location[0] = locations[1]
+    last_speed = np.concatenate([[0], speeds[1:length]])
+    last_steer = np.asarray(episode["actions"], dtype=np.float64)[:, 1]
+
+    # The idle time is updated after checking it, as done by PPOExperiment.get_done_status
+    idle_steps = np.concatenate([[0], get_idle_steps(speeds[1:length])])
+    done_idle = max_time_idle < idle_steps
+    done_max_time = max_time_episode < np.arange(1, length + 1)
+    done_falling = locations[1:, 2] < -0.5
+    collision = np.asarray(episode["collision"][1:], dtype=bool)
+
+    rewards, terms = compute_rewards(telemetry, last_location, last_speed, last_steer, allowed_lane_types,
+                                     done_falling, done_idle, done_max_time, collision)
+    dones = done_idle | done_falling | done_max_time | collision
+    return rewards, dones, terms
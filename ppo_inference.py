@@ -19,7 +19,8 @@ from rllib_integration.carla_env import CarlaEnv
 from rllib_integration.carla_core import kill_all_servers
 
 from ppo_implementation.ppo_experiment import PPOExperiment
-from ppo_implementation.ppo_inference_model import CustomPPOModel
+from ppo_implementation.ppo_export import load_inference_model
+from ppo_implementation.ppo_inference_server import InferenceClient
 
 # Set the experiment to EXPERIMENT_CLASS so that it is passed to the configuration
 EXPERIMENT_CLASS = PPOExperiment
@@ -49,6 +50,9 @@ def parse_config(args):
         config["env"] = CarlaEnv
         config["env_config"]["experiment"]["type"] = EXPERIMENT_CLASS
 
+        # The model is run directly, without the RLlib model that resolves the shared memory references
+        config["env_config"].pop("observation_transport", None)
+
     return config
 
 def main():
@@ -57,31 +61,45 @@ def main():
     argparser.add_argument("configuration_file",
                            help="Configuration file of the run (*.yaml)")
     argparser.add_argument("checkpoint",
-                           help='Checkpoint file with the model information (*.pt or *.pth)')
+                           nargs="?",
+                           default=None,
+                           help='Checkpoint file with the model information (*.pt or *.pth), or an exported model (*.ts or *.onnx)')
     argparser.add_argument(
         '-d', '--device',
         metavar='D',
         default= 'cuda:0',
         help='Device on with the tensors will be run. Defaults to (cuda:0)')
+    argparser.add_argument(
+        '--channels-last',
+        action='store_true',
+        default=False,
+        help='Flag to store the convolution weights as channels last')
+    argparser.add_argument(
+        '-s', '--server',
+        metavar='S',
+        default=None,
+        help='Address of an inference server (host:port or unix socket path) used instead of a local model')
 
     args = argparser.parse_args()
+    if args.checkpoint is None and args.server is None:
+        argparser.error("either a checkpoint or an inference server is needed")
     args.config = parse_config(args)
-    args.gpu_n = get_gpu_or_cpu_number(args.device) # Are we using GPU or CPU?
+    args.gpu_n = get_gpu_or_cpu_number(args.device) if args.server is None else -1 # Are we using GPU or CPU?
 
     try:
-        # Initialize the model and load the state dictionary
-        model = CustomPPOModel(gpu_n=args.gpu_n)
-        model.load_state_dict(torch.load(args.checkpoint))
-        model.eval()
-        if args.gpu_n >= 0:
-            model.cuda()
+        if args.server:
+            # The model is run by an inference server (see ppo_inference_server.py)
+            model = InferenceClient(args.server)
+        else:
+            # Initialize the model and load the state dictionary (or the exported model)
+            model = load_inference_model(args.config, args.checkpoint, args.gpu_n, args.channels_last)
 
         # Initalize the CARLA environment
         env = CarlaEnv(args.config["env_config"])
         obs = env.reset()
 
         while True:
-            action = model.forward(obs)
+            action = model(obs)
             obs, _, _, _ = env.step(action)
 
     except KeyboardInterrupt:
@@ -20,6 +20,7 @@ import ray
 from ray.rllib.agents.ppo import PPOTrainer
 
 from rllib_integration.carla_env import CarlaEnv
+from rllib_integration.shared_memory_model import configure_observation_transport
 from rllib_integration.carla_core import kill_all_servers
 
 from ppo_implementation.ppo_experiment import PPOExperiment
@@ -40,7 +41,7 @@ def parse_config(args):
         del config["num_cpus_per_worker"]
         del config["num_gpus_per_worker"]
 
-    return config
+    return configure_observation_transport(config, EXPERIMENT_CLASS)
 
 def main():
 
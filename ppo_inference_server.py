@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Loads the model once and serves its actions to several ppo_inference.py processes (see its '--server' argument),
+batching their observations. With '--benchmark', synthetic clients are used instead to report the throughput
+and latency percentiles of the server for different maximum batch sizes.
+"""
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import threading
+import time
+
+import numpy as np
+
+from ppo_inference import get_gpu_or_cpu_number, parse_config
+
+from ppo_implementation.ppo_export import load_inference_model
+from ppo_implementation.ppo_inference_server import InferenceClient, InferenceServer
+
+
+def benchmark_client(address, obs_shape, num_requests):
+    """Sends 'num_requests' random observations to the server, one at a time"""
+    client = InferenceClient(address)
+    obs = np.random.randint(0, 256, size=obs_shape, dtype=np.uint8)
+    for _ in range(num_requests):
+        client(obs)
+    client.close()
+
+
+def benchmark(model, obs_shape, args):
+    print("{:>10} | {:>10} | {:>10} | {:>12} | {:>9} | {:>9} | {:>9}".format(
+        "max batch", "clients", "requests", "requests/s", "p50 (ms)", "p90 (ms)", "p99 (ms)"))
+
+    for max_batch_size in args.batch_sizes:
+        server = InferenceServer(model, args.address, max_batch_size, args.max_wait_ms)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+
+        # Warm up the model before measuring
+        benchmark_client(args.address, obs_shape, 5)
+        server.reset_stats()
+
+        clients = [
+            multiprocessing.Process(target=benchmark_client, args=(args.address, obs_shape, args.requests))
+            for _ in range(args.clients)
+        ]
+        start = time.perf_counter()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - start
+
+        stats = server.get_stats()
+        server.shutdown()
+        server_thread.join()
+
+        print("{:>10} | {:>10} | {:>10} | {:>12.1f} | {:>9.2f} | {:>9.2f} | {:>9.2f}".format(
+            max_batch_size, args.clients, stats["requests"], stats["requests"] / elapsed,
+            stats["p50"], stats["p90"], stats["p99"]))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument("configuration_file",
+                           help="Configuration file of the run (*.yaml)")
+    argparser.add_argument("checkpoint",
+                           help='Checkpoint file with the model information (*.pt or *.pth), or an exported model (*.ts or *.onnx)')
+    argparser.add_argument("-d", "--device",
+                           metavar="D",
+                           default="cuda:0",
+                           help="Device on with the tensors will be run. Defaults to (cuda:0)")
+    argparser.add_argument("--channels-last",
+                           action="store_true",
+                           default=False,
+                           help="Flag to store the convolution weights as channels last")
+    argparser.add_argument("-a", "--address",
+                           metavar="A",
+                           default="localhost:6100",
+                           help="Address of the server, either host:port or a unix socket path (default: localhost:6100)")
+    argparser.add_argument("--max-batch-size",
+                           type=int,
+                           default=8,
+                           help="Maximum number of observations run together (default: 8)")
+    argparser.add_argument("--max-wait-ms",
+                           type=float,
+                           default=5.0,
+                           help="Maximum time waiting for a batch to be filled, in milliseconds (default: 5)")
+    argparser.add_argument("--benchmark",
+                           action="store_true",
+                           default=False,
+                           help="Flag to benchmark the server with synthetic clients instead of serving")
+    argparser.add_argument("--batch-sizes",
+                           nargs="+",
+                           type=int,
+                           default=[1, 2, 4, 8, 16],
+                           help="Maximum batch sizes used by the benchmark (default: 1 2 4 8 16)")
+    argparser.add_argument("--clients",
+                           type=int,
+                           default=16,
+                           help="Number of synthetic clients used by the benchmark (default: 16)")
+    argparser.add_argument("--requests",
+                           type=int,
+                           default=50,
+                           help="Number of requests sent by each synthetic client (default: 50)")
+
+    args = argparser.parse_args()
+    args.config = parse_config(args)
+    args.gpu_n = get_gpu_or_cpu_number(args.device)
+
+    model = load_inference_model(args.config, args.checkpoint, args.gpu_n, args.channels_last)
+
+    if args.benchmark:
+        experiment_config = args.config["env_config"]["experiment"]
+        obs_shape = experiment_config["type"](experiment_config).get_observation_space().shape
+        benchmark(model, obs_shape, args)
+        return
+
+    server = InferenceServer(model, args.address, args.max_batch_size, args.max_wait_ms)
+    print("Serving at {}".format(args.address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stats = server.get_stats()
+        if stats:
+            print("\nServed {} requests. Mean batch size: {:.2f} | p50: {:.2f} ms | p90: {:.2f} ms | p99: {:.2f} ms".format(
+                stats["requests"], stats["mean_batch_size"], stats["p50"], stats["p90"], stats["p99"]))
+
+
+if __name__ == '__main__':
+
+    main()
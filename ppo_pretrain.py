@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Pretrains the PPO model by behavior cloning of recorded episodes (e.g. autopilot driving). Saves both the
+state dictionary (as CustomPPOTrainer does) and an RLlib checkpoint, which can be passed to
+'ppo_train.py --pretrained' to warm-start the training.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+
+import yaml
+import torch
+from torch.utils.data import DataLoader
+
+import ray
+
+from rllib_integration.shared_memory_model import configure_observation_transport
+
+from ppo_implementation.ppo_experiment import PPOExperiment
+from ppo_implementation.ppo_callbacks import PPOCallbacks
+from ppo_implementation.ppo_inference_model import CustomPPOModel
+from ppo_implementation.ppo_pretraining import VALUE_PREFIXES, RecordedStepsDataset, behavior_cloning, save_rllib_checkpoint
+
+# Set the experiment to EXPERIMENT_CLASS so that it is passed to the configuration
+EXPERIMENT_CLASS = PPOExperiment
+
+
+def parse_config(args):
+    """
+    Parses the .yaml configuration file into a readable dictionary
+    """
+    with open(args.configuration_file) as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+        config["env_config"]["experiment"]["type"] = EXPERIMENT_CLASS
+        config["callbacks"] = PPOCallbacks
+
+    return configure_observation_transport(config, EXPERIMENT_CLASS)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument("configuration_file",
+                           help="Configuration file (*.yaml)")
+    argparser.add_argument("recordings",
+                           help="Directory with the recorded episodes")
+    argparser.add_argument("-d", "--directory",
+                           metavar='D',
+                           default=os.path.expanduser("~") + "/ray_results/carla_rllib/pretrain",
+                           help="Directory where the weights are saved (default: ~/ray_results/carla_rllib/pretrain)")
+    argparser.add_argument("-e", "--epochs",
+                           type=int,
+                           default=5,
+                           help="Number of passes over the recorded steps (default: 5)")
+    argparser.add_argument("-b", "--batch-size",
+                           type=int,
+                           default=32,
+                           help="Batch size (default: 32)")
+    argparser.add_argument("--lr",
+                           type=float,
+                           default=1e-4,
+                           help="Learning rate (default: 1e-4)")
+    argparser.add_argument("-w", "--workers",
+                           type=int,
+                           default=4,
+                           help="Number of DataLoader workers reading the recordings (default: 4)")
+    argparser.add_argument("--gpu",
+                           type=int,
+                           default=0,
+                           help="GPU used to train the model, -1 to use the CPU (default: 0)")
+
+    args = argparser.parse_args()
+    config = parse_config(args)
+
+    gpu_n = args.gpu if torch.cuda.is_available() else -1
+    model = CustomPPOModel.from_config(config, gpu_n)
+    model.to(model.device)
+
+    dataset = RecordedStepsDataset(args.recordings)
+    loader = DataLoader(dataset,
+                        batch_size=args.batch_size,
+                        shuffle=True,
+                        num_workers=args.workers,
+                        pin_memory=gpu_n >= 0,
+                        drop_last=True,
+                        persistent_workers=args.workers > 0)
+    print("Pretraining with {} steps of {} episodes".format(len(dataset), len(dataset.paths)))
+
+    behavior_cloning(model, loader, args.epochs, args.lr)
+
+    # The value function is not pretrained
+    state_dict = {k: v.cpu() for k, v in model.state_dict().items() if not k.startswith(VALUE_PREFIXES)}
+
+    os.makedirs(args.directory, exist_ok=True)
+    torch.save(state_dict, os.path.join(args.directory, "pretrained_state_dict.pth"))
+
+    try:
+        ray.init()
+        checkpoint = save_rllib_checkpoint(config, state_dict, args.directory)
+    finally:
+        ray.shutdown()
+
+    print("Saved the pretrained checkpoint at {}".format(checkpoint))
+
+
+if __name__ == '__main__':
+
+    main()
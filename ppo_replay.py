@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Replays recorded episodes without CARLA servers, recomputing their rewards and done flags with the
+experiment. Useful to compare a modified reward function against the recorded one. With --vectorized, all the
+steps of each episode are scored by a single call to the vectorized reward (see ppo_implementation/ppo_reward.py).
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+import yaml
+
+from rllib_integration.recorder import RecordedEpisode, list_episodes
+from rllib_integration.replay_env import ReplayEnv
+
+from ppo_implementation.ppo_experiment import PPOExperiment
+from ppo_implementation.ppo_reward import score_episode
+
+# Set the experiment to EXPERIMENT_CLASS so that it is passed to the configuration
+EXPERIMENT_CLASS = PPOExperiment
+
+
+def parse_config(args):
+    """
+    Parses the .yaml configuration file into the configuration of the ReplayEnv
+    """
+    with open(args.configuration_file) as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+        env_config = config["env_config"]
+        env_config["experiment"]["type"] = EXPERIMENT_CLASS
+        env_config["directory"] = args.directory
+        env_config["load_observations"] = args.observations
+
+    return env_config
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument("configuration_file",
+                           help="Configuration file (*.yaml)")
+    argparser.add_argument("directory",
+                           help="Directory with the recorded episodes")
+    argparser.add_argument("-e", "--episodes",
+                           type=int,
+                           default=None,
+                           help="Number of episodes to replay (default: all of them)")
+    argparser.add_argument("--observations",
+                           action="store_true",
+                           default=False,
+                           help="Also read the camera frames of the observations")
+    argparser.add_argument("--vectorized",
+                           action="store_true",
+                           default=False,
+                           help="Score each episode at once with the vectorized reward")
+
+    args = argparser.parse_args()
+    env_config = parse_config(args)
+    paths = list_episodes(args.directory)[:args.episodes]
+
+    print("{:<50} | {:>6} | {:>10} | {:>10}".format("episode", "steps", "recorded", "replayed"))
+    total_steps = 0
+    start = time.perf_counter()
+    if args.vectorized:
+        experiment = EXPERIMENT_CLASS(env_config["experiment"])
+        allowed_lane_types = [int(lane_type) for lane_type in experiment.allowed_types]
+        for path in paths:
+            episode = RecordedEpisode(path)
+            rewards, _, _ = score_episode(episode, allowed_lane_types,
+                                          experiment.max_time_idle, experiment.max_time_episode)
+            total_steps += episode.length
+            print("{:<50} | {:>6} | {:>10.2f} | {:>10.2f}".format(
+                path[-50:], episode.length, float(episode["rewards"].sum()), float(rewards.sum())))
+    else:
+        env = ReplayEnv(env_config)
+        for _ in paths:
+            env.reset()
+            recorded_return, replayed_return, done = 0.0, 0.0, False
+            while not done:
+                _, reward, done, info = env.step()
+                recorded_return += info["recorded_reward"]
+                replayed_return += reward
+
+            total_steps += env.episode.length
+            print("{:<50} | {:>6} | {:>10.2f} | {:>10.2f}".format(
+                env.episode.path[-50:], env.episode.length, recorded_return, replayed_return))
+
+    elapsed = time.perf_counter() - start
+    print("\nReplayed {} steps in {:.1f} s ({:.0f} steps/s)".format(total_steps, elapsed, total_steps / elapsed))
+
+
+if __name__ == "__main__":
+
+    main()
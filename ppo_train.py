@@ -23,7 +23,11 @@ import yaml
 import ray
 from ray import tune
 
-from rllib_integration.carla_env import CarlaEnv
+# carla is imported by the driver regardless of kill_all_servers: the env and experiment classes are part of
+# the configuration, and the experiment is created to set up the observation transport. Only the imports that
+# the driver doesn't need are deferred: the sensors (pygame), cv2 and tensorboard
+from rllib_integration.supervised_env import SupervisedCarlaEnv
+from rllib_integration.shared_memory_model import configure_observation_transport
 from rllib_integration.carla_core import kill_all_servers
 
 from rllib_integration.helper import get_checkpoint, launch_tensorboard
@@ -37,16 +41,20 @@ EXPERIMENT_CLASS = PPOExperiment
 
 
 def run(args):
+    stop = {"perf/ram_util_percent": 85.0}
+    if args.target_reward is not None:
+        stop["episode_reward_mean"] = args.target_reward
+
     try:
         ray.init(address= "auto" if args.auto else None)
         tune.run(CustomPPOTrainer,
                  name=args.name,
                  local_dir=args.directory,
-                 stop={"perf/ram_util_percent": 85.0},
+                 stop=stop,
                  checkpoint_freq=1,
                  checkpoint_at_end=True,
                  restore=get_checkpoint(args.name, args.directory,
-                                        args.restore, args.overwrite),
+                                        args.restore, args.overwrite) or args.pretrained,
                  config=args.config,
                  queue_trials=True)
 
@@ -61,11 +69,11 @@ def parse_config(args):
     """
     with open(args.configuration_file) as f:
         config = yaml.load(f, Loader=yaml.FullLoader)
-        config["env"] = CarlaEnv
+        config["env"] = SupervisedCarlaEnv
         config["env_config"]["experiment"]["type"] = EXPERIMENT_CLASS
         config["callbacks"] = PPOCallbacks
 
-    return config
+    return configure_observation_transport(config, EXPERIMENT_CLASS)
 
 
 def main():
@@ -88,6 +96,14 @@ def main():
                            action="store_true",
                            default=False,
                            help="Flag to overwrite a specific directory (warning: all content of the folder will be lost.)")
+    argparser.add_argument("--pretrained",
+                           metavar="CHECKPOINT",
+                           default=None,
+                           help="Checkpoint saved by ppo_pretrain.py used to warm-start a new training")
+    argparser.add_argument("--target-reward",
+                           type=float,
+                           default=None,
+                           help="Stops the training once the mean episode reward reaches this value")
     argparser.add_argument("--tboff",
                            action="store_true",
                            default=False,
@@ -31,7 +31,9 @@ BASE_EXPERIMENT_CONFIG = {
         },
         "spawn_points": [
             # "0,0,0,0,0,0",  # x,y,z,roll,pitch,yaw
-        ]
+        ],
+        "autopilot": False,  # Whether or not the hero is driven by the Traffic Manager, ignoring the actions
+        "spawn_curriculum": None  # Arguments of the CurriculumSpawnSampler (or True), to sample spawn points by difficulty
     },
     "background_activity": {
         "n_vehicles": 0,
@@ -81,6 +83,16 @@ class BaseExperiment(object):
         """
         return NotImplementedError
 
+    def get_replay_observation(self, observation, telemetry):
+        """Counterpart of get_observation used when replaying recorded episodes (see replay_env.py).
+
+        :param observation: recorded observation
+        :param telemetry: dictionary with the recorded telemetry of the observation
+
+        Should update the experiment as get_observation does, returning the same tuple
+        """
+        return observation, {}
+
     def get_done_status(self, observation, core):
         """Returns whether or not the experiment has to end"""
         return NotImplementedError
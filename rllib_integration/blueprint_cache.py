@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Cache of the blueprint library of each world. Getting the library is a large RPC call, and so it is only done
+once per world, instead of at every reset and sensor spawn. Loading a new world changes its id, invalidating
+the cached blueprints.
+"""
+
+_caches = {}
+
+
+class BlueprintCache(object):
+    """Blueprint library of a world, with the blueprint sets used by the CarlaCore resolved in advance"""
+
+    def __init__(self, world):
+        self.world_id = world.id
+        self.library = world.get_blueprint_library()
+
+        self.vehicles = list(self.library.filter("vehicle.*"))
+        self.walkers = list(self.library.filter("walker.pedestrian.*"))
+        self.walker_controller = self.library.find("controller.ai.walker")
+
+        self._configured = {}
+
+    def find(self, blueprint_id):
+        return self.library.find(blueprint_id)
+
+    def get_configured(self, blueprint_id, attributes):
+        """Returns the blueprint with the given attributes already set. Blueprints are shared between calls
+        with the same id and attributes, so they must not be modified afterwards"""
+        key = (blueprint_id, tuple(sorted((str(k), str(v)) for k, v in attributes.items())))
+        if key not in self._configured:
+            blueprint = self.library.find(blueprint_id)
+            for name, value in key[1]:
+                blueprint.set_attribute(name, value)
+            self._configured[key] = blueprint
+        return self._configured[key]
+
+
+def get_blueprint_cache(world):
+    """Returns the cache of the world, creating it if needed"""
+    if world.id not in _caches:
+        _caches[world.id] = BlueprintCache(world)
+    return _caches[world.id]
+
+
+def invalidate_blueprint_cache(world):
+    """Removes the cache of a world that is about to be replaced"""
+    _caches.pop(world.id, None)
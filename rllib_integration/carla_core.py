@@ -24,7 +24,11 @@ import carla
 from rllib_integration.sensors.sensor_interface import SensorInterface
 from rllib_integration.sensors.factory import SensorFactory
 from rllib_integration.helper import join_dicts
+from rllib_integration.blueprint_cache import get_blueprint_cache, invalidate_blueprint_cache
+from rllib_integration.spawn_points import SpawnPoints, get_npc_locations
+from rllib_integration.spawn_curriculum import CurriculumSpawnSampler
 from rllib_integration.dynamic_weather import Weather
+from rllib_integration.server_placement import get_placement, get_server_command
 
 BASE_CORE_CONFIG = {
     "host": "localhost",  # Client host
@@ -36,7 +40,10 @@ BASE_CORE_CONFIG = {
     "quality_level": "Low",  # Quality level of the simulation. Can be 'Low', 'High', 'Epic'
     "enable_map_assets": False,  # enable / disable all town assets except for the road
     "enable_rendering": True,  # enable / disable camera images
-    "show_display": False  # Whether or not the server will be displayed
+    "show_display": False,  # Whether or not the server will be displayed
+    "move_spectator": True,  # Whether or not the spectator follows the hero. Not needed if nobody watches the server
+    "gpu_placement": True,  # Whether or not the server renders on the GPU that Ray assigned to the worker
+    "cpu_affinity": None  # {"cores_per_worker": N, "env_cores": M} pins the env and the server to disjoint cores
 }
 
 
@@ -56,12 +63,19 @@ class CarlaCore:
     Class responsible of handling all the different CARLA functionalities, such as server-client connecting,
     actor spawning and getting the sensors data.
     """
-    def __init__(self, config={}):
+    def __init__(self, config={}, worker_index=0):
         """Initialize the server and client"""
         self.client = None
         self.world = None
         self.map = None
         self.hero = None
+        self.blueprints = None
+        self.spawn_points = None
+        self.spawn_sampler = None
+        self.spawn_difficulty = None
+        self.npc_ids = []
+        self.reset_timings = {}
+        self.server_process = None
         self.dynamic_weather = False
         self.elapsed_time = 0.0
         self.speed_factor = 1.0
@@ -69,6 +83,11 @@ class CarlaCore:
         self.config = join_dicts(BASE_CORE_CONFIG, config)
         self.sensor_interface = SensorInterface()
 
+        # Resolved once, as pinning the env process changes the cores available to it
+        self.gpu, self.env_cores, self.server_cores = get_placement(self.config, worker_index)
+        if self.env_cores and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, self.env_cores)
+
         self.init_server()
         self.connect_client()
 
@@ -90,34 +109,65 @@ class CarlaCore:
             uses_server_port = is_used(self.server_port)
             uses_stream_port = is_used(self.server_port+1)
 
-        if self.config["show_display"]:
-            server_command = [
-                "{}/CarlaUE4.sh".format(os.environ["CARLA_ROOT"]),
-                "-windowed",
-                "-ResX={}".format(self.config["resolution_x"]),
-                "-ResY={}".format(self.config["resolution_y"]),
-            ]
-        else:
-            server_command = [
-                "DISPLAY= ",
-                "{}/CarlaUE4.sh".format(os.environ["CARLA_ROOT"]),
-                "-opengl"  # no-display isn't supported for Unreal 4.24 with vulkan
-            ]
-
-        server_command += [
-            "--carla-rpc-port={}".format(self.server_port),
-            "-quality-level={}".format(self.config["quality_level"])
-        ]
+        server_command = get_server_command(
+            os.environ["CARLA_ROOT"],
+            self.server_port,
+            quality_level=self.config["quality_level"],
+            show_display=self.config["show_display"],
+            resolution=(self.config["resolution_x"], self.config["resolution_y"]),
+            gpu=self.gpu,
+            cores=self.server_cores
+        )
 
         server_command_text = " ".join(map(str, server_command))
         print(server_command_text)
-        server_process = subprocess.Popen(
+        self.server_process = subprocess.Popen(
             server_command_text,
             shell=True,
             preexec_fn=os.setsid,
             stdout=open(os.devnull, "w"),
         )
 
+    def kill_server(self):
+        """Kills the server started by this instance. As it is started with its own session,
+        killing its process group doesn't affect the servers of other environments"""
+        if self.server_process is None:
+            return
+        try:
+            os.killpg(os.getpgid(self.server_process.pid), signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.server_process.wait()
+        self.server_process = None
+
+    def is_server_alive(self):
+        return self.server_process is not None and self.server_process.poll() is None
+
+    def restart_server(self, experiment_config):
+        """Replaces the server of this instance by a new one, rebuilding the world of the experiment.
+        The actors of the old server are dropped without destroying them, as they no longer exist"""
+        # There is no world if the previous restart failed
+        if self.world is not None:
+            invalidate_blueprint_cache(self.world)
+        self.kill_server()
+
+        self.client = None
+        self.world = None
+        self.hero = None
+        self.npc_ids = []
+        self.sensor_interface = SensorInterface()
+
+        # Keep the progress of the spawn curriculum, which doesn't depend on the server
+        spawn_sampler = self.spawn_sampler
+
+        self.init_server()
+        self.connect_client()
+        self.setup_experiment(experiment_config)
+
+        if spawn_sampler is not None and self.spawn_sampler is not None:
+            self.spawn_sampler.level = spawn_sampler.level
+            self.spawn_sampler.results = spawn_sampler.results
+
     def connect_client(self):
         """Connect to the client"""
 
@@ -145,12 +195,20 @@ class CarlaCore:
     def setup_experiment(self, experiment_config):
         """Initialize the hero and sensors"""
 
+        invalidate_blueprint_cache(self.world)
         self.world = self.client.load_world(
             map_name = random.choice(experiment_config["town"]),
             reset_settings = False,
             map_layers = carla.MapLayer.All if self.config["enable_map_assets"] else carla.MapLayer.NONE)
 
         self.map = self.world.get_map()
+        self.blueprints = get_blueprint_cache(self.world)
+        self.spawn_points = SpawnPoints(self.map, experiment_config["hero"]["spawn_points"])
+
+        curriculum = experiment_config["hero"]["spawn_curriculum"]
+        if curriculum:
+            curriculum = curriculum if isinstance(curriculum, dict) else {}
+            self.spawn_sampler = CurriculumSpawnSampler(self.map, self.spawn_points, **curriculum)
 
         # Choose the weather of the simulation
 
@@ -183,51 +241,34 @@ class CarlaCore:
     def reset_hero(self, hero_config):
         """This function resets / spawns the hero vehicle and its sensors"""
 
+        start = time.time()
+
         # Part 1: destroy all sensors (if necessary)
         self.sensor_interface.destroy()
 
         self.world.tick()
+        self.reset_timings["destroy_sensors"] = time.time() - start
 
         # Part 2: Spawn the ego vehicle
-        user_spawn_points = hero_config["spawn_points"]
-        if user_spawn_points:
-            spawn_points = []
-            for transform in user_spawn_points:
-
-                transform = [float(x) for x in transform.split(",")]
-                if len(transform) == 3:
-                    location = carla.Location(
-                        transform[0], transform[1], transform[2]
-                    )
-                    waypoint = self.map.get_waypoint(location)
-                    waypoint = waypoint.previous(random.uniform(0, 5))[0]
-                    transform = carla.Transform(
-                        location, waypoint.transform.rotation
-                    )
-                else:
-                    assert len(transform) == 6
-                    transform = carla.Transform(
-                        carla.Location(transform[0], transform[1], transform[2]),
-                        carla.Rotation(transform[4], transform[5], transform[3])
-                    )
-                spawn_points.append(transform)
-        else:
-            spawn_points = self.map.get_spawn_points()
-
-        self.hero_blueprints = self.world.get_blueprint_library().find(hero_config['blueprint'])
-        self.hero_blueprints.set_attribute("role_name", "hero")
+        self.hero_blueprints = self.blueprints.get_configured(hero_config['blueprint'], {"role_name": "hero"})
 
         # If already spawned, destroy it
         if self.hero is not None:
             self.hero.destroy()
             self.hero = None
 
-        random.shuffle(spawn_points, random.random)
-        for i in range(0,len(spawn_points)):
-            next_spawn_point = spawn_points[i % len(spawn_points)]
-            self.hero = self.world.try_spawn_actor(self.hero_blueprints, next_spawn_point)
+        # Try the spawn points without nearby NPCs first, sampled according to the curriculum (if any)
+        npc_locations = get_npc_locations(self.world, self.npc_ids)
+        weights = None
+        if self.spawn_sampler is not None:
+            weights = self.spawn_sampler.get_weights(npc_locations)
+
+        for index in self.spawn_points.get_candidates(npc_locations, weights):
+            self.hero = self.world.try_spawn_actor(self.hero_blueprints, self.spawn_points.transforms[index])
             if self.hero is not None:
                 print("Hero spawned!")
+                if self.spawn_sampler is not None:
+                    self.spawn_difficulty = float(self.spawn_sampler.get_difficulty(npc_locations)[index])
                 break
             else:
                 print("Could not spawn hero, changing spawn point")
@@ -236,12 +277,20 @@ class CarlaCore:
             print("We ran out of spawn points")
             return
 
+        if hero_config["autopilot"]:
+            self.hero.set_autopilot(True, self.tm_port)
+
         self.world.tick()
+        self.reset_timings["spawn_hero"] = time.time() - start - self.reset_timings["destroy_sensors"]
 
         # Part 3: Spawn the new sensors
         for name, attributes in hero_config["sensors"].items():
             sensor = SensorFactory.spawn(name, attributes, self.sensor_interface, self.hero)
 
+        self.reset_timings["total"] = time.time() - start
+        self.reset_timings["spawn_sensors"] = self.reset_timings["total"] - self.reset_timings["spawn_hero"] \
+            - self.reset_timings["destroy_sensors"]
+
         # Not needed anymore. This tick will happen when calling CarlaCore.tick()
         # self.world.tick()
 
@@ -267,7 +316,7 @@ class CarlaCore:
             n_vehicles = n_spawn_points
 
         v_batch = []
-        v_blueprints = self.world.get_blueprint_library().filter("vehicle.*")
+        v_blueprints = self.blueprints.vehicles
 
         for n, transform in enumerate(spawn_points):
             if n >= n_vehicles:
@@ -292,7 +341,7 @@ class CarlaCore:
         spawn_locations = [self.world.get_random_location_from_navigation() for i in range(n_walkers)]
 
         w_batch = []
-        w_blueprints = self.world.get_blueprint_library().filter("walker.pedestrian.*")
+        w_blueprints = self.blueprints.walkers
 
         for spawn_location in spawn_locations:
             w_blueprint = random.choice(w_blueprints)
@@ -308,7 +357,7 @@ class CarlaCore:
 
         # Spawn the walker controllers
         wc_batch = []
-        wc_blueprint = self.world.get_blueprint_library().find('controller.ai.walker')
+        wc_blueprint = self.blueprints.walker_controller
 
         for walker_id in walkers_id_list:
             wc_batch.append(SpawnActor(wc_blueprint, carla.Transform(), walker_id))
@@ -327,6 +376,7 @@ class CarlaCore:
 
         self.world.tick()
         self.actors = self.world.get_actors(vehicles_id_list + walkers_id_list + controllers_id_list)
+        self.npc_ids = vehicles_id_list + walkers_id_list
 
     def tick(self, control):
         """Performs one tick of the simulation, moving all actors, and getting the sensor data"""
@@ -339,7 +389,7 @@ class CarlaCore:
         self.world.tick()
 
         # Move the spectator
-        if self.config["enable_rendering"]:
+        if self.config["enable_rendering"] and self.config["move_spectator"]:
             self.set_spectator_camera_view()
 
         if self.dynamic_weather:
@@ -14,9 +14,14 @@
 
 from __future__ import print_function
 
+import time
+
 import gym
+import psutil
 
 from rllib_integration.carla_core import CarlaCore
+from rllib_integration.frame_ring import SharedMemoryTransport
+from rllib_integration.recorder import EpisodeRecorder, get_telemetry
 
 
 class CarlaEnv(gym.Env):
@@ -26,16 +31,38 @@ class CarlaEnv(gym.Env):
 
     def __init__(self, config):
         """Initializes the environment"""
+        # Seconds since the start of the process until the env is created, and until its first step ends
+        process_start = psutil.Process().create_time()
+        self.startup_timings = {"process_to_env": time.time() - process_start}
+        self._process_start = process_start
+
         self.config = config
 
         self.experiment = self.config["experiment"]["type"](self.config["experiment"])
         self.action_space = self.experiment.get_action_space()
         self.observation_space = self.experiment.get_observation_space()
 
-        self.core = CarlaCore(self.config['carla'])
+        # Optionally, send references to observations stored in shared memory. Frame stacked observations
+        # only store their newest frame
+        self.transport = None
+        if self.config.get("observation_transport") is not None:
+            self.transport = SharedMemoryTransport(self.observation_space.shape,
+                                                   frame_stack=getattr(self.experiment, "frame_stack", 1),
+                                                   **self.config["observation_transport"])
+            self.observation_space = self.transport.observation_space
+
+        # Optionally, record the episodes to disk
+        self.recorder = None
+        if self.config.get("recorder"):
+            self.recorder = EpisodeRecorder(frame_stack=getattr(self.experiment, "frame_stack", 1),
+                                            **self.config["recorder"])
+
+        # The worker index of RLlib (0 outside of the rollout workers) sets the cores of the server
+        self.core = CarlaCore(self.config['carla'], worker_index=getattr(config, "worker_index", 0))
         self.core.setup_experiment(self.experiment.config)
 
         self.reset()
+        self.startup_timings["env_ready"] = time.time() - process_start
 
     def reset(self):
         # Reset sensors hero and experiment
@@ -45,17 +72,44 @@ class CarlaEnv(gym.Env):
         # Tick once and get the observations
         sensor_data = self.core.tick(None)
         observation, _ = self.experiment.get_observation(sensor_data)
+        if self.recorder is not None:
+            metadata = {"town": self.core.map.name, "weather": self.experiment.config["weather"]}
+            self.recorder.start_episode(observation, get_telemetry(self.core, sensor_data), metadata)
+        if self.transport is not None:
+            observation = self.transport.encode(observation, new_episode=True)
 
         return observation
 
     def step(self, action):
         """Computes one tick of the environment in order to return the new observation,
         as well as the rewards"""
-        control = self.experiment.compute_action(action)
+        autopilot = self.experiment.config["hero"]["autopilot"]
+        control = None if autopilot else self.experiment.compute_action(action)
         sensor_data = self.core.tick(control)
 
+        # With the autopilot, the action is the control applied by the Traffic Manager
+        if autopilot:
+            control = self.hero.get_control()
+            action = [control.throttle, control.steer, control.brake]
+            self.experiment.compute_action(action)
+
         observation, info = self.experiment.get_observation(sensor_data)
         done = self.experiment.get_done_status(observation, self.core)
         reward = self.experiment.compute_reward(observation, self.core)
+        if self.recorder is not None:
+            self.recorder.record_step(action, reward, done, observation, get_telemetry(self.core, sensor_data))
+        if self.transport is not None:
+            observation = self.transport.encode(observation)
+
+        if "first_step" not in self.startup_timings:
+            self.startup_timings["first_step"] = time.time() - self._process_start
 
         return observation, reward, done, info
+
+    def close(self):
+        """Kills the server used by this environment"""
+        self.core.kill_server()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.transport is not None:
+            self.transport.close()
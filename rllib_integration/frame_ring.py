@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Node-local shared memory transport of the observations. The environment writes each observation into a ring
+of memory mapped frames at /dev/shm, and only a small reference to it travels inside the sample batches.
+The references are resolved back into observations by the model (see shared_memory_model.py), either at the
+rollout workers or at the learner, as long as they are placed at the same node.
+
+Frame stacked observations are de-duplicated: only the newest frame of each observation is written, and the
+stack is rebuilt from the previous frames of the episode when resolving the references.
+"""
+
+import atexit
+import itertools
+import os
+
+import numpy as np
+from gym.spaces import Box
+
+SHM_DIRECTORY = "/dev/shm"
+
+# References are [pid, ring index, frame index, episode step]. All values are kept below 2**24,
+# so that they remain exact even if they are casted to float32
+REFERENCE_SIZE = 4
+MAX_REFERENCE_VALUE = 2 ** 24
+
+# Frames of each ring, if not set by configure_observation_transport (see shared_memory_model.py)
+DEFAULT_CAPACITY = 4096
+
+_ring_counter = itertools.count()
+
+
+def get_ring_path(pid, index):
+    return os.path.join(SHM_DIRECTORY, "carla_obs_{}_{}".format(pid, index))
+
+
+class FrameRing(object):
+    """
+    Fixed size ring of uint8 frames stored in a memory mapped file. Frames are identified by their write index,
+    which wraps at 'max_index'. Each slot stores the index of its frame, which is used to detect readers trying
+    to access an already overwritten frame
+    """
+
+    def __init__(self, path, frame_shape, capacity=None, create=False):
+        self.path = path
+        self.frame_shape = tuple(frame_shape)
+        self._owner = create
+        self._next = 0
+
+        if create:
+            self._indices = np.memmap(path + ".idx", dtype=np.int64, mode="w+", shape=(capacity,))
+            self._indices[:] = -1
+            self._frames = np.memmap(path, dtype=np.uint8, mode="w+", shape=(capacity,) + self.frame_shape)
+        else:
+            self._indices = np.memmap(path + ".idx", dtype=np.int64, mode="r")
+            capacity = len(self._indices)
+            self._frames = np.memmap(path, dtype=np.uint8, mode="r", shape=(capacity,) + self.frame_shape)
+
+        self.capacity = capacity
+        self.max_index = capacity * (MAX_REFERENCE_VALUE // capacity)
+
+    def write(self, frame):
+        """Writes the frame into the next slot, returning its index"""
+        index = self._next
+        slot = index % self.capacity
+
+        # Invalidate the slot while it is being written
+        self._indices[slot] = -1
+        self._frames[slot] = frame
+        self._indices[slot] = index
+
+        self._next = (self._next + 1) % self.max_index
+        return index
+
+    def read(self, indices):
+        """Returns a copy of the frames with the given indices"""
+        slots = indices % self.capacity
+        frames = self._frames[slots]
+
+        # Checked after the copy, so that frames overwritten while being copied are also detected
+        if np.any(self._indices[slots] != indices):
+            raise RuntimeError(
+                "Frames of the shared memory ring '{}' were overwritten before being read. Increase the "
+                "'capacity' of the 'observation_transport' configuration".format(self.path))
+        return frames
+
+    def close(self):
+        self._frames = None
+        self._indices = None
+        if self._owner:
+            for path in (self.path, self.path + ".idx"):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._owner = False
+
+
+def get_frame_shape(obs_shape, frame_stack):
+    """Shape of each one of the frames stacked (along the last axis) into an observation"""
+    assert obs_shape[-1] % frame_stack == 0
+    return tuple(obs_shape[:-1]) + (obs_shape[-1] // frame_stack,)
+
+
+def get_min_capacity(max_episode_steps, batch_mode="truncate_episodes", rollout_fragment_length=200,
+                     train_batch_size=4000, num_workers=2, num_envs_per_worker=1):
+    """Minimum number of frames of each ring, so that none of the frames of a training iteration is overwritten
+    before the learner reads it. Each environment samples (at most) as many fragments as needed to fill the
+    train batch, and every step, as well as every reset, writes one frame. With 'complete_episodes', each fragment
+    can be up to a whole episode longer. Returns None if the episodes are unbounded and aren't truncated"""
+    if batch_mode == "complete_episodes" and max_episode_steps is None:
+        return None
+
+    # Each fragment of each worker has at least 'rollout_fragment_length' steps per environment
+    fragments_per_batch = max(num_workers, 1) * rollout_fragment_length * num_envs_per_worker
+    num_fragments = -(-train_batch_size // fragments_per_batch)
+
+    # Worst case, each step of the fragment ends the episode, adding the reset observation
+    fragment_frames = 2 * rollout_fragment_length
+    if batch_mode == "complete_episodes":
+        fragment_frames += max_episode_steps + 1
+    return num_fragments * fragment_frames
+
+
+def get_ring_bytes(frame_shape, capacity):
+    """Size, in bytes, of the shared memory used by a ring"""
+    return capacity * int(np.prod(frame_shape))
+
+
+def get_reference_space():
+    """Observation space of the environments using the transport"""
+    return Box(low=0, high=MAX_REFERENCE_VALUE, shape=(REFERENCE_SIZE,), dtype=np.int64)
+
+
+class SharedMemoryTransport(object):
+    """Environment side of the transport. Writes the newest frame of the observations into a ring,
+    returning their references"""
+
+    def __init__(self, obs_shape, frame_stack=1, capacity=DEFAULT_CAPACITY):
+        self.pid = os.getpid()
+        self.index = next(_ring_counter)
+        self.frame_stack = frame_stack
+        self.frame_channels = obs_shape[-1] // frame_stack
+        self.ring = FrameRing(get_ring_path(self.pid, self.index), get_frame_shape(obs_shape, frame_stack),
+                              capacity, create=True)
+        self.observation_space = get_reference_space()
+        self._episode_step = 0
+
+        atexit.register(self.close)
+
+    def encode(self, observation, new_episode=False):
+        """Stores the observation, which has the newest frame at its last channels, returning its reference.
+        Only the steps since the start of the episode needed to rebuild the stack are kept"""
+        self._episode_step = 0 if new_episode else min(self._episode_step + 1, self.frame_stack - 1)
+        frame_index = self.ring.write(observation[..., -self.frame_channels:])
+        return np.array([self.pid, self.index, frame_index, self._episode_step], dtype=np.int64)
+
+    def close(self):
+        self.ring.close()
+
+
+class ObservationResolver(object):
+    """Model side of the transport. Resolves batches of references into (stacked) observations"""
+
+    def __init__(self, obs_shape, frame_stack=1):
+        self.obs_shape = tuple(obs_shape)
+        self.frame_stack = frame_stack
+        self.frame_shape = get_frame_shape(obs_shape, frame_stack)
+        self._rings = {}
+
+    def _get_ring(self, pid, index):
+        key = (pid, index)
+        if key not in self._rings:
+            path = get_ring_path(pid, index)
+            if not os.path.exists(path):
+                raise FileNotFoundError(
+                    "Shared memory ring '{}' not found. The shared memory transport needs the learner and the "
+                    "rollout workers to be placed at the same node".format(path))
+            self._rings[key] = FrameRing(path, self.frame_shape)
+        return self._rings[key]
+
+    def resolve(self, references):
+        """Returns the observations of the references. References with a pid of 0 resolve to zero observations,
+        as those are the ones of the dummy batches that RLlib fills with zeros to build the policy"""
+        references = np.rint(np.asarray(references)).astype(np.int64).reshape(-1, REFERENCE_SIZE)
+        batch_size = len(references)
+
+        # Frames of each observation, oldest first. The first frame of the episode fills the missing ones
+        offsets = np.arange(self.frame_stack - 1, -1, -1)
+        offsets = np.minimum(offsets[np.newaxis, :], references[:, 3:4])
+        frame_indices = references[:, 2:3] - offsets
+
+        frames = np.zeros((batch_size, self.frame_stack) + self.frame_shape, dtype=np.uint8)
+        rings = references[:, :2]
+        for pid, index in np.unique(rings[rings[:, 0] != 0], axis=0):
+            mask = np.all(rings == (pid, index), axis=1)
+            ring = self._get_ring(int(pid), int(index))
+            ring_indices = frame_indices[mask] % ring.max_index
+            frames[mask] = ring.read(ring_indices.ravel()).reshape(ring_indices.shape + self.frame_shape)
+
+        # Concatenate the stacked frames along the channels
+        frames = np.moveaxis(frames, 1, -2)
+        return frames.reshape((batch_size,) + self.obs_shape)
@@ -15,10 +15,10 @@ import collections.abc
 import os
 import shutil
 
-import cv2
 import numpy as np
 
-from tensorboard import program
+# cv2 and tensorboard are imported by the functions using them, as they are slow to import and most of the
+# processes importing this module (e.g. the rollout workers) don't need them until their first step, if ever
 
 
 def post_process_image(image, normalized=True, grayscale=True):
@@ -32,6 +32,7 @@ def post_process_image(image, normalized=True, grayscale=True):
     if isinstance(image, list):
         image = image[0]
     if grayscale:
+        import cv2
         image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
         image = image[:, :, np.newaxis]
 
@@ -117,6 +118,8 @@ def get_checkpoint(name, directory, restore=False, overwrite=False):
 
 
 def launch_tensorboard(logdir, host="localhost", port="6006"):
+    from tensorboard import program
+
     tb = program.TensorBoard()
     tb.configure(argv=[None, "--logdir", logdir, "--host", host, "--port", port])
     url = tb.launch()
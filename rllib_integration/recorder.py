@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Recording of the episodes run by the CarlaEnv. Each episode is written to its own directory:
+
+    frames_00000.npy, ...   chunks of 'chunk_size' camera frames, [chunk_size, H, W, C] uint8
+    actions.npy             [T, A] actions given to the environment
+    rewards.npy, dones.npy  [T] rewards and done flags of each step
+    hero_*.npy, ...         [T + 1, ...] telemetry at each observation (see get_telemetry)
+    vehicle_locations.npy   [N, 3] locations of all the vehicles, with the ones of observation t being
+                            vehicle_locations[vehicle_offsets[t]:vehicle_offsets[t + 1]]
+    meta.json               shapes, chunk size, length and the metadata of the episode
+
+where T is the number of steps of the episode. Frame stacked observations only store their newest frame,
+and are rebuilt when reading them (see RecordedEpisode). All the arrays are .npy files, so that they can be
+memory mapped. The files are written by a background thread, so that stepping the environment isn't blocked.
+"""
+
+import json
+import os
+import queue
+import shutil
+import threading
+import uuid
+
+import numpy as np
+
+HERO_TELEMETRY = ["hero_location", "hero_rotation", "hero_velocity", "hero_control"]
+
+# Columns with a variable number of rows per observation, stored concatenated together with their offsets
+RAGGED_COLUMNS = ["vehicle_locations"]
+
+
+def get_hero_telemetry(hero):
+    """Returns the state of the hero as a dictionary of (float64) numpy arrays"""
+    transform = hero.get_transform()
+    velocity = hero.get_velocity()
+    control = hero.get_control()
+    return {
+        "hero_location": np.array([transform.location.x, transform.location.y, transform.location.z]),
+        "hero_rotation": np.array([transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll]),
+        "hero_velocity": np.array([velocity.x, velocity.y, velocity.z]),
+        "hero_control": np.array([control.throttle, control.steer, control.brake]),
+    }
+
+
+def _get_location(location):
+    return np.array([location.x, location.y, location.z])
+
+
+def _get_waypoint_telemetry(waypoint):
+    """[valid, lane type, is junction, lane width, x, y, z, pitch, yaw, roll] of the waypoint"""
+    if waypoint is None:
+        return np.zeros(10)
+
+    transform = waypoint.transform
+    return np.array([1, int(waypoint.lane_type), waypoint.is_junction, waypoint.lane_width,
+                     transform.location.x, transform.location.y, transform.location.z,
+                     transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll])
+
+
+def get_telemetry(core, sensor_data):
+    """Returns the state of the hero and its surroundings needed to recompute the rewards and done
+    flags of the experiments, i.e. the results of the queries done to the world and map"""
+    import carla
+
+    hero = core.hero
+    location = hero.get_location()
+    telemetry = get_hero_telemetry(hero)
+
+    # Closest waypoint at any lane type, and the closest one at a driving lane
+    telemetry["waypoint"] = _get_waypoint_telemetry(
+        core.map.get_waypoint(location, project_to_road=False, lane_type=carla.LaneType.Any))
+    telemetry["lane_waypoint"] = _get_waypoint_telemetry(
+        core.map.get_waypoint(location, lane_type=carla.LaneType.Driving | carla.LaneType.Parking))
+
+    traffic_light = hero.get_traffic_light()
+    telemetry["traffic_light_location"] = np.full(3, np.nan) if traffic_light is None \
+        else _get_location(traffic_light.get_location())
+
+    vehicles = core.world.get_actors().filter("vehicle.*")
+    telemetry["vehicle_locations"] = np.array([_get_location(v.get_location()) for v in vehicles]).reshape(-1, 3)
+    telemetry["collision"] = "collision" in sensor_data
+    return telemetry
+
+
+def get_chunk_path(path, index):
+    return os.path.join(path, "frames_{:05d}.npy".format(index))
+
+
+class _EpisodeWriter(object):
+    """Writes the data of one episode. Only used by the writer thread of the EpisodeRecorder"""
+
+    def __init__(self, path, chunk_size, metadata):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.metadata = metadata
+        self.frames = []
+        self.num_chunks = 0
+        self.num_frames = 0
+        self.frame_shape = None
+        self.columns = {}
+
+        os.makedirs(path, exist_ok=True)
+
+    def add_frame(self, frame, telemetry):
+        self.frame_shape = frame.shape
+        self.frames.append(frame)
+        self.num_frames += 1
+        if len(self.frames) == self.chunk_size:
+            self.flush_frames()
+
+        for key, value in telemetry.items():
+            self.columns.setdefault(key, []).append(value)
+
+    def add_step(self, action, reward, done):
+        self.columns.setdefault("actions", []).append(np.asarray(action, dtype=np.float32))
+        self.columns.setdefault("rewards", []).append(reward)
+        self.columns.setdefault("dones", []).append(done)
+
+    def flush_frames(self):
+        if self.frames:
+            np.save(get_chunk_path(self.path, self.num_chunks), np.stack(self.frames))
+            self.num_chunks += 1
+            self.frames = []
+
+    def close(self):
+        # Episodes without steps, such as the one started when creating the environment, aren't kept
+        if "rewards" not in self.columns:
+            shutil.rmtree(self.path, ignore_errors=True)
+            return
+
+        self.flush_frames()
+
+        dtypes = {"rewards": np.float32, "dones": np.bool_, "collision": np.bool_}
+        for key, values in self.columns.items():
+            if key in RAGGED_COLUMNS:
+                offsets = np.cumsum([0] + [len(value) for value in values])
+                np.save(os.path.join(self.path, key.split("_")[0] + "_offsets.npy"), offsets)
+                values = np.concatenate(values)
+            np.save(os.path.join(self.path, key + ".npy"), np.array(values, dtype=dtypes.get(key)))
+
+        meta = dict(self.metadata)
+        meta.update({
+            "length": len(self.columns.get("rewards", [])),
+            "num_frames": self.num_frames,
+            "frame_shape": list(self.frame_shape) if self.frame_shape else None,
+            "chunk_size": self.chunk_size,
+            "columns": sorted(list(self.columns.keys()) +
+                              [key.split("_")[0] + "_offsets" for key in RAGGED_COLUMNS if key in self.columns]),
+        })
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+
+class EpisodeRecorder(object):
+    """
+    Records the episodes of an environment to the 'directory'. The data is queued and written by a background
+    thread. The queue has at most 'queue_size' items, blocking the environment if the disk can't keep up
+    """
+
+    def __init__(self, directory, frame_stack=1, chunk_size=256, queue_size=256):
+        self.directory = directory
+        self.frame_stack = frame_stack
+        self.chunk_size = chunk_size
+        self.episode_count = 0
+        self.frame_channels = None
+
+        # Ray can reuse a worker process for another recorder at the same directory, so the pid isn't unique
+        self.name = "{}_{}".format(os.getpid(), uuid.uuid4().hex[:8])
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._episode_open = False
+        self._error = None
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def _write_loop(self):
+        writer = None
+        while True:
+            item = self._queue.get()
+            try:
+                command = item[0]
+                if command == "start":
+                    writer = _EpisodeWriter(*item[1:])
+                elif command == "frame":
+                    writer.add_frame(*item[1:])
+                elif command == "step":
+                    writer.add_step(*item[1:])
+                elif command in ("end", "stop") and writer is not None:
+                    writer.close()
+                    writer = None
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+            if item[0] == "stop":
+                break
+
+    def _put(self, *item):
+        if self._error is not None:
+            raise RuntimeError("The episode recorder failed to write its data") from self._error
+        self._queue.put(item)
+
+    def _get_frame(self, observation):
+        """Newest frame of the observation, which are stacked along their last axis"""
+        if self.frame_channels is None:
+            self.frame_channels = observation.shape[-1] // self.frame_stack
+        return np.array(observation[..., -self.frame_channels:], dtype=np.uint8)
+
+    def start_episode(self, observation, telemetry, metadata=None):
+        """Starts a new episode (ending the previous one, if any) with its first observation"""
+        self.end_episode()
+
+        path = os.path.join(self.directory, "episode_{}_{:06d}".format(self.name, self.episode_count))
+        self.episode_count += 1
+        metadata = dict(metadata or {}, frame_stack=self.frame_stack)
+
+        self._put("start", path, self.chunk_size, metadata)
+        self._put("frame", self._get_frame(observation), telemetry)
+        self._episode_open = True
+
+    def record_step(self, action, reward, done, observation, telemetry):
+        """Records a step of the episode, with the observation obtained after applying the action"""
+        self._put("step", np.array(action), float(reward), bool(done))
+        self._put("frame", self._get_frame(observation), telemetry)
+        if done:
+            self.end_episode()
+
+    def end_episode(self):
+        if self._episode_open:
+            self._put("end")
+            self._episode_open = False
+
+    def close(self):
+        """Writes the remaining data, waiting for the writer thread to finish"""
+        if self._thread.is_alive():
+            self._put("stop")
+            self._thread.join()
+
+
+class RecordedEpisode(object):
+    """Reads an episode written by the EpisodeRecorder, memory mapping its arrays"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+
+        self.length = self.meta["length"]
+        self.num_frames = self.meta["num_frames"]
+        self.chunk_size = self.meta["chunk_size"]
+        self.frame_stack = self.meta["frame_stack"]
+
+        self.columns = {}
+        for key in self.meta["columns"]:
+            self.columns[key] = np.load(os.path.join(path, key + ".npy"), mmap_mode="r")
+
+        num_chunks = (self.num_frames + self.chunk_size - 1) // self.chunk_size
+        self._chunks = [np.load(get_chunk_path(path, i), mmap_mode="r") for i in range(num_chunks)]
+
+    def __getitem__(self, key):
+        return self.columns[key]
+
+    def get_ragged(self, key, index):
+        """Rows of a ragged column (see RAGGED_COLUMNS) at the given observation"""
+        offsets = self.columns[key.split("_")[0] + "_offsets"]
+        return self.columns[key][offsets[index]:offsets[index + 1]]
+
+    def get_frame(self, index):
+        return self._chunks[index // self.chunk_size][index % self.chunk_size]
+
+    def get_observation(self, index):
+        """Frame stacked observation at the given index, repeating the first frame at the start of the episode"""
+        frames = [self.get_frame(max(index - k, 0)) for k in range(self.frame_stack - 1, -1, -1)]
+        return np.concatenate(frames, axis=2)
+
+
+def list_episodes(directory):
+    """Paths of the complete episodes recorded at the directory"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        if "meta.json" in files:
+            paths.append(root)
+    return sorted(paths)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Offline environment replaying the episodes recorded by the EpisodeRecorder (see recorder.py). The rewards and
+done flags are recomputed by the experiment, which is given a ReplayCore instead of the CarlaCore. Its hero,
+map and world serve the recorded telemetry through the subset of the CARLA API used by the experiments:
+
+    hero: get_location, get_transform, get_velocity, get_control and get_traffic_light
+    map: get_waypoint at the hero location, either at any lane (project_to_road=False) or at a driving one
+    world: get_actors().filter("vehicle.*"), with only their get_location
+"""
+
+from __future__ import print_function
+
+import random
+
+import gym
+
+import carla
+
+from rllib_integration.recorder import RAGGED_COLUMNS, RecordedEpisode, list_episodes
+
+STEP_COLUMNS = ["actions", "rewards", "dones"]
+
+
+def _get_location(data):
+    return carla.Location(x=float(data[0]), y=float(data[1]), z=float(data[2]))
+
+
+def _get_rotation(data):
+    return carla.Rotation(pitch=float(data[0]), yaw=float(data[1]), roll=float(data[2]))
+
+
+class ReplayActor(object):
+    def __init__(self, location):
+        self._location = location
+
+    def get_location(self):
+        return self._location
+
+
+class ReplayActorList(list):
+    def filter(self, pattern):
+        """Only the vehicles are recorded"""
+        return self if pattern.startswith("vehicle") else ReplayActorList()
+
+
+class ReplayWaypoint(object):
+    def __init__(self, data):
+        lane_type = int(data[1])
+        self.lane_type = carla.LaneType.values.get(lane_type, lane_type)
+        self.is_junction = bool(data[2])
+        self.lane_width = float(data[3])
+        self.transform = carla.Transform(_get_location(data[4:7]), _get_rotation(data[7:10]))
+
+
+class ReplayHero(ReplayActor):
+    def __init__(self, telemetry):
+        super().__init__(_get_location(telemetry["hero_location"]))
+        self._transform = carla.Transform(self._location, _get_rotation(telemetry["hero_rotation"]))
+        self._velocity = carla.Vector3D(*[float(v) for v in telemetry["hero_velocity"]])
+
+        throttle, steer, brake = [float(v) for v in telemetry["hero_control"]]
+        self._control = carla.VehicleControl(throttle=throttle, steer=steer, brake=brake)
+
+        traffic_light = telemetry["traffic_light_location"]
+        self._traffic_light = None if traffic_light[0] != traffic_light[0] else \
+            ReplayActor(_get_location(traffic_light))
+
+    def get_transform(self):
+        return self._transform
+
+    def get_velocity(self):
+        return self._velocity
+
+    def get_control(self):
+        return self._control
+
+    def get_traffic_light(self):
+        return self._traffic_light
+
+
+class ReplayMap(object):
+    def __init__(self, telemetry):
+        self._waypoint = ReplayWaypoint(telemetry["waypoint"]) if telemetry["waypoint"][0] else None
+        self._lane_waypoint = ReplayWaypoint(telemetry["lane_waypoint"]) if telemetry["lane_waypoint"][0] else None
+
+    def get_waypoint(self, location, project_to_road=True, lane_type=carla.LaneType.Driving):
+        """Only the two waypoints queried at the hero location are recorded"""
+        return self._lane_waypoint if project_to_road else self._waypoint
+
+
+class ReplayWorld(object):
+    def __init__(self, telemetry):
+        self._vehicles = ReplayActorList([ReplayActor(_get_location(v)) for v in telemetry["vehicle_locations"]])
+
+    def get_actors(self):
+        return self._vehicles
+
+
+class ReplayCore(object):
+    """Stand-in of the CarlaCore with the recorded state of a single observation"""
+
+    def __init__(self, telemetry):
+        self.hero = ReplayHero(telemetry)
+        self.map = ReplayMap(telemetry)
+        self.world = ReplayWorld(telemetry)
+
+
+class ReplayEnv(gym.Env):
+    """
+    Environment with the same configuration as the CarlaEnv (only its 'experiment' is used), plus:
+
+        directory: directory with the recorded episodes
+        shuffle: whether or not to replay the episodes in a random order
+        load_observations: set to False to skip reading the camera frames, when only the rewards are needed
+
+    The recorded actions are replayed, whatever the action given to step()
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+        self.experiment = self.config["experiment"]["type"](self.config["experiment"])
+        self.action_space = self.experiment.get_action_space()
+        self.observation_space = self.experiment.get_observation_space()
+
+        self.paths = list_episodes(self.config["directory"])
+        if not self.paths:
+            raise FileNotFoundError("Could not find any recorded episode at {}".format(self.config["directory"]))
+
+        self.shuffle = self.config.get("shuffle", False)
+        self.load_observations = self.config.get("load_observations", True)
+        self.episode = None
+        self.core = None
+        self._next_episode = 0
+        self._index = 0
+
+    def _get_telemetry(self, index):
+        telemetry = {}
+        for key, column in self.episode.columns.items():
+            if key in STEP_COLUMNS or key.endswith("_offsets"):
+                continue
+            telemetry[key] = self.episode.get_ragged(key, index) if key in RAGGED_COLUMNS else column[index]
+        return telemetry
+
+    def _get_observation(self, index):
+        telemetry = self._get_telemetry(index)
+        self.core = ReplayCore(telemetry)
+
+        observation = self.episode.get_observation(index) if self.load_observations else None
+        return self.experiment.get_replay_observation(observation, telemetry)
+
+    def reset(self):
+        if self.shuffle:
+            path = random.choice(self.paths)
+        else:
+            path = self.paths[self._next_episode % len(self.paths)]
+            self._next_episode += 1
+
+        self.episode = RecordedEpisode(path)
+        self.experiment.reset()
+        self._index = 0
+
+        observation, _ = self._get_observation(0)
+        return observation
+
+    def step(self, action=None):
+        recorded_action = self.episode["actions"][self._index]
+        self.experiment.compute_action(recorded_action)
+        self._index += 1
+
+        observation, info = self._get_observation(self._index)
+        done = self.experiment.get_done_status(observation, self.core)
+        reward = self.experiment.compute_reward(observation, self.core)
+
+        info["recorded_reward"] = float(self.episode["rewards"][self._index - 1])
+        info["recorded_done"] = bool(self.episode["dones"][self._index - 1])
+        if self._index >= self.episode.length and not done:
+            done = True
+            info["truncated"] = True
+
+        return observation, reward, done, info
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Output size and crop of the cameras. These are plain functions of the camera attributes and the image arrays,
+kept apart from the sensors so that the observation shapes can be computed (and checked) without CARLA.
+"""
+
+import numpy as np
+
+# Attributes of the cameras that are handled by the client, and not sent to the blueprint
+OUTPUT_SIZE_X, OUTPUT_SIZE_Y, CROP = "output_size_x", "output_size_y", "crop"
+
+
+def parse_crop(crop):
+    """Parses a 'x,y,width,height' region of interest, in pixels of the rendered image"""
+    if isinstance(crop, str):
+        crop = [int(x) for x in crop.split(",")]
+    assert len(crop) == 4
+    return tuple(int(x) for x in crop)
+
+
+def get_camera_plan(attributes):
+    """
+    Chooses how a camera produces its output size, given its attributes. Without crop, the image is directly
+    rendered at the output size by the server. Otherwise, it is rendered at 'image_size_x' x 'image_size_y',
+    and the region of interest is cropped and resized by the client.
+
+    Returns the render size (width, height), the crop (x, y, width, height) or None, and the output size
+    (width, height)
+    """
+    render = (int(attributes.get("image_size_x", 800)), int(attributes.get("image_size_y", 600)))
+    crop = parse_crop(attributes[CROP]) if attributes.get(CROP) is not None else None
+
+    default = crop[2:] if crop is not None else render
+    output = (int(attributes.get(OUTPUT_SIZE_X, default[0])), int(attributes.get(OUTPUT_SIZE_Y, default[1])))
+
+    if crop is None:
+        return output, None, output
+
+    x, y, width, height = crop
+    assert 0 <= x and 0 <= y and x + width <= render[0] and y + height <= render[1], \
+        "The crop {} is outside of the rendered image {}".format(crop, render)
+    return render, crop, output
+
+
+def get_camera_shape(attributes):
+    """Shape (height, width, 3) of the images parsed by a camera with the given attributes"""
+    _, _, (width, height) = get_camera_plan(attributes)
+    return height, width, 3
+
+
+def get_nearest_indices(size, output_size):
+    """Indices of the source pixels sampled by a nearest-neighbour resize along one axis"""
+    return ((np.arange(output_size) + 0.5) * size / output_size).astype(np.int64)
+
+
+def resize_image(array, output_size, area=True):
+    """
+    Resizes an image [H, W, C] to output_size (width, height). Downsampling by integer factors uses an area
+    filter (the mean of each block of pixels) if 'area', and any other resize samples the nearest pixels
+    """
+    height, width = array.shape[:2]
+    output_width, output_height = output_size
+    if (width, height) == (output_width, output_height):
+        return array
+
+    if area and height % output_height == 0 and width % output_width == 0:
+        factor_y, factor_x = height // output_height, width // output_width
+        blocks = array.reshape(output_height, factor_y, output_width, factor_x, array.shape[2])
+        return blocks.mean(axis=(1, 3), dtype=np.float32).round().astype(array.dtype)
+
+    rows = get_nearest_indices(height, output_height)
+    cols = get_nearest_indices(width, output_width)
+    return array[rows[:, np.newaxis], cols]
@@ -12,46 +12,100 @@
 # Reinforcement Learning on a Self-Driving Car in Urban Settings" by Konstantinos Dimitrakopoulos,
 # student of the department of Informatics and Telecommunications, University of Athens
 
-from rllib_integration.sensors.sensor import *
-from rllib_integration.sensors.bird_view_manager import BirdviewManager
+import importlib
+
+SENSOR_MODULE = "rllib_integration.sensors.sensor"
+
+
+def load_class(path):
+    """Imports a class given as 'module:class'"""
+    module_name, class_name = path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class SensorEntry(object):
+    """
+    Sensor type of the registry. The class can be given as 'module:class', in which case it is imported the
+    first time the type is spawned. The blueprint is the CARLA blueprint of the sensor, if different from its
+    type key, and the parse strategy, if any, replaces the parse method of the class
+    """
+
+    def __init__(self, sensor_class, blueprint=None, parse=None):
+        self.sensor_class = sensor_class
+        self.blueprint = blueprint
+        self.parse = parse
+        self._resolved = None
+
+    def resolve(self):
+        if self._resolved is None:
+            sensor_class = self.sensor_class
+            if isinstance(sensor_class, str):
+                sensor_class = load_class(sensor_class)
+            if self.parse is not None:
+                # Subclass, so that the callbacks started while spawning the sensor already use the strategy
+                sensor_class = type(sensor_class.__name__, (sensor_class,), {"parse": self.parse})
+            self._resolved = sensor_class
+        return self._resolved
+
 
 class SensorFactory(object):
     """
-    Class to simplify the creation of the different CARLA sensors
+    Class to simplify the creation of the different CARLA sensors. Sensors are spawned by the 'type' of their
+    attributes, looked up at a registry to which new types can be added with SensorFactory.register
     """
 
-    @staticmethod
-    def spawn(name, attributes, interface, parent):
+    registry = {}
+
+    @classmethod
+    def register(cls, type_, sensor_class, blueprint=None, parse=None):
+        """
+        Adds a sensor type to the factory, replacing the previous one, if any.
+
+        :param type_: key used as 'type' at the sensor configuration
+        :param sensor_class: BaseSensor subclass, or 'module:class' to import it lazily
+        :param blueprint: CARLA blueprint of the sensor (default: the type key)
+        :param parse: function (sensor, data) used instead of the parse method of the class
+        """
+        cls.registry[type_] = SensorEntry(sensor_class, blueprint, parse)
+
+    @classmethod
+    def get_class(cls, type_):
+        entry = cls.registry.get(type_)
+        if entry is None:
+            raise RuntimeError("Sensor of type {} not supported".format(type_))
+        return entry.resolve()
+
+    @classmethod
+    def spawn(cls, name, attributes, interface, parent):
         attributes = attributes.copy()
         type_ = attributes.get("type", "")
 
-        if type_ == "sensor.camera.rgb":
-            sensor = CameraRGB(name, attributes, interface, parent)
-        elif type_ == "sensor.camera.depth":
-            sensor = CameraDepth(name, attributes, interface, parent)
-        elif type_ == "sensor.camera.semantic_segmentation":
-            sensor = CameraSemanticSegmentation(name, attributes, interface, parent)
-        elif type_ == "sensor.camera.dvs":
-            sensor = CameraDVS(name, attributes, interface, parent)
-        elif type_ == "sensor.lidar.ray_cast":
-            sensor = Lidar(name, attributes, interface, parent)
-        elif type_ == "sensor.lidar.ray_cast_semantic":
-            sensor = SemanticLidar(name, attributes, interface, parent)
-        elif type_ == "sensor.other.radar":
-            sensor = Radar(name, attributes, interface, parent)
-        elif type_ == "sensor.other.gnss":
-            sensor = Gnss(name, attributes, interface, parent)
-        elif type_ == "sensor.other.imu":
-            sensor = Imu(name, attributes, interface, parent)
-        elif type_ == "sensor.other.lane_invasion":
-            sensor = LaneInvasion(name, attributes, interface, parent)
-        elif type_ == "sensor.other.collision":
-            sensor = Collision(name, attributes, interface, parent)
-        elif type_ == "sensor.other.obstacle":
-            sensor = Obstacle(name, attributes, interface, parent)
-        elif type_ == "sensor.birdview":  # Pseudosensor
-            sensor = BirdviewManager(name, attributes, interface, parent)
-        else:
-            raise RuntimeError("Sensor of type {} not supported".format(type_))
+        sensor_class = cls.get_class(type_)
+        blueprint = cls.registry[type_].blueprint
+        if blueprint is not None:
+            attributes["type"] = blueprint
+
+        return sensor_class(name, attributes, interface, parent)
+
+
+# Built-in sensors, all of them defined at SENSOR_MODULE
+BUILTIN_SENSORS = {
+    "sensor.camera.rgb": "CameraRGB",
+    "sensor.camera.depth": "CameraDepth",
+    "sensor.camera.semantic_segmentation": "CameraSemanticSegmentation",
+    "sensor.camera.dvs": "CameraDVS",
+    "sensor.lidar.ray_cast": "Lidar",
+    "sensor.lidar.ray_cast_semantic": "SemanticLidar",
+    "sensor.other.radar": "Radar",
+    "sensor.other.gnss": "Gnss",
+    "sensor.other.imu": "Imu",
+    "sensor.other.lane_invasion": "LaneInvasion",
+    "sensor.other.collision": "Collision",
+    "sensor.other.obstacle": "Obstacle",
+}
+
+for type_, class_name in BUILTIN_SENSORS.items():
+    SensorFactory.register(type_, "{}:{}".format(SENSOR_MODULE, class_name))
 
-        return sensor
\ No newline at end of file
+# Pseudosensor, which needs pygame
+SensorFactory.register("sensor.birdview", "rllib_integration.sensors.bird_view_manager:BirdviewManager")
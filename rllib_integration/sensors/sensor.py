@@ -20,6 +20,9 @@ import numpy as np
 
 import carla
 
+from rllib_integration.blueprint_cache import get_blueprint_cache
+from rllib_integration.sensors.camera_plan import CROP, OUTPUT_SIZE_X, OUTPUT_SIZE_Y, get_camera_plan, resize_image
+
 # ==================================================================================================
 # -- BaseSensor -----------------------------------------------------------------------------------
 # ==================================================================================================
@@ -65,10 +68,8 @@ class CarlaSensor(BaseSensor):
             transform = [float(x) for x in transform.split(",")]
         assert len(transform) == 6
 
-        blueprint = world.get_blueprint_library().find(type_)
-        blueprint.set_attribute("role_name", name)
-        for key, value in attributes.items():
-            blueprint.set_attribute(str(key), str(value))
+        blueprint_attributes = dict(attributes, role_name=name)
+        blueprint = get_blueprint_cache(world).get_configured(type_, blueprint_attributes)
 
         transform = carla.Transform(
             carla.Location(transform[0], transform[1], transform[2]),
@@ -97,7 +98,15 @@ class PseudoSensor(BaseSensor):
 # -- Cameras -----------------------------------------------------------------------------------
 # ==================================================================================================
 class BaseCamera(CarlaSensor):
+    # Whether or not the pixels can be averaged when downsampling. Not the case of labels or encoded values
+    area_resize = True
+
     def __init__(self, name, attributes, interface, parent):
+        render, self.crop, self.output_size = get_camera_plan(attributes)
+        for key in (OUTPUT_SIZE_X, OUTPUT_SIZE_Y, CROP):
+            attributes.pop(key, None)
+        attributes["image_size_x"], attributes["image_size_y"] = render
+
         super().__init__(name, attributes, interface, parent)
 
     def parse(self, sensor_data):
@@ -105,9 +114,12 @@ class BaseCamera(CarlaSensor):
         # sensor_data: [fov, height, width, raw_data]
         array = np.frombuffer(sensor_data.raw_data, dtype=np.dtype("uint8"))
         array = np.reshape(array, (sensor_data.height, sensor_data.width, 4))
+        if self.crop is not None:
+            x, y, width, height = self.crop
+            array = array[y:y + height, x:x + width]
         array = array[:, :, :3]
         array = array[:, :, ::-1]
-        return array
+        return resize_image(array, self.output_size, self.area_resize)
 
 
 class CameraRGB(BaseCamera):
@@ -117,12 +129,14 @@ class CameraRGB(BaseCamera):
 
 
 class CameraDepth(BaseCamera):
+    area_resize = False
 
     def __init__(self, name, attributes, interface, parent):
         super().__init__(name, attributes, interface, parent)
 
 
 class CameraSemanticSegmentation(BaseCamera):
+    area_resize = False
 
     def __init__(self, name, attributes, interface, parent):
         super().__init__(name, attributes, interface, parent)
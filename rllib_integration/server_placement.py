@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Placement of the CARLA servers on the GPUs and CPU cores of a node. The GPU of a server is the one that Ray
+assigned to its worker, and each worker gets its own slot of cores, split between the env process and its
+server. The launch arguments are built by pure functions, so that they can be checked on machines without GPUs.
+
+Slots are claimed by the workers of a node with a lock file each, held while the worker process lives, so
+that no two workers share cores even if Ray gives them the same GPU (fractional GPUs) or they belong to
+different runs. The cores are partitioned per GPU of the node, and workers look for a free slot at the
+partition of their GPU first.
+"""
+
+import fcntl
+import glob
+import os
+
+
+def get_assigned_gpus():
+    """GPU ids that Ray assigned to the current worker. Empty outside Ray, or if the worker has no GPUs"""
+    try:
+        import ray
+    except ImportError:
+        return []
+
+    if not ray.is_initialized():
+        return []
+    return [int(gpu_id) for gpu_id in ray.get_gpu_ids()]
+
+
+def get_available_cores():
+    """Cores the current process is allowed to run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+SLOT_DIRECTORY = "/dev/shm"
+
+# File descriptors of the slots claimed by this process. Their locks are released when the process exits
+_claimed_slots = {}
+
+
+def get_node_gpu_count():
+    """Number of NVIDIA GPUs of the node, regardless of the ones visible to the current process"""
+    return len(glob.glob("/dev/nvidia[0-9]*"))
+
+
+def get_slot_path(directory, slot):
+    return os.path.join(directory, "carla_cores_{}.lock".format(slot))
+
+
+def claim_slot(num_slots, start=0, directory=SLOT_DIRECTORY):
+    """Claims the first free slot of the node, searching from 'start'. Returns None if all of them are taken"""
+    for i in range(num_slots):
+        slot = (start + i) % num_slots
+        fd = os.open(get_slot_path(directory, slot), os.O_CREAT | os.O_RDWR, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            continue
+        _claimed_slots[(directory, slot)] = fd
+        return slot
+    return None
+
+
+def release_slot(slot, directory=SLOT_DIRECTORY):
+    fd = _claimed_slots.pop((directory, slot), None)
+    if fd is not None:
+        os.close(fd)
+
+
+def get_core_split(available_cores, slot, cores_per_slot, env_cores=1):
+    """
+    Splits the cores of a node into slots of 'cores_per_slot' consecutive cores, and returns the ones of the
+    env process (the first 'env_cores') and of the server (the rest) at the given slot. Slots wrap around
+    if there are more workers than slots. Returns None, None if a slot can't hold both processes.
+    """
+    num_slots = len(available_cores) // cores_per_slot
+    if num_slots == 0 or cores_per_slot <= env_cores:
+        return None, None
+
+    start = (slot % num_slots) * cores_per_slot
+    cores = available_cores[start:start + cores_per_slot]
+    return cores[:env_cores], cores[env_cores:]
+
+
+def get_server_command(carla_root, port, quality_level="Low", show_display=False, resolution=(600, 600),
+                       gpu=None, cores=None):
+    """
+    Returns the shell command that starts a CARLA server, as a list of strings.
+
+    :param gpu: GPU to render on. The server only sees this GPU (CUDA_VISIBLE_DEVICES), overriding the devices
+        of its Ray worker. Without display, the server uses OpenGL, and its device is chosen with
+        SDL_HINT_CUDA_DEVICE, always 0 as it is renumbered by CUDA_VISIBLE_DEVICES. With display (Vulkan, whose
+        devices aren't renumbered), it is chosen with -graphicsadapter. Without a GPU, the CUDA_VISIBLE_DEVICES
+        of the worker (empty for those without GPUs) is removed, so that the server sees all of them
+    :param cores: cores the server is pinned to (with taskset)
+    """
+    command = []
+    if not show_display:
+        command.append("DISPLAY= ")
+    if gpu is not None:
+        command.append("CUDA_VISIBLE_DEVICES={}".format(gpu))
+        if not show_display:
+            command.append("SDL_HINT_CUDA_DEVICE=0")
+    else:
+        command += ["env", "-u", "CUDA_VISIBLE_DEVICES"]
+    if cores:
+        command += ["taskset", "-c", ",".join(str(core) for core in cores)]
+
+    command.append("{}/CarlaUE4.sh".format(carla_root))
+    if show_display:
+        command += [
+            "-windowed",
+            "-ResX={}".format(resolution[0]),
+            "-ResY={}".format(resolution[1]),
+        ]
+        if gpu is not None:
+            command.append("-graphicsadapter={}".format(gpu))
+    else:
+        command.append("-opengl")  # no-display isn't supported for Unreal 4.24 with vulkan
+
+    command += [
+        "--carla-rpc-port={}".format(port),
+        "-quality-level={}".format(quality_level)
+    ]
+    return command
+
+
+def get_placement(config, worker_index=0, gpu_ids=None, available_cores=None, node_gpus=None,
+                  slot_directory=SLOT_DIRECTORY):
+    """
+    Returns the GPU of the server and the cores of the env process and the server, given the carla
+    configuration. The slot of cores is claimed for the rest of the life of the process. Workers with a GPU
+    look for it from the first slot of the partition of their GPU, and the rest from their worker index.
+    If all the slots are taken, the worker index selects the one to share.
+    """
+    gpu_ids = get_assigned_gpus() if gpu_ids is None else gpu_ids
+    gpu = gpu_ids[0] if gpu_ids and config["gpu_placement"] else None
+
+    env_cores, server_cores = None, None
+    affinity = config["cpu_affinity"]
+    if affinity:
+        available_cores = get_available_cores() if available_cores is None else available_cores
+        cores_per_slot = affinity["cores_per_worker"]
+        num_slots = len(available_cores) // cores_per_slot
+        if num_slots == 0:
+            return gpu, None, None
+
+        if gpu is not None:
+            node_gpus = max(get_node_gpu_count() if node_gpus is None else node_gpus, gpu + 1)
+            start = gpu * max(num_slots // node_gpus, 1)
+        else:
+            start = worker_index
+        slot = claim_slot(num_slots, start, slot_directory)
+        if slot is None:
+            print("All the {} slots of {} cores are taken. Sharing the cores of slot {}".format(
+                num_slots, cores_per_slot, worker_index % num_slots))
+            slot = worker_index
+
+        env_cores, server_cores = get_core_split(available_cores, slot, cores_per_slot,
+                                                 affinity.get("env_cores", 1))
+
+    return gpu, env_cores, server_cores
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Resource usage of the CARLA server of an environment, sampled by a background thread. The samples cover the
+whole process group of the server (the launcher script and the UE4 binary), and include its GPU memory if
+pynvml is installed.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+import psutil
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+BASE_WATCHDOG_CONFIG = {
+    "interval": 5.0,  # Seconds between samples
+    "max_samples": 720,  # Samples kept until they are exported
+    "cpu_window": 12,  # Number of samples averaged to check the CPU threshold
+    "max_rss_mb": None,  # Thresholds that recycle the server between episodes. None to disable them
+    "max_gpu_memory_mb": None,
+    "max_cpu_percent": None,
+}
+
+
+class ServerWatchdog(object):
+    """
+    Samples the RSS, CPU and GPU memory of the server of a CarlaCore. It follows the server across restarts,
+    as the process is read from the core at each sample
+    """
+
+    def __init__(self, core, config=None):
+        self.core = core
+        self.config = dict(BASE_WATCHDOG_CONFIG, **(config or {}))
+
+        self.samples = deque(maxlen=self.config["max_samples"])
+        self.last_sample = None
+        self._recent_cpu = deque(maxlen=self.config["cpu_window"])
+        self._processes = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self._gpu_handle = None
+        if pynvml is not None and core.gpu is not None:
+            try:
+                pynvml.nvmlInit()
+                self._gpu_handle = pynvml.nvmlDeviceGetHandleByIndex(core.gpu)
+            except pynvml.NVMLError:
+                self._gpu_handle = None
+
+        self._thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self._thread.start()
+
+    def _get_processes(self, pid):
+        """Processes of the server, reusing the psutil objects so that their CPU usage is measured
+        since the previous sample"""
+        try:
+            root = psutil.Process(pid)
+            current = [root] + root.children(recursive=True)
+        except psutil.Error as e:
+            logging.warning("Unable to list the processes of the CARLA server %d: %s", pid, e)
+            return []
+
+        processes = {}
+        for process in current:
+            processes[process.pid] = self._processes.get(process.pid, process)
+        self._processes = processes
+        return list(processes.values())
+
+    def _get_gpu_memory(self, pids):
+        if self._gpu_handle is None:
+            return float("nan")
+        try:
+            running = pynvml.nvmlDeviceGetGraphicsRunningProcesses(self._gpu_handle) \
+                + pynvml.nvmlDeviceGetComputeRunningProcesses(self._gpu_handle)
+        except pynvml.NVMLError:
+            return float("nan")
+        return sum(p.usedGpuMemory or 0 for p in running if p.pid in pids) / 2 ** 20
+
+    def sample(self):
+        """Takes a sample of the current server. Returns None if there is no server running"""
+        server_process = self.core.server_process
+        if server_process is None or server_process.poll() is not None:
+            return None
+
+        rss, cpu = 0, 0.0
+        processes = self._get_processes(server_process.pid)
+        for process in processes:
+            try:
+                rss += process.memory_info().rss
+                cpu += process.cpu_percent()
+            except psutil.NoSuchProcess:
+                pass  # Exited since listing the processes
+            except psutil.Error as e:
+                logging.warning("Unable to sample the CARLA server process %d: %s", process.pid, e)
+
+        sample = {
+            "time": time.time(),
+            "rss_mb": rss / 2 ** 20,
+            "cpu_percent": cpu,
+            "gpu_memory_mb": self._get_gpu_memory({process.pid for process in processes}),
+        }
+        with self._lock:
+            self.samples.append(sample)
+            self.last_sample = sample
+            self._recent_cpu.append(cpu)
+        return sample
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.config["interval"]):
+            try:
+                self.sample()
+            except Exception:
+                # Keep sampling, a stopped watchdog would never recycle a leaking server
+                logging.exception("Failed to sample the CARLA server")
+
+    def pop_samples(self):
+        """Returns the samples taken since the last call"""
+        with self._lock:
+            samples = list(self.samples)
+            self.samples.clear()
+        return samples
+
+    def get_recycle_reason(self):
+        """Returns why the server should be recycled, or None if it is within all the thresholds"""
+        with self._lock:
+            last = self.last_sample
+            cpu = sum(self._recent_cpu) / len(self._recent_cpu) if self._recent_cpu else 0.0
+        if last is None:
+            return None
+
+        config = self.config
+        if config["max_rss_mb"] is not None and last["rss_mb"] > config["max_rss_mb"]:
+            return "RSS of {:.0f} MB".format(last["rss_mb"])
+        if config["max_gpu_memory_mb"] is not None and last["gpu_memory_mb"] > config["max_gpu_memory_mb"]:
+            return "GPU memory of {:.0f} MB".format(last["gpu_memory_mb"])
+        if config["max_cpu_percent"] is not None and len(self._recent_cpu) == self._recent_cpu.maxlen \
+                and cpu > config["max_cpu_percent"]:
+            return "CPU usage of {:.0f}%".format(cpu)
+        return None
+
+    def reset(self):
+        """Forgets the usage of the previous server, once it has been recycled"""
+        with self._lock:
+            self.last_sample = None
+            self._recent_cpu.clear()
+            self._processes = {}
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+RLlib model used together with the shared memory observation transport (see frame_ring.py)
+"""
+
+import numpy as np
+import torch
+from gym.spaces import Box
+
+from ray.rllib.models.torch.visionnet import VisionNetwork
+
+from rllib_integration.frame_ring import ObservationResolver, get_frame_shape, get_min_capacity, get_ring_bytes
+
+
+class SharedMemoryVisionNetwork(VisionNetwork):
+    """
+    VisionNetwork whose inputs are references to observations stored in shared memory. The network is built
+    for the real observation shape, given by the 'obs_shape' of the custom model config, so that its layers
+    (and state dictionary) are the same ones as the VisionNetwork's. Frame stacked observations are rebuilt
+    from their frames when resolving the references, i.e. only for the minibatches being computed
+    """
+
+    def __init__(self, obs_space, action_space, num_outputs, model_config, name):
+        custom_config = model_config["custom_model_config"]
+        obs_shape = tuple(custom_config["obs_shape"])
+        image_space = Box(low=0.0, high=255.0, shape=obs_shape, dtype=np.uint8)
+
+        super().__init__(image_space, action_space, num_outputs, model_config, name)
+
+        self.obs_space = obs_space
+        self._resolver = ObservationResolver(obs_shape, custom_config.get("frame_stack", 1))
+
+    def forward(self, input_dict, state, seq_lens):
+        references = input_dict["obs"]
+        obs = self._resolver.resolve(references.cpu().numpy())
+
+        # Use a new dictionary, the references of the batch are still needed for the next SGD passes
+        image_dict = {
+            "obs": torch.from_numpy(obs).to(references.device),
+            "is_training": input_dict.get("is_training", False),
+        }
+        return super().forward(image_dict, state, seq_lens)
+
+
+def configure_observation_transport(config, experiment_class):
+    """Sets up the model of the run if the environment uses the shared memory observation transport. The
+    capacity of the rings is checked against the frames sampled at each training iteration, and set to that
+    minimum if it isn't given"""
+    transport_config = config["env_config"].get("observation_transport")
+    if transport_config is None:
+        return config
+
+    experiment = experiment_class(config["env_config"]["experiment"])
+    obs_shape = experiment.get_observation_space().shape
+    frame_stack = getattr(experiment, "frame_stack", 1)
+
+    # Episodes last until their step count exceeds 'max_time_episode'
+    max_time_episode = getattr(experiment, "max_time_episode", None)
+    min_capacity = get_min_capacity(
+        None if max_time_episode is None else max_time_episode + 1,
+        batch_mode=config.get("batch_mode", "truncate_episodes"),
+        rollout_fragment_length=config.get("rollout_fragment_length", 200),
+        train_batch_size=config.get("train_batch_size", 4000),
+        num_workers=config.get("num_workers", 2),
+        num_envs_per_worker=config.get("num_envs_per_worker", 1)
+    )
+
+    capacity = transport_config.get("capacity")
+    if capacity is None:
+        if min_capacity is None:
+            raise ValueError("The 'capacity' of the 'observation_transport' can't be computed for unbounded "
+                             "episodes with 'complete_episodes'. Set it explicitly")
+        capacity = min_capacity
+    elif min_capacity is not None and capacity < min_capacity:
+        raise ValueError("The 'capacity' of the 'observation_transport' ({}) is smaller than the {} frames "
+                         "sampled by each environment at each training iteration".format(capacity, min_capacity))
+
+    frame_shape = get_frame_shape(obs_shape, frame_stack)
+    print("Observation transport: {} frames per environment, {:.1f} GB of /dev/shm".format(
+        capacity, get_ring_bytes(frame_shape, capacity) / 1e9))
+
+    config["env_config"]["observation_transport"] = dict(transport_config, capacity=capacity)
+    config["model"]["custom_model"] = SharedMemoryVisionNetwork
+    config["model"]["custom_model_config"] = {
+        "obs_shape": list(obs_shape),
+        "frame_stack": frame_stack,
+    }
+    return config
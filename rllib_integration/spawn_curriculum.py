@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Curriculum over the hero spawn points. Each spawn point has a difficulty in [0, 1], given by how close it is to
+a junction, how curved the road ahead is and how many NPCs are around it. The points are sampled around the
+current curriculum level, which follows the success rate of the recent episodes.
+"""
+
+from collections import deque
+
+import numpy as np
+
+
+def get_spawn_features(world_map, spawn_points, lookahead=50.0, step=5.0):
+    """Returns the distance to the next junction (capped at 'lookahead') and the total heading change (in
+    degrees) of the road ahead of each spawn point. Computed once per town"""
+    junction_distance = np.full(len(spawn_points), lookahead)
+    curvature = np.zeros(len(spawn_points))
+
+    for i, transform in enumerate(spawn_points.transforms):
+        waypoint = world_map.get_waypoint(transform.location)
+        yaw = waypoint.transform.rotation.yaw
+        distance = 0.0
+        while distance < lookahead:
+            if waypoint.is_junction:
+                junction_distance[i] = min(junction_distance[i], distance)
+
+            next_waypoints = waypoint.next(step)
+            if not next_waypoints:
+                break
+            waypoint = next_waypoints[0]
+            distance += step
+
+            next_yaw = waypoint.transform.rotation.yaw
+            curvature[i] += abs((next_yaw - yaw + 180) % 360 - 180)
+            yaw = next_yaw
+
+    return junction_distance, curvature
+
+
+class CurriculumSpawnSampler(object):
+    """
+    Adaptive sampling distribution over the spawn points of a town. The weight of each point is a gaussian of
+    the distance between its difficulty and the curriculum level, which moves towards harder points while the
+    success rate of the last 'window' episodes is above 'target_success', and towards easier ones otherwise
+    """
+
+    def __init__(self, world_map, spawn_points, lookahead=50.0, max_curvature=90.0, density_radius=20.0,
+                 max_density=10, window=50, target_success=0.7, step_size=0.05, sigma=0.2, level=0.0):
+        self.spawn_points = spawn_points
+        self.density_radius = density_radius
+        self.max_density = max_density
+        self.target_success = target_success
+        self.step_size = step_size
+        self.sigma = sigma
+        self.level = level
+
+        self.junction_distance, self.curvature = get_spawn_features(world_map, spawn_points, lookahead)
+        self.static_difficulty = 0.5 * (1 - self.junction_distance / lookahead) \
+            + 0.5 * np.minimum(self.curvature / max_curvature, 1)
+
+        self.results = deque(maxlen=window)
+
+    def get_difficulty(self, npc_locations):
+        """Difficulty of all the spawn points, given the current locations [N, 2] of the NPCs"""
+        density = np.zeros(len(self.spawn_points))
+        if len(npc_locations) > 0:
+            distances = np.linalg.norm(self.spawn_points.locations[:, np.newaxis, :2] - npc_locations[np.newaxis],
+                                       axis=2)
+            density = np.count_nonzero(distances < self.density_radius, axis=1)
+
+        return (2 * self.static_difficulty + np.minimum(density / self.max_density, 1)) / 3
+
+    def get_weights(self, npc_locations):
+        difficulty = self.get_difficulty(npc_locations)
+        return np.exp(-0.5 * np.square((difficulty - self.level) / self.sigma))
+
+    def update(self, success):
+        """Adds the result of an episode, moving the curriculum level"""
+        self.results.append(float(success))
+        success_rate = np.mean(self.results)
+        self.level = float(np.clip(self.level + self.step_size * (success_rate - self.target_success), 0, 1))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Spawn points of the hero, resolved once per town instead of at every reset
+"""
+
+import numpy as np
+
+import carla
+
+# Minimum distance (in meters) between a free spawn point and any NPC
+FREE_SPACE_RADIUS = 5.0
+
+
+def parse_spawn_point(spawn_point, world_map):
+    """Parses a 'x,y,z' or 'x,y,z,roll,pitch,yaw' string into a transform. Points without rotation
+    take the heading of their lane"""
+    transform = [float(x) for x in spawn_point.split(",")]
+    if len(transform) == 3:
+        location = carla.Location(transform[0], transform[1], transform[2])
+        waypoint = world_map.get_waypoint(location)
+        return carla.Transform(location, waypoint.transform.rotation)
+
+    assert len(transform) == 6
+    return carla.Transform(
+        carla.Location(transform[0], transform[1], transform[2]),
+        carla.Rotation(transform[4], transform[5], transform[3])
+    )
+
+
+class SpawnPoints(object):
+    """
+    Spawn candidates of the hero at a town: the ones of the hero configuration or, if none, the ones of the map.
+    They are stored as an array of [x, y, z, pitch, yaw, roll]
+    """
+
+    def __init__(self, world_map, user_spawn_points=None):
+        if user_spawn_points:
+            self.transforms = [parse_spawn_point(point, world_map) for point in user_spawn_points]
+        else:
+            self.transforms = world_map.get_spawn_points()
+
+        self.array = np.array([[t.location.x, t.location.y, t.location.z,
+                                t.rotation.pitch, t.rotation.yaw, t.rotation.roll] for t in self.transforms])
+        self.locations = self.array[:, :3]
+
+    def __len__(self):
+        return len(self.transforms)
+
+    def get_free(self, npc_locations, radius=FREE_SPACE_RADIUS):
+        """Boolean mask of the spawn points without any NPC closer than 'radius'"""
+        if len(npc_locations) == 0:
+            return np.ones(len(self), dtype=bool)
+
+        distances = np.linalg.norm(self.locations[:, np.newaxis, :2] - npc_locations[np.newaxis, :, :2], axis=2)
+        return np.min(distances, axis=1) > radius
+
+    def get_candidates(self, npc_locations, weights=None):
+        """Indices of the spawn points in the order they should be tried. Free points come first, sampled
+        according to 'weights' (uniformly if None), followed by the free points whose weight is 0 (e.g. after
+        underflowing) and by the occupied ones"""
+        free = self.get_free(npc_locations)
+        indices = np.arange(len(self))
+
+        p = np.ones(len(self)) if weights is None else np.asarray(weights, dtype=np.float64)
+        weighted = free & (p > 0)
+
+        first = indices[weighted]
+        if len(first) > 0:
+            first = np.random.choice(first, size=len(first), replace=False, p=p[weighted] / p[weighted].sum())
+        unweighted = np.random.permutation(indices[free & ~weighted])
+        occupied = np.random.permutation(indices[~free])
+        return np.concatenate([first, unweighted, occupied])
+
+
+def get_npc_locations(world, actor_ids):
+    """Locations [N, 2] of the given actors, taken from the last snapshot of the world (no RPC calls)"""
+    snapshot = world.get_snapshot()
+    locations = []
+    for actor_id in actor_ids:
+        actor_snapshot = snapshot.find(actor_id)
+        if actor_snapshot is not None:
+            location = actor_snapshot.get_transform().location
+            locations.append([location.x, location.y])
+    return np.array(locations).reshape(-1, 2)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+CarlaEnv that survives the crashes of its server. Instead of erroring out the whole rollout worker, a dead
+server or a sensor timeout ends the current episode, and the env carries on with a new server.
+"""
+
+from __future__ import print_function
+
+from rllib_integration.carla_env import CarlaEnv
+from rllib_integration.server_watchdog import ServerWatchdog
+
+BASE_SUPERVISOR_CONFIG = {
+    "max_restarts": 5,  # Consecutive restarts (without any successful step in between) before giving up
+}
+
+
+class SupervisedCarlaEnv(CarlaEnv):
+    """
+    Restarts the server of the environment when it dies or stops answering. Only the process group of its
+    own server is killed, so the servers of other environments at the same node are not affected.
+
+    A failure during a step returns the last observation with done=True (a truncated episode), and the next
+    reset starts on the new server. The number of restarts is available at 'restarts'.
+
+    Optionally, a watchdog samples the resource usage of the server, which is recycled between episodes
+    once it crosses the thresholds of the 'watchdog' configuration (see server_watchdog.py).
+    """
+
+    def __init__(self, config):
+        supervisor_config = dict(BASE_SUPERVISOR_CONFIG, **config.get("supervisor", None) or {})
+        self.max_restarts = supervisor_config["max_restarts"]
+
+        self.restarts = 0
+        self.consecutive_restarts = 0
+        self.truncated = False
+        self.last_observation = None
+        self.recycles = 0
+        self.watchdog = None
+
+        super(SupervisedCarlaEnv, self).__init__(config)
+
+        if config.get("watchdog", None) is not None:
+            self.watchdog = ServerWatchdog(self.core, config["watchdog"])
+
+    def reset(self):
+        self.truncated = False
+        if self.watchdog is not None:
+            reason = self.watchdog.get_recycle_reason()
+            if reason is not None:
+                print("Recycling the CARLA server at port {} ({})".format(self.core.server_port, reason))
+                self.recycles += 1
+                self.watchdog.reset()
+                try:
+                    self.core.restart_server(self.experiment.config)
+                except Exception as e:
+                    self.restart(e)
+
+        while True:
+            try:
+                self.last_observation = super(SupervisedCarlaEnv, self).reset()
+                return self.last_observation
+            except RuntimeError as e:
+                self.restart(e)
+
+    def step(self, action):
+        try:
+            observation, reward, done, info = super(SupervisedCarlaEnv, self).step(action)
+        except RuntimeError as e:
+            self.restart(e)
+            self.truncated = True
+            return self.last_observation, 0.0, True, {"truncated": True}
+
+        self.consecutive_restarts = 0
+        self.last_observation = observation
+        return observation, reward, done, info
+
+    def restart(self, error):
+        """Replaces the server, raising the error if it keeps failing"""
+        reason = "server died" if not self.core.is_server_alive() else str(error)
+        if self.recorder is not None:
+            self.recorder.end_episode()
+
+        while True:
+            if self.consecutive_restarts >= self.max_restarts:
+                raise error
+
+            print("Restarting the CARLA server at port {} ({})".format(self.core.server_port, reason))
+            self.restarts += 1
+            self.consecutive_restarts += 1
+            try:
+                self.core.restart_server(self.experiment.config)
+                return
+            except Exception as e:
+                error, reason = e, str(e)
+
+    def close(self):
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        super(SupervisedCarlaEnv, self).close()
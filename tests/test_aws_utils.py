@@ -0,0 +1,355 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Tests of aws/utils.py against stubs of the ec2 resource and the ssh connections"""
+
+import io
+import os
+import sys
+import tarfile
+
+import pytest
+
+pytest.importorskip("boto3")
+pytest.importorskip("paramiko")
+pytest.importorskip("scp")
+
+# The aws scripts import their modules from their own folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "aws"))
+
+import utils  # noqa: E402
+
+
+class FakeInstance(object):
+    def __init__(self, id_, name=None):
+        self.id = id_
+        self.public_ip_address = "10.0.0.{}".format(len(id_))
+        self.tags = [{"Key": "Name", "Value": name}] if name else None
+
+
+class FakeInstances(object):
+    def __init__(self, instances):
+        self.instances = instances
+        self.calls = []
+
+    def filter(self, **kwargs):
+        self.calls.append(kwargs)
+        return iter(self.instances)
+
+
+class FakeEC2(object):
+    def __init__(self, instances):
+        self.instances = FakeInstances(instances)
+
+
+def test_get_instances_filters_by_ids_and_tags(monkeypatch):
+    ec2 = FakeEC2([FakeInstance("i-1"), FakeInstance("i-2")])
+    monkeypatch.setattr(utils, "_get_resource", lambda name: ec2)
+
+    assert utils.get_instances() == []
+    assert [i.id for i in utils.get_instances(["i-1", "i-2"], ["Role=worker", "Run=a=b"])] == ["i-1", "i-2"]
+
+    call = ec2.instances.calls[-1]
+    assert call["InstanceIds"] == ["i-1", "i-2"]
+    assert {"Name": "tag:Role", "Values": ["worker"]} in call["Filters"]
+    assert {"Name": "tag:Run", "Values": ["a=b"]} in call["Filters"]
+    assert call["Filters"][0]["Name"] == "instance-state-name"
+
+
+def test_run_parallel_collects_results_and_errors():
+    instances = [FakeInstance("i-{}".format(i)) for i in range(4)]
+
+    def function(instance):
+        if instance.id == "i-2":
+            raise RuntimeError("failed")
+        return int(instance.id[-1])
+
+    results = utils.run_parallel(function, instances, max_workers=2)
+    assert [results["i-{}".format(i)] for i in (0, 1, 3)] == [0, 1, 3]
+    assert isinstance(results["i-2"], RuntimeError)
+    assert utils.get_exit_status(results) == 3
+
+
+def test_exit_status():
+    assert utils.get_exit_status({"a": None, "b": True, "c": 0}) == 0
+    assert utils.get_exit_status({"a": 0, "b": RuntimeError()}) == 1
+    assert utils.get_exit_status({}) == 0
+
+
+def test_instance_name():
+    assert utils.get_instance_name(FakeInstance("i-1", "worker")) == "worker (i-1)"
+    assert utils.get_instance_name(FakeInstance("i-1")) == "i-1"
+
+
+class FakeRemote(object):
+    """Remote folder, answering the sha256sum commands of the manifests, and recording the rest"""
+
+    def __init__(self, files):
+        self.files = files
+        self.commands = []
+
+    def __call__(self, instance, command):
+        self.commands.append(command)
+        if "sha256sum" in command:
+            return 0, "\n".join("{}  ./{}".format(sha256, path) for path, sha256 in sorted(self.files.items()))
+        return 0, ""
+
+
+@pytest.fixture
+def local_folder(tmp_path):
+    folder = tmp_path / "project"
+    (folder / "pkg" / "__pycache__").mkdir(parents=True)
+    (folder / "keys").mkdir()
+    (folder / "same.py").write_text("same")
+    (folder / "pkg" / "changed.py").write_text("new content")
+    (folder / "pkg" / "__pycache__" / "changed.pyc").write_text("excluded at any depth")
+    (folder / "keys" / "key.pem").write_text("excluded")
+    return folder
+
+
+def test_local_manifest_excludes_at_any_depth(local_folder):
+    manifest = utils._get_local_manifest(str(local_folder), utils.PUT_EXCLUDE)
+    assert sorted(manifest) == ["pkg/changed.py", "same.py"]
+    assert manifest["same.py"] == utils._get_file_hash(str(local_folder / "same.py"))
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_put_uploads_only_changed_files(local_folder, monkeypatch, compress):
+    remote = FakeRemote({
+        "same.py": utils._get_file_hash(str(local_folder / "same.py"))[0],
+        "pkg/changed.py": "0" * 64,
+        "stale.py": "1" * 64,
+    })
+    uploads = []
+    monkeypatch.setattr(utils, "_run_command", remote)
+    monkeypatch.setattr(utils, "_put_files", lambda *args: uploads.append(("scp",) + args[1:4]))
+    monkeypatch.setattr(utils, "_put_tar_stream", lambda *args: uploads.append(("tar",) + args[1:]))
+
+    instance = FakeInstance("i-1")
+    summary = utils.put(instance, str(local_folder), "remote", compress=compress, delete=True)
+    assert summary["uploaded"] == ["pkg/changed.py"]
+    assert summary["deleted"] == ["stale.py"]
+    assert summary["bytes_uploaded"] == len("new content")
+    assert summary["bytes_saved"] == len("same")
+
+    assert uploads == [("tar" if compress else "scp", str(local_folder), "remote/project", ["pkg/changed.py"])]
+    assert remote.commands[-1] == "cd remote/project && rm -f -- stale.py"
+
+
+def test_put_dry_run_does_not_transfer(local_folder, monkeypatch, capsys):
+    remote = FakeRemote({})
+    monkeypatch.setattr(utils, "_run_command", remote)
+    monkeypatch.setattr(utils, "_put_files", lambda *args: pytest.fail("uploaded during a dry run"))
+
+    summary = utils.put(FakeInstance("i-1"), str(local_folder), dry_run=True, delete=True, prefix="worker-1")
+    assert summary["uploaded"] == ["pkg/changed.py", "same.py"]
+    assert len(remote.commands) == 1
+    assert capsys.readouterr().out.splitlines() == [
+        "[worker-1] upload: ./project/pkg/changed.py",
+        "[worker-1] upload: ./project/same.py",
+    ]
+
+
+def test_scp_progress_can_be_disabled(monkeypatch):
+    import scp
+
+    monkeypatch.setattr(utils, "_get_ssh_client", lambda instance: FakeSSHClient(None))
+    monkeypatch.setattr(scp, "SCPClient", lambda transport, progress: progress)
+
+    assert utils._get_scp_client(FakeInstance("i-1")) is not None
+    assert utils._get_scp_client(FakeInstance("i-1"), progress=False) is None
+
+
+class FakeStream(io.BytesIO):
+    def close(self):
+        pass
+
+
+class FakeChannel(object):
+    """Channel of an ssh session. Outputs are lists of chunks, given at each recv"""
+
+    def __init__(self, stdout=(), stderr=(), status=0):
+        self.stdout, self.stderr, self.status = list(stdout), list(stderr), status
+        self.command = None
+        self.written = FakeStream()
+
+    def exec_command(self, command):
+        self.command = command
+
+    def makefile(self, mode):
+        return self.written
+
+    def shutdown_write(self):
+        pass
+
+    def fileno(self):
+        return _pipe[0]
+
+    def recv_ready(self):
+        return bool(self.stdout)
+
+    def recv(self, size):
+        return self.stdout.pop(0)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv_stderr(self, size):
+        return self.stderr.pop(0)
+
+    def exit_status_ready(self):
+        return True
+
+    def recv_exit_status(self):
+        return self.status
+
+    def close(self):
+        pass
+
+
+# Always readable file descriptor, used by select on the fake channels
+_pipe = os.pipe()
+os.write(_pipe[1], b"x")
+
+
+class FakeSSHClient(object):
+    def __init__(self, channel):
+        self.channel = channel
+
+    def get_transport(self):
+        return self
+
+    def open_session(self):
+        return self.channel
+
+
+def test_tar_stream_contains_the_changed_files(local_folder, monkeypatch):
+    channel = FakeChannel()
+    monkeypatch.setattr(utils, "_get_ssh_client", lambda instance: FakeSSHClient(channel))
+
+    utils._put_tar_stream(FakeInstance("i-1"), str(local_folder), "remote dir", ["pkg/changed.py"])
+    assert channel.command == "mkdir -p 'remote dir' && tar -xzf - -C 'remote dir'"
+    with tarfile.open(fileobj=io.BytesIO(channel.written.getvalue()), mode="r:gz") as tar:
+        assert tar.getnames() == ["pkg/changed.py"]
+        assert tar.extractfile("pkg/changed.py").read() == b"new content"
+
+
+def test_stream_command_splits_the_outputs_in_lines(monkeypatch):
+    channel = FakeChannel(stdout=[b"first li", b"ne\nsecond\nlast"], stderr=[b"warn", b"ing\n"], status=3)
+    monkeypatch.setattr(utils, "_get_ssh_client", lambda instance: FakeSSHClient(channel))
+
+    stdout, stderr = [], []
+    status = utils._stream_command(FakeInstance("i-1"), "ls", stdout.append, stderr.append)
+    assert status == 3
+    assert stdout == ["first line", "second", "last"]
+    assert stderr == ["warning"]
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_reuses_active_connections_and_replaces_dead_ones(monkeypatch):
+    pool = utils.SSHConnectionPool()
+    connections = []
+
+    def connect(instance):
+        connections.append(FakeClient())
+        return connections[-1]
+
+    monkeypatch.setattr(pool, "_connect", connect)
+    instance = FakeInstance("i-1")
+
+    first = pool.get(instance)
+    assert pool.get(instance) is first
+
+    first.transport.active = False
+    second = pool.get(instance)
+    assert second is not first and first.closed
+    assert len(connections) == 2
+
+    pool.clear()
+    assert second.closed
+
+
+def test_connect_retries_with_backoff(monkeypatch):
+    import paramiko
+
+    attempts = []
+
+    class FailingClient(FakeClient):
+        def set_missing_host_key_policy(self, policy):
+            pass
+
+        def connect(self, **kwargs):
+            attempts.append(kwargs["hostname"])
+            if len(attempts) < 3:
+                raise paramiko.SSHException("not ready")
+
+        def get_transport(self):
+            transport = FakeTransport()
+            transport.set_keepalive = lambda interval: None
+            return transport
+
+    delays = []
+    monkeypatch.setattr(paramiko, "SSHClient", FailingClient)
+    monkeypatch.setattr(utils, "_get_key_filename", lambda instance: "key.pem")
+    monkeypatch.setattr(utils.time, "sleep", delays.append)
+
+    utils.SSHConnectionPool(max_tries=3)._connect(FakeInstance("i-1"))
+    assert len(attempts) == 3
+    assert delays == [utils.SSH_BACKOFF_BASE, min(2 * utils.SSH_BACKOFF_BASE, utils.SSH_BACKOFF_MAX)]
+
+    attempts.clear()
+    with pytest.raises(paramiko.SSHException):
+        utils.SSHConnectionPool(max_tries=1)._connect(FakeInstance("i-1"))
+
+
+def test_wait_until_reachable_outlasts_the_ssh_backoff(monkeypatch):
+    import paramiko
+
+    # sshd comes up after the connection attempts of the pool have been exhausted twice
+    attempts = []
+
+    def get_ssh_client(instance):
+        attempts.append(instance.id)
+        if len(attempts) < 3:
+            raise paramiko.SSHException("connection refused")
+        return FakeClient()
+
+    delays = []
+    monkeypatch.setattr(utils, "_get_ssh_client", get_ssh_client)
+    monkeypatch.setattr(utils.time, "sleep", delays.append)
+
+    assert utils.wait_until_reachable(FakeInstance("i-1"))
+    assert len(attempts) == 3 and len(delays) == 2
+
+
+def test_wait_until_reachable_times_out(monkeypatch):
+    def get_ssh_client(instance):
+        raise OSError("timed out")
+
+    monkeypatch.setattr(utils, "_get_ssh_client", get_ssh_client)
+    monkeypatch.setattr(utils.time, "sleep", lambda delay: None)
+
+    with pytest.raises(TimeoutError):
+        utils.wait_until_reachable(FakeInstance("i-1"), timeout=0)
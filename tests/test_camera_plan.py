@@ -0,0 +1,49 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from rllib_integration.sensors.camera_plan import get_camera_plan, get_camera_shape, parse_crop, resize_image
+
+
+def test_without_crop_the_server_renders_the_output_size():
+    attributes = {"image_size_x": 300, "image_size_y": 300, "output_size_x": 150, "output_size_y": 100}
+    assert get_camera_plan(attributes) == ((150, 100), None, (150, 100))
+    assert get_camera_shape(attributes) == (100, 150, 3)
+    assert get_camera_shape({"image_size_x": 300, "image_size_y": 200}) == (200, 300, 3)
+
+
+def test_crop_renders_the_full_image():
+    attributes = {"image_size_x": 300, "image_size_y": 300, "crop": "0,75,300,150", "output_size_x": 150}
+    assert get_camera_plan(attributes) == ((300, 300), (0, 75, 300, 150), (150, 150))
+    assert get_camera_plan({"image_size_x": 300, "image_size_y": 300, "crop": [0, 75, 300, 150]})[2] == (300, 150)
+
+    with pytest.raises(AssertionError, match="outside"):
+        get_camera_plan({"image_size_x": 300, "image_size_y": 300, "crop": "0,200,300,150"})
+    with pytest.raises(AssertionError):
+        parse_crop("0,0,10")
+
+
+def test_area_resize_averages_blocks():
+    image = np.zeros((4, 6, 3), dtype=np.uint8)
+    image[:2, :3] = 100
+    image[0, 0] = 104
+    resized = resize_image(image, (2, 2))
+    assert resized.shape == (2, 2, 3) and resized.dtype == np.uint8
+    assert resized[0, 0, 0] == 101 and resized[0, 1, 0] == 0 and resized[1, 0, 0] == 0
+
+
+def test_nearest_resize_keeps_the_labels():
+    labels = np.arange(36, dtype=np.uint8).reshape(6, 6, 1).repeat(3, axis=2)
+    resized = resize_image(labels, (3, 3), area=False)
+    assert set(np.unique(resized)) <= set(np.unique(labels))
+    assert np.array_equal(resized[..., 0], labels[1::2, 1::2, 0])
+
+    # Non integer factors always sample the nearest pixels
+    assert resize_image(labels, (4, 5)).shape == (5, 4, 3)
+    assert resize_image(labels, (6, 6)) is labels
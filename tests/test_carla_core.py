@@ -0,0 +1,27 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import pytest
+
+pytest.importorskip("carla")
+
+from rllib_integration.carla_core import CarlaCore
+
+
+def test_failed_restart_raises_its_own_error():
+    """A restart after a failed one has no world, and has to surface the connection error"""
+    core = CarlaCore.__new__(CarlaCore)
+    core.world = None
+    core.server_process = None
+    core.spawn_sampler = None
+
+    def init_server():
+        raise ConnectionError("server not reachable")
+
+    core.init_server = init_server
+    for _ in range(2):
+        with pytest.raises(ConnectionError, match="not reachable"):
+            core.restart_server({})
@@ -0,0 +1,79 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("gym")
+
+from rllib_integration.frame_ring import REFERENCE_SIZE, ObservationResolver, get_min_capacity, get_ring_bytes
+
+OBS_SHAPE = (84, 84, 6)
+FRAME_STACK = 2
+
+
+def test_zero_references_resolve_to_zero_observations():
+    resolver = ObservationResolver(OBS_SHAPE, frame_stack=FRAME_STACK)
+    obs = resolver.resolve(np.zeros((3, REFERENCE_SIZE), dtype=np.float32))
+    assert obs.shape == (3,) + OBS_SHAPE
+    assert obs.dtype == np.uint8
+    assert not obs.any()
+
+
+def test_model_builds_from_a_zero_batch():
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("ray")
+    from gym.spaces import Box
+    from ray.rllib.models import MODEL_DEFAULTS
+
+    from rllib_integration.frame_ring import get_reference_space
+    from rllib_integration.shared_memory_model import SharedMemoryVisionNetwork
+
+    model_config = dict(MODEL_DEFAULTS, custom_model_config={"obs_shape": list(OBS_SHAPE),
+                                                             "frame_stack": FRAME_STACK})
+    model = SharedMemoryVisionNetwork(get_reference_space(), Box(-1.0, 1.0, shape=(2,)), 4, model_config, "model")
+
+    # Same input as the dummy batch RLlib uses to initialize the loss
+    logits, _ = model.forward({"obs": torch.zeros((2, REFERENCE_SIZE))}, [], None)
+    assert tuple(logits.shape) == (2, 4)
+    assert tuple(model.value_function().shape) == (2,)
+
+
+def test_zero_references_mixed_with_stacked_frames():
+    from rllib_integration.frame_ring import SharedMemoryTransport
+
+    frames = np.random.randint(1, 256, size=(3, 4, 4, 3), dtype=np.uint8)
+    observations = np.stack([np.concatenate([frames[max(t - 1, 0)], frames[t]], axis=2) for t in range(3)])
+
+    transport = SharedMemoryTransport((4, 4, 6), frame_stack=FRAME_STACK, capacity=8)
+    try:
+        references = [transport.encode(obs, new_episode=t == 0) for t, obs in enumerate(observations)]
+        zero = np.zeros(REFERENCE_SIZE, dtype=np.int64)
+        resolved = ObservationResolver((4, 4, 6), frame_stack=FRAME_STACK).resolve(
+            np.stack([zero, references[0], zero, references[1], references[2]]))
+    finally:
+        transport.close()
+
+    assert not resolved[0].any() and not resolved[2].any()
+    assert np.array_equal(resolved[[1, 3, 4]], observations)
+
+
+def test_min_capacity_of_complete_episodes_covers_a_whole_episode():
+    # ppo_config.yaml: 6400 'max_time_episode' (6401 steps), 2 workers sampling fragments of 16 steps
+    capacity = get_min_capacity(6401, batch_mode="complete_episodes", rollout_fragment_length=16,
+                                train_batch_size=64, num_workers=2, num_envs_per_worker=1)
+    assert capacity == 2 * (2 * 16 + 6402)
+    assert capacity > 4096
+
+
+def test_min_capacity_of_truncated_episodes():
+    assert get_min_capacity(None, batch_mode="truncate_episodes", rollout_fragment_length=16,
+                            train_batch_size=64, num_workers=2) == 2 * 2 * 16
+    assert get_min_capacity(None, batch_mode="complete_episodes") is None
+
+
+def test_ring_bytes():
+    assert get_ring_bytes((300, 300, 9), 4096) == 3317760000
@@ -0,0 +1,44 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import socket
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ppo_implementation.ppo_inference_server import InferenceClient, InferenceServer
+
+
+class SumModel(object):
+    """Returns the sum of each observation as its action"""
+
+    def run(self, obs):
+        return obs.reshape(len(obs), -1).sum(axis=1)
+
+
+def get_free_address():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return "localhost:{}".format(s.getsockname()[1])
+
+
+def test_batch_sizes_back_to_back_reuse_the_address():
+    address = get_free_address()
+    for max_batch_size in [1, 4]:
+        server = InferenceServer(SumModel(), address, max_batch_size, max_wait_ms=1.0)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+
+        client = InferenceClient(address)
+        assert client(np.ones((2, 3), dtype=np.uint8)) == 6
+        client.close()
+
+        server.shutdown()
+        server_thread.join(timeout=5)
+        assert not server_thread.is_alive()
+        assert server.get_stats()["requests"] == 1
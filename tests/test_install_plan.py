@@ -0,0 +1,111 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import os
+import threading
+
+import pytest
+
+from aws.install_plan import MARKER_FOLDER, InstallPlan, InstallStep
+
+
+class StubRunner(object):
+    """Runner keeping the markers of the instance in memory. Scripts named at 'failing' fail"""
+
+    def __init__(self, failing=(), markers=()):
+        self.failing = set(failing)
+        self.markers = set(markers)
+        self.executed = []
+        self._lock = threading.Lock()
+
+    def exec_script(self, script, args, prefix):
+        with self._lock:
+            self.executed.append(os.path.basename(script))
+        return 1 if os.path.basename(script) in self.failing else 0
+
+    def run_command(self, command):
+        if command.startswith("ls -1 {}".format(MARKER_FOLDER)):
+            return 0, "\n".join(sorted(self.markers))
+        assert command.startswith("mkdir -p {} && touch ".format(MARKER_FOLDER))
+        with self._lock:
+            self.markers.add(os.path.basename(command.split()[-1]))
+        return 0, ""
+
+
+def write_script(folder, name, depends_on=None):
+    path = folder / name
+    header = "" if depends_on is None else "# depends-on: {}\n".format(" ".join(depends_on))
+    path.write_text("#!/bin/bash\n\n{}echo {}\n".format(header, name))
+    return str(path)
+
+
+@pytest.fixture
+def scripts(tmp_path):
+    """base <- (a, b) <- top"""
+    return [
+        write_script(tmp_path, "base.sh", []),
+        write_script(tmp_path, "a.sh", ["base.sh"]),
+        write_script(tmp_path, "b.sh", ["base.sh"]),
+        write_script(tmp_path, "top.sh", ["a.sh", "b.sh"]),
+    ]
+
+
+def test_layers(scripts):
+    plan = InstallPlan.from_scripts(scripts)
+    assert plan.layers == [["base.sh"], ["a.sh", "b.sh"], ["top.sh"]]
+
+
+def test_cycles_and_unknown_dependencies_are_rejected(tmp_path):
+    a = write_script(tmp_path, "a.sh", ["b.sh"])
+    b = write_script(tmp_path, "b.sh", ["a.sh"])
+    with pytest.raises(ValueError, match="Circular"):
+        InstallPlan.from_scripts([a, b])
+    with pytest.raises(ValueError, match="Unknown dependency"):
+        InstallPlan([InstallStep(a, ["missing.sh"])])
+
+
+def test_from_scripts_headers(tmp_path):
+    """Scripts without header depend on the previous one, and an empty header means no dependencies"""
+    first = write_script(tmp_path, "first.sh")
+    second = write_script(tmp_path, "second.sh")
+    independent = write_script(tmp_path, "independent.sh", [])
+    last = write_script(tmp_path, "last.sh", ["first.sh", "independent.sh"])
+
+    plan = InstallPlan.from_scripts([first, second, independent, last])
+    assert [plan.steps[name].depends_on for name in ("first.sh", "second.sh", "independent.sh", "last.sh")] \
+        == [[], ["first.sh"], [], ["first.sh", "independent.sh"]]
+    assert plan.layers == [["first.sh", "independent.sh"], ["second.sh", "last.sh"]]
+
+
+def test_completed_steps_are_cached_by_hash(scripts):
+    runner = StubRunner()
+    timings = InstallPlan.from_scripts(scripts).run(runner)
+    assert {name: result for name, (result, _) in timings.items()} == \
+        {"base.sh": "ok", "a.sh": "ok", "b.sh": "ok", "top.sh": "ok"}
+    assert len(runner.markers) == 4
+
+    # Changing a script invalidates it and the steps depending on it
+    with open(scripts[1], "a") as f:
+        f.write("echo changed\n")
+    runner.executed = []
+    timings = InstallPlan.from_scripts(scripts).run(runner)
+    assert sorted(runner.executed) == ["a.sh", "top.sh"]
+    assert timings["base.sh"][0] == "cached" and timings["b.sh"][0] == "cached"
+
+    # Without cache, all of them run again
+    runner.executed = []
+    InstallPlan.from_scripts(scripts).run(runner, use_cache=False)
+    assert sorted(runner.executed) == ["a.sh", "b.sh", "base.sh", "top.sh"]
+
+
+def test_failed_layer_stops_the_plan(scripts):
+    runner = StubRunner(failing=["a.sh"])
+    with pytest.raises(RuntimeError, match="a.sh"):
+        InstallPlan.from_scripts(scripts).run(runner)
+
+    # The rest of the failed layer runs, but not the next one, and the failed step leaves no marker
+    assert sorted(runner.executed) == ["a.sh", "b.sh", "base.sh"]
+    assert not any(marker.startswith("a.sh.") for marker in runner.markers)
@@ -0,0 +1,36 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+gym = pytest.importorskip("gym")
+
+from ppo_implementation.ppo_inference_model import CustomPPOModel
+
+ACTION_SPACE = gym.spaces.Box(low=np.array([0.0, -1.0, 0.0], dtype=np.float32), high=np.array([1.0, 1.0, 1.0], dtype=np.float32))
+
+# Reduce a 24x48 (height x width) image to 1x1
+WIDE_FILTERS = [[16, [5, 5], 4], [32, [5, 5], 2], [64, [3, 6], 1]]
+
+
+def test_non_square_observations():
+    model = CustomPPOModel((24, 48, 9), ACTION_SPACE, WIDE_FILTERS, gpu_n=-1)
+    obs = np.random.randint(0, 256, size=(2, 24, 48, 9), dtype=np.uint8)
+    actions = model.run(obs)
+    assert actions.shape == (2, 3)
+    assert np.all(actions >= ACTION_SPACE.low) and np.all(actions <= ACTION_SPACE.high)
+
+
+def test_filters_not_matching_the_observation_shape_raise():
+    with pytest.raises(ValueError, match="48x24"):
+        CustomPPOModel((48, 24, 9), ACTION_SPACE, WIDE_FILTERS, gpu_n=-1)
+
+
+def test_default_filters_match_the_default_cameras():
+    model = CustomPPOModel((300, 300, 9), ACTION_SPACE, gpu_n=-1)
+    assert model.run(np.zeros((1, 300, 300, 9), dtype=np.uint8)).shape == (1, 3)
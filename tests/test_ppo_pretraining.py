@@ -0,0 +1,44 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("ray")
+pytest.importorskip("gym")
+
+from ppo_implementation.ppo_pretraining import load_pretrained_weights
+
+
+def make_model():
+    return torch.nn.Sequential(torch.nn.Linear(4, 3), torch.nn.Linear(3, 2))
+
+
+def test_matching_weights_are_loaded():
+    model, pretrained = make_model(), make_model()
+    load_pretrained_weights(model, pretrained.state_dict())
+    assert torch.equal(model[0].weight, pretrained[0].weight)
+
+
+def test_prefix_mismatch_raises():
+    state_dict = {"_model." + key: value for key, value in make_model().state_dict().items()}
+    with pytest.raises(RuntimeError, match="Unused pretrained weights: \\['_model.0.weight'"):
+        load_pretrained_weights(make_model(), state_dict)
+
+
+def test_missing_weights_raise():
+    state_dict = make_model().state_dict()
+    del state_dict["1.bias"]
+    with pytest.raises(RuntimeError, match="Missing weights: \\['1.bias'\\]"):
+        load_pretrained_weights(make_model(), state_dict)
+
+
+def test_value_branch_may_keep_its_initial_weights():
+    model = torch.nn.Sequential()
+    model.add_module("_convs", torch.nn.Linear(4, 3))
+    model.add_module("_value_branch", torch.nn.Linear(3, 1))
+    state_dict = {k: v for k, v in model.state_dict().items() if not k.startswith("_value_branch")}
+    load_pretrained_weights(model, state_dict)
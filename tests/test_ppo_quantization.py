@@ -0,0 +1,93 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+gym = pytest.importorskip("gym")
+
+from ppo_implementation.ppo_export import check_parity
+from ppo_implementation.ppo_inference_model import CustomPPOModel
+from ppo_implementation.ppo_quantization import DEFAULT_TOLERANCE, load_observations, quantize_static
+from rllib_integration.recorder import EpisodeRecorder
+
+ACTION_SPACE = gym.spaces.Box(low=np.array([0.0, -1.0, 0.0], dtype=np.float32),
+                              high=np.array([1.0, 1.0, 1.0], dtype=np.float32))
+
+# Reduce a 24x48 (height x width) image to 1x1
+WIDE_FILTERS = [[16, [5, 5], 4], [32, [5, 5], 2], [64, [3, 6], 1]]
+
+
+def record_episode(directory, frames, frame_stack):
+    """Records an episode whose observations stack the given frames, with a telemetry column"""
+    recorder = EpisodeRecorder(str(directory), frame_stack=frame_stack, chunk_size=2)
+    stack = [frames[0]] * frame_stack
+    recorder.start_episode(np.concatenate(stack, axis=2), {"hero_location": np.zeros(3)})
+    for t, frame in enumerate(frames[1:], 1):
+        stack = stack[1:] + [frame]
+        recorder.record_step([0.5, 0.0], 1.0, t == len(frames) - 1, np.concatenate(stack, axis=2),
+                             {"hero_location": np.zeros(3)})
+    recorder.close()
+
+
+def test_recorded_episodes_give_stacked_observations(tmp_path):
+    frames = [np.full((4, 4, 3), t, dtype=np.uint8) for t in range(5)]
+    record_episode(tmp_path, frames, frame_stack=2)
+
+    observations = load_observations([str(tmp_path)])
+    assert observations.shape == (5, 4, 4, 6)
+    assert observations[0].max() == 0
+    assert np.array_equal(observations[3], np.concatenate([frames[2], frames[3]], axis=2))
+
+    assert len(load_observations([str(tmp_path)], limit=3)) == 3
+
+
+def test_npy_files(tmp_path):
+    np.save(tmp_path / "batch.npy", np.ones((3, 4, 4, 6), dtype=np.uint8))
+    np.save(tmp_path / "single.npy", np.ones((4, 4, 6), dtype=np.uint8))
+    observations = load_observations([str(tmp_path / "batch.npy"), str(tmp_path / "single.npy")])
+    assert observations.shape == (4, 4, 4, 6)
+
+
+def get_camera_frames(num_frames, rng):
+    """Smooth random frames of 24x48, closer to the camera images than uniform noise"""
+    coarse = torch.from_numpy(rng.uniform(0, 255, size=(num_frames, 3, 6, 12)).astype(np.float32))
+    frames = torch.nn.functional.interpolate(coarse, size=(24, 48), mode="bilinear", align_corners=False)
+    return list(frames.permute(0, 2, 3, 1).round().numpy().astype(np.uint8))
+
+
+def get_trained_like_model(obs):
+    """Tiny model whose action means are scaled to the action bounds, as the ones of a trained policy"""
+    model = CustomPPOModel((24, 48, 9), ACTION_SPACE, WIDE_FILTERS, gpu_n=-1).eval()
+    with torch.no_grad():
+        means = model.get_logits(torch.from_numpy(obs))[:, :model.num_actions]
+        model._logits._model[-1].weight.div_(float(means.abs().max()))
+        model._logits._model[-1].bias.zero_()
+    return model
+
+
+@pytest.mark.parametrize("channels_last", [False, True])
+def test_quantized_model_round_trip(tmp_path, channels_last):
+    torch.manual_seed(0)
+    record_episode(tmp_path, get_camera_frames(40, np.random.RandomState(0)), frame_stack=3)
+
+    # Same split as ppo_export.py: the parity check uses observations not used for the calibration
+    data = load_observations([str(tmp_path)])
+    obs, calibration_data = data[:8], data[8:]
+
+    model = get_trained_like_model(obs)
+    if channels_last:
+        model.to_channels_last()
+    quantized = quantize_static(model, calibration_data)
+
+    # The convolutions are fused with their ReLUs
+    assert isinstance(quantized._convs[0]._model[1], torch.nn.intrinsic.quantized.ConvReLU2d)
+
+    actions = quantized.run(obs)
+    assert actions.shape == (8, 3)
+    assert np.all(actions >= ACTION_SPACE.low) and np.all(actions <= ACTION_SPACE.high)
+    assert check_parity(model, quantized, obs) <= DEFAULT_TOLERANCE
@@ -0,0 +1,267 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""Parity of the vectorized reward with the scalar PPOExperiment.compute_reward it replaced, on synthetic
+heroes, maps and waypoints"""
+
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ppo_implementation.ppo_reward import compute_rewards, stack_telemetry
+from rllib_integration.recorder import _get_waypoint_telemetry, get_hero_telemetry
+
+# Values of carla.LaneType
+DRIVING, PARKING, SIDEWALK = 2, 16, 32
+ALLOWED_TYPES = [DRIVING, PARKING]
+
+
+class Vector3D(object):
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x, self.y, self.z = x, y, z
+
+
+class Rotation(object):
+    def __init__(self, pitch=0.0, yaw=0.0, roll=0.0):
+        self.pitch, self.yaw, self.roll = pitch, yaw, roll
+
+
+class Transform(object):
+    def __init__(self, location, rotation):
+        self.location, self.rotation = location, rotation
+
+    def get_forward_vector(self):
+        pitch, yaw = math.radians(self.rotation.pitch), math.radians(self.rotation.yaw)
+        return Vector3D(math.cos(pitch) * math.cos(yaw), math.cos(pitch) * math.sin(yaw), math.sin(pitch))
+
+
+class Control(object):
+    throttle, steer, brake = 0.0, 0.0, 0.0
+
+
+class Actor(object):
+    def __init__(self, location):
+        self.location = location
+
+    def get_location(self):
+        return self.location
+
+
+class Hero(Actor):
+    def __init__(self, transform, velocity, traffic_light=None):
+        super(Hero, self).__init__(transform.location)
+        self.transform, self.velocity, self.traffic_light = transform, velocity, traffic_light
+
+    def get_transform(self):
+        return self.transform
+
+    def get_velocity(self):
+        return self.velocity
+
+    def get_control(self):
+        return Control()
+
+    def get_traffic_light(self):
+        return self.traffic_light
+
+
+class Waypoint(object):
+    def __init__(self, x, y, yaw=0.0, lane_type=DRIVING, is_junction=False, lane_width=3.5):
+        self.transform = Transform(Vector3D(x, y), Rotation(yaw=yaw))
+        self.lane_type, self.is_junction, self.lane_width = lane_type, is_junction, lane_width
+
+
+class Map(object):
+    """Returns 'waypoint' for the queries without projection, and 'lane_waypoint' for the rest"""
+
+    def __init__(self, waypoint, lane_waypoint):
+        self.waypoint, self.lane_waypoint = waypoint, lane_waypoint
+
+    def get_waypoint(self, location, project_to_road=True, lane_type=None):
+        return self.lane_waypoint if project_to_road else self.waypoint
+
+
+class ActorList(list):
+    def filter(self, pattern):
+        return self
+
+
+class World(object):
+    def __init__(self, actors):
+        self.actors = ActorList(actors)
+
+    def get_actors(self):
+        return self.actors
+
+
+def baseline_reward(hero, world, map_, last_location, last_velocity, last_steer, flags):
+    """The former scalar PPOExperiment.compute_reward, with the fake objects in place of the carla ones"""
+    max_speed = 20
+    max_reactive_distance = 6
+    alpha = max_speed / (max_reactive_distance - 1)
+    beta = -alpha
+
+    def compute_angle(u, v):
+        return -math.atan2(u[0] * v[1] - u[1] * v[0], u[0] * v[0] + u[1] * v[1])
+
+    def compute_distance(v, u):
+        return float(np.sqrt(np.square(v.x - u.x) + np.square(v.y - u.y)))
+
+    def compute_optimal_speed(distance):
+        if distance > max_reactive_distance:
+            return max_speed
+        elif distance < 1:
+            return 0
+        else:
+            return alpha * distance + beta
+
+    hero_location = hero.get_location()
+    vel = hero.get_velocity()
+    hero_velocity = 3.6 * math.sqrt(vel.x ** 2 + vel.y ** 2 + vel.z ** 2)
+    hero_heading = hero.get_transform().get_forward_vector()
+    hero_heading = [hero_heading.x, hero_heading.y]
+
+    delta_distance = compute_distance(hero_location, last_location)
+    delta_velocity = hero_velocity - last_velocity
+
+    reward = delta_distance
+    if hero_velocity < max_speed:
+        reward += 0.05 * delta_velocity
+
+    closest_waypoint = map_.get_waypoint(hero_location, project_to_road=False)
+    if closest_waypoint is None or closest_waypoint.lane_type not in ALLOWED_TYPES:
+        reward += -0.5
+    else:
+        if not closest_waypoint.is_junction:
+            wp_heading = closest_waypoint.transform.get_forward_vector()
+            wp_heading = [wp_heading.x, wp_heading.y]
+            angle = compute_angle(hero_heading, wp_heading)
+            reward += -abs(angle) / math.pi
+
+            closest_waypoint_in_lane = map_.get_waypoint(hero_location)
+            lane_center_deviation = compute_distance(closest_waypoint.transform.location,
+                                                     closest_waypoint_in_lane.transform.location)
+            reward += -lane_center_deviation / closest_waypoint_in_lane.lane_width
+
+            if np.dot(hero_heading, wp_heading) < 0:
+                reward += -0.5
+            elif abs(math.sin(angle)) > 0.4 and last_steer * math.sin(angle) >= 0:
+                reward -= 0.05
+
+        reaction_distance = np.inf
+        front_traffic_light = hero.get_traffic_light()
+        if front_traffic_light is not None:
+            reaction_distance = compute_distance(front_traffic_light.get_location(), hero_location)
+
+        target = Vector3D(hero_location.x + hero_heading[0] * max_reactive_distance,
+                          hero_location.y + hero_heading[1] * max_reactive_distance,
+                          hero_location.z)
+        for veh in world.get_actors().filter("vehicle.*"):
+            distance_a = compute_distance(veh.get_location(), hero_location)
+            distance_b = compute_distance(veh.get_location(), target)
+            if distance_a < max_reactive_distance and distance_b < max_reactive_distance:
+                reaction_distance = min((reaction_distance, distance_a))
+
+        reward += -abs(hero_velocity - compute_optimal_speed(reaction_distance)) / max_speed + 1
+
+    if flags.get("done_falling"):
+        reward += -40
+    if flags.get("done_idle"):
+        reward += -100
+    if flags.get("done_max_time"):
+        reward += 100
+    if flags.get("collision"):
+        reward += -100
+    return reward
+
+
+def make_case(yaw=0.0, speed=10.0, waypoint="lane", lane_offset=0.4, vehicles=(), traffic_light=None,
+              last_speed=8.0, last_steer=0.0, **flags):
+    """Hero at (10, 5) on a lane heading along x. Vehicles and the traffic light are (x, y) offsets"""
+    location = Vector3D(10.0, 5.0, 0.5)
+    yaw_rad = math.radians(yaw)
+    velocity = Vector3D(speed / 3.6 * math.cos(yaw_rad), speed / 3.6 * math.sin(yaw_rad))
+    light = None if traffic_light is None else Actor(Vector3D(10.0 + traffic_light[0], 5.0 + traffic_light[1]))
+    hero = Hero(Transform(location, Rotation(yaw=yaw)), velocity, light)
+
+    waypoints = {
+        "lane": Waypoint(10.0, 5.0 + lane_offset),
+        "junction": Waypoint(10.0, 5.0 + lane_offset, yaw=90.0, is_junction=True),
+        "sidewalk": Waypoint(10.0, 7.0, lane_type=SIDEWALK),
+        "none": None,
+    }
+    map_ = Map(waypoints[waypoint], Waypoint(10.0, 5.0, lane_width=3.5))
+    world = World([hero] + [Actor(Vector3D(10.0 + x, 5.0 + y)) for x, y in vehicles])
+    last_location = Vector3D(9.5, 5.0, 0.5)
+    return hero, world, map_, last_location, last_speed, last_steer, flags
+
+
+CASES = {
+    "straight": make_case(),
+    "lane_center_deviation": make_case(lane_offset=1.2),
+    "junction": make_case(waypoint="junction", yaw=20.0),
+    "off_lane": make_case(waypoint="sidewalk"),
+    "no_waypoint": make_case(waypoint="none", vehicles=[(3.0, 0.0)]),
+    "wrong_direction": make_case(yaw=180.0),
+    "wrong_steer": make_case(yaw=35.0, last_steer=0.3),
+    "right_steer": make_case(yaw=35.0, last_steer=-0.3),
+    "traffic_light": make_case(traffic_light=(4.0, 1.0)),
+    "traffic_light_close": make_case(traffic_light=(0.5, 0.0), speed=2.0),
+    "vehicle_in_front": make_case(vehicles=[(3.0, 0.5), (-3.0, 0.0), (20.0, 0.0)]),
+    "vehicle_behind": make_case(vehicles=[(-3.0, 0.0)]),
+    "fast": make_case(speed=25.0, last_speed=30.0),
+    "collision": make_case(collision=True, done_falling=True),
+    "done_idle": make_case(speed=0.0, done_idle=True),
+    "done_max_time": make_case(done_max_time=True),
+}
+
+
+def get_vectorized_rewards(cases):
+    telemetries = []
+    for hero, world, map_, _, _, _, _ in cases:
+        telemetry = get_hero_telemetry(hero)
+        telemetry["waypoint"] = _get_waypoint_telemetry(map_.get_waypoint(hero.get_location(), project_to_road=False))
+        telemetry["lane_waypoint"] = _get_waypoint_telemetry(map_.get_waypoint(hero.get_location()))
+        light = hero.get_traffic_light()
+        telemetry["traffic_light_location"] = np.full(3, np.nan) if light is None else \
+            np.array([light.get_location().x, light.get_location().y, light.get_location().z])
+        telemetry["vehicle_locations"] = np.array(
+            [[v.get_location().x, v.get_location().y, v.get_location().z] for v in world.get_actors()])
+        telemetries.append(telemetry)
+
+    def flag(name):
+        return np.array([bool(case[6].get(name)) for case in cases])
+
+    rewards, _ = compute_rewards(
+        stack_telemetry(telemetries),
+        last_location=np.array([[c[3].x, c[3].y, c[3].z] for c in cases]),
+        last_speed=np.array([c[4] for c in cases]),
+        last_steer=np.array([c[5] for c in cases]),
+        allowed_lane_types=ALLOWED_TYPES,
+        done_falling=flag("done_falling"),
+        done_idle=flag("done_idle"),
+        done_max_time=flag("done_max_time"),
+        collision=flag("collision"))
+    return rewards
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_single_transition_matches_the_scalar_reward(name):
+    case = CASES[name]
+    rewards = get_vectorized_rewards([case])
+    assert rewards.shape == (1,)
+    assert rewards[0] == pytest.approx(baseline_reward(*case), abs=1e-9)
+
+
+def test_batch_matches_the_scalar_reward():
+    """The cases have different numbers of vehicles, so the batch has NaN padded vehicle locations"""
+    names = sorted(CASES)
+    rewards = get_vectorized_rewards([CASES[name] for name in names])
+    assert np.all(np.isfinite(rewards))
+    expected = [baseline_reward(*CASES[name]) for name in names]
+    np.testing.assert_allclose(rewards, expected, rtol=0, atol=1e-9)
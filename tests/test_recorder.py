@@ -0,0 +1,29 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from rllib_integration.recorder import EpisodeRecorder, RecordedEpisode, list_episodes
+
+
+def record(directory, value, steps=2):
+    """Records an episode with a single recorder, as done by a worker for each shard"""
+    recorder = EpisodeRecorder(str(directory))
+    recorder.start_episode(np.full((2, 2, 3), value, dtype=np.uint8), {})
+    for t in range(steps):
+        recorder.record_step([0.0, 0.0], 1.0, t == steps - 1, np.full((2, 2, 3), value, dtype=np.uint8), {})
+    recorder.close()
+
+
+def test_recorders_of_the_same_process_do_not_overwrite_episodes(tmp_path):
+    record(tmp_path, 1)
+    record(tmp_path, 2, steps=3)
+
+    episodes = [RecordedEpisode(path) for path in list_episodes(str(tmp_path))]
+    assert sorted(episode.length for episode in episodes) == [2, 3]
+    assert sorted(int(episode.get_observation(0).max()) for episode in episodes) == [1, 2]
@@ -0,0 +1,66 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from rllib_integration.sensors.factory import SensorFactory
+
+SENSOR_MODULE = textwrap.dedent('''
+    class FakeSensor(object):
+        def __init__(self, name, attributes, interface, parent):
+            self.name = name
+            self.attributes = attributes
+
+        def parse(self, data):
+            return "default"
+''')
+
+
+@pytest.fixture
+def sensor_module(tmp_path, monkeypatch):
+    """Importable module with a sensor class, and a registry restored after the test"""
+    (tmp_path / "fake_sensor_module.py").write_text(SENSOR_MODULE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(SensorFactory, "registry", dict(SensorFactory.registry))
+    yield "fake_sensor_module"
+    sys.modules.pop("fake_sensor_module", None)
+
+
+def test_import_does_not_load_carla_or_pygame():
+    code = "import sys, rllib_integration.sensors.factory; print(sorted({'carla', 'pygame'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, universal_newlines=True,
+                            check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_class_path_is_imported_on_first_spawn(sensor_module):
+    SensorFactory.register("sensor.fake", "{}:FakeSensor".format(sensor_module), blueprint="sensor.other.imu")
+    assert sensor_module not in sys.modules
+
+    sensor = SensorFactory.spawn("fake", {"type": "sensor.fake"}, interface=None, parent=None)
+    assert sensor_module in sys.modules
+    assert type(sensor).__name__ == "FakeSensor"
+    assert sensor.attributes["type"] == "sensor.other.imu"
+    assert sensor.parse(None) == "default"
+
+
+def test_custom_parse_is_installed(sensor_module):
+    def parse(sensor, data):
+        return "custom {} {}".format(sensor.name, data)
+
+    SensorFactory.register("sensor.fake", "{}:FakeSensor".format(sensor_module), parse=parse)
+    sensor = SensorFactory.spawn("fake", {"type": "sensor.fake"}, interface=None, parent=None)
+    assert sensor.parse(1) == "custom fake 1"
+    assert sensor.attributes["type"] == "sensor.fake"
+
+
+def test_unknown_type_raises():
+    with pytest.raises(RuntimeError, match="not supported"):
+        SensorFactory.spawn("unknown", {"type": "sensor.unknown"}, interface=None, parent=None)
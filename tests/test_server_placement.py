@@ -0,0 +1,97 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import os
+import subprocess
+
+import pytest
+
+from rllib_integration import server_placement
+from rllib_integration.server_placement import get_placement, get_server_command
+
+CORES = list(range(24))
+CONFIG = {"gpu_placement": True, "cpu_affinity": {"cores_per_worker": 3, "env_cores": 1}}
+
+
+@pytest.fixture
+def place(tmp_path):
+    """Places workers at a node of 24 cores and 2 GPUs, releasing their slots afterwards"""
+    def place(worker_index, gpu_ids=(), config=CONFIG):
+        return get_placement(config, worker_index, list(gpu_ids), CORES, node_gpus=2, slot_directory=str(tmp_path))
+
+    yield place
+    for directory, slot in list(server_placement._claimed_slots):
+        server_placement.release_slot(slot, directory)
+
+
+def assert_disjoint(placements):
+    used = []
+    for _, env_cores, server_cores in placements:
+        assert env_cores and server_cores
+        used += env_cores + server_cores
+    assert len(used) == len(set(used))
+
+
+def test_local_and_first_worker_do_not_share_cores(place):
+    assert_disjoint([place(0), place(1)])
+
+
+def test_workers_sharing_a_gpu_get_disjoint_cores(place):
+    # Fractional GPUs, four workers per GPU, in the order Ray might assign them
+    gpu_ids = [0, 0, 1, 0, 1, 1, 0, 1]
+    placements = [place(i + 1, [gpu]) for i, gpu in enumerate(gpu_ids)]
+    assert_disjoint(placements)
+
+    # Each GPU uses the cores of its own partition
+    for (gpu, env_cores, server_cores), expected in zip(placements, gpu_ids):
+        assert gpu == expected
+        assert all(12 * gpu <= core < 12 * (gpu + 1) for core in env_cores + server_cores)
+
+
+def test_released_slots_are_reused(place, tmp_path):
+    _, first, _ = place(1)
+    server_placement.release_slot(1, str(tmp_path))
+    _, again, _ = place(1)
+    assert again == first
+
+
+def test_full_node_shares_a_slot(place):
+    placements = [place(i) for i in range(8)]
+    assert_disjoint(placements)
+    assert place(8)[1:] == placements[0][1:]
+
+
+def test_without_affinity_or_gpu_placement(place):
+    assert place(1, [1], {"gpu_placement": False, "cpu_affinity": None}) == (None, None, None)
+
+
+def test_server_command():
+    command = get_server_command("/carla", 2000, gpu=1, cores=[4, 5])
+    assert command[:6] == ["DISPLAY= ", "CUDA_VISIBLE_DEVICES=1", "SDL_HINT_CUDA_DEVICE=0", "taskset", "-c", "4,5"]
+    assert "--carla-rpc-port=2000" in command
+
+
+@pytest.mark.parametrize("gpu, show_display, expected", [
+    (2, False, {"CUDA_VISIBLE_DEVICES": "2", "SDL_HINT_CUDA_DEVICE": "0", "DISPLAY": ""}),
+    (2, True, {"CUDA_VISIBLE_DEVICES": "2", "SDL_HINT_CUDA_DEVICE": None, "DISPLAY": ":1"}),
+    (None, False, {"CUDA_VISIBLE_DEVICES": None, "SDL_HINT_CUDA_DEVICE": None, "DISPLAY": ""}),
+])
+def test_server_environment(tmp_path, gpu, show_display, expected):
+    # Fake server, printing the environment it is started with
+    names = sorted(expected)
+    server = tmp_path / "CarlaUE4.sh"
+    server.write_text("#!/bin/sh\n" + "".join(
+        'echo "{0}=${{{0}-unset}}"\n'.format(name) for name in names))
+    server.chmod(0o755)
+
+    # Started as carla_core does, from a Ray worker that was assigned the (renumbered) GPU 0
+    command = get_server_command(str(tmp_path), 2000, show_display=show_display, gpu=gpu)
+    env = dict(os.environ, CUDA_VISIBLE_DEVICES="0", DISPLAY=":1")
+    env.pop("SDL_HINT_CUDA_DEVICE", None)
+    output = subprocess.check_output(" ".join(map(str, command)), shell=True, env=env, universal_newlines=True)
+
+    server_env = dict(line.split("=", 1) for line in output.splitlines())
+    assert server_env == {name: "unset" if value is None else value for name, value in expected.items()}
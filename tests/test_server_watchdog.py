@@ -0,0 +1,68 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import subprocess
+import sys
+import time
+
+import pytest
+
+psutil = pytest.importorskip("psutil")
+
+from rllib_integration.server_watchdog import ServerWatchdog
+
+
+class FakeCore(object):
+    """Core whose 'server' is a sleeping process"""
+
+    gpu = None
+
+    def __init__(self):
+        self.server_process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+
+    def close(self):
+        self.server_process.kill()
+        self.server_process.wait()
+
+
+@pytest.fixture
+def core():
+    core = FakeCore()
+    yield core
+    core.close()
+
+
+def test_recycle_reason(core):
+    watchdog = ServerWatchdog(core, {"interval": 60, "max_rss_mb": 0.001})
+    try:
+        assert watchdog.get_recycle_reason() is None
+        sample = watchdog.sample()
+        assert sample["rss_mb"] > 0
+        assert watchdog.get_recycle_reason().startswith("RSS")
+        assert watchdog.pop_samples() == [sample]
+
+        watchdog.reset()
+        assert watchdog.get_recycle_reason() is None
+    finally:
+        watchdog.stop()
+
+
+def test_access_denied_does_not_stop_the_sampling(core, monkeypatch):
+    def memory_info(process, **kwargs):
+        raise psutil.AccessDenied(process.pid)
+
+    monkeypatch.setattr(psutil.Process, "memory_info", memory_info)
+    watchdog = ServerWatchdog(core, {"interval": 0.01})
+    try:
+        assert watchdog.sample()["rss_mb"] == 0
+
+        # The thread keeps sampling even if the listing of the processes fails
+        monkeypatch.setattr(psutil.Process, "children", memory_info)
+        time.sleep(0.1)
+        assert watchdog._thread.is_alive()
+        assert len(watchdog.pop_samples()) > 1
+    finally:
+        watchdog.stop()
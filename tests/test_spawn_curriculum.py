@@ -0,0 +1,121 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from rllib_integration.spawn_curriculum import CurriculumSpawnSampler
+
+
+class FakeWaypoint(object):
+    """Waypoint of a straight road, reaching a junction after 'junction_steps' steps (never if None)"""
+
+    def __init__(self, junction_steps=None):
+        self.junction_steps = junction_steps
+        self.is_junction = junction_steps == 0
+        self.transform = SimpleNamespace(rotation=SimpleNamespace(yaw=0.0))
+
+    def next(self, step):
+        if self.junction_steps is None:
+            return [FakeWaypoint()]
+        return [FakeWaypoint(max(self.junction_steps - 1, 0))]
+
+
+class FakeMap(object):
+    def __init__(self, junction_steps):
+        self.junction_steps = junction_steps
+
+    def get_waypoint(self, location):
+        return FakeWaypoint(self.junction_steps[int(location.x)])
+
+
+class FakeSpawnPoints(object):
+    """Spawn points at x = 0, 100, 200..., far from each other"""
+
+    def __init__(self, num_points):
+        self.transforms = [SimpleNamespace(location=SimpleNamespace(x=i)) for i in range(num_points)]
+        self.locations = np.array([[100.0 * i, 0.0, 0.0] for i in range(num_points)])
+
+    def __len__(self):
+        return len(self.transforms)
+
+
+def create_sampler(**kwargs):
+    # At a junction (hardest), 5 steps (25 m) away from it, and without any junction ahead (easiest)
+    return CurriculumSpawnSampler(FakeMap([0, 5, None]), FakeSpawnPoints(3), **kwargs)
+
+
+def test_difficulty():
+    sampler = create_sampler()
+    assert np.allclose(sampler.static_difficulty, [0.5, 0.25, 0.0])
+
+    difficulty = sampler.get_difficulty(np.zeros((0, 2)))
+    assert np.allclose(difficulty, [1 / 3, 1 / 6, 0])
+
+    # NPCs around the easiest point make it harder, up to 'max_density' of them
+    npc_locations = np.full((20, 2), [200.0, 0.0])
+    assert np.allclose(sampler.get_difficulty(npc_locations), [1 / 3, 1 / 6, 1 / 3])
+
+
+def test_weights_peak_at_the_level():
+    sampler = create_sampler(level=0.0)
+    assert np.argmax(sampler.get_weights(np.zeros((0, 2)))) == 2
+
+    sampler.level = 1 / 3
+    assert np.argmax(sampler.get_weights(np.zeros((0, 2)))) == 0
+
+
+def test_level_follows_the_success_rate():
+    sampler = create_sampler(target_success=0.5, step_size=0.1, level=0.5, window=4)
+
+    # Success rates above the target make the spawn points harder, below it easier
+    sampler.update(True)
+    assert sampler.level == pytest.approx(0.55)
+    sampler.update(True)
+    assert sampler.level == pytest.approx(0.6)
+    for _ in range(4):
+        level = sampler.level
+        sampler.update(False)
+    assert sampler.level < level < 0.6
+
+
+def test_level_is_clipped():
+    sampler = create_sampler(target_success=0.5, step_size=1.0, level=0.9)
+    for _ in range(10):
+        sampler.update(True)
+    assert sampler.level == 1.0
+
+    sampler = create_sampler(target_success=0.5, step_size=1.0, level=0.1)
+    for _ in range(10):
+        sampler.update(False)
+    assert sampler.level == 0.0
+
+
+def test_underflowed_weights_keep_every_candidate():
+    pytest.importorskip("carla")
+    from rllib_integration.spawn_points import SpawnPoints
+
+    transforms = [SimpleNamespace(location=SimpleNamespace(x=100.0 * i, y=0.0, z=0.0),
+                                  rotation=SimpleNamespace(pitch=0.0, yaw=0.0, roll=0.0)) for i in range(4)]
+    spawn_points = SpawnPoints(SimpleNamespace(get_spawn_points=lambda: transforms))
+
+    # The last point is occupied, and the gaussian of two of the free ones underflows to 0
+    npc_locations = np.array([[300.0, 0.0]])
+    sampler = create_sampler(sigma=0.001, level=1 / 3)
+    weights = np.append(sampler.get_weights(np.zeros((0, 2))), 1.0)
+    assert np.count_nonzero(weights[:3]) == 1
+
+    for _ in range(10):
+        candidates = spawn_points.get_candidates(npc_locations, weights)
+        assert sorted(candidates) == [0, 1, 2, 3]
+        assert candidates[0] == 0 and candidates[-1] == 3
+
+    # All the free points underflowing
+    candidates = spawn_points.get_candidates(npc_locations, np.zeros(4))
+    assert sorted(candidates) == [0, 1, 2, 3] and candidates[-1] == 3
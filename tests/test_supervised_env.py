@@ -0,0 +1,64 @@
+# Copyright (c) 2021 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import pytest
+
+pytest.importorskip("carla")
+
+from rllib_integration.carla_env import CarlaEnv
+from rllib_integration.supervised_env import SupervisedCarlaEnv
+
+
+class FakeCore(object):
+    server_port = 2000
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.restarts = 0
+
+    def is_server_alive(self):
+        return False
+
+    def restart_server(self, experiment_config):
+        self.restarts += 1
+        if self.restarts <= self.failures:
+            raise ConnectionError("server not reachable")
+
+
+class FakeExperiment(object):
+    config = {}
+
+
+def make_env(core, max_restarts=3):
+    env = SupervisedCarlaEnv.__new__(SupervisedCarlaEnv)
+    env.core, env.experiment, env.recorder, env.watchdog = core, FakeExperiment(), None, None
+    env.max_restarts = max_restarts
+    env.restarts, env.consecutive_restarts, env.recycles = 0, 0, 0
+    env.truncated, env.last_observation = False, "last observation"
+    return env
+
+
+def test_crash_during_a_step_truncates_the_episode(monkeypatch):
+    def crash(self, action):
+        raise RuntimeError("sensor timeout")
+
+    monkeypatch.setattr(CarlaEnv, "step", crash)
+    env = make_env(FakeCore(failures=1))
+
+    assert env.step(None) == ("last observation", 0.0, True, {"truncated": True})
+    assert env.truncated
+    assert env.restarts == 2 and env.core.restarts == 2
+
+    monkeypatch.setattr(CarlaEnv, "step", lambda self, action: ("obs", 1.0, False, {}))
+    assert env.step(None) == ("obs", 1.0, False, {})
+    assert env.consecutive_restarts == 0
+
+
+def test_gives_up_after_max_restarts():
+    env = make_env(FakeCore(failures=10), max_restarts=3)
+    with pytest.raises(ConnectionError):
+        env.restart(RuntimeError("server died"))
+    assert env.core.restarts == 3